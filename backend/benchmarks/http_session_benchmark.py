@@ -0,0 +1,134 @@
+# backend/benchmarks/http_session_benchmark.py
+"""
+Per-call latency of module-level requests.post (new TCP + TLS handshake each call) vs a pooled
+keep-alive session from create_session, against a local HTTPS stand-in with a self-signed certificate.
+
+    python -m backend.benchmarks.http_session_benchmark --calls 500
+"""
+import argparse
+import ipaddress
+import json
+import os
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from backend.services.providers.http_session import create_session, request_timeout
+
+def _self_signed_cert(directory: str) -> Tuple[str, str]:
+    """Writes a localhost/127.0.0.1 certificate and key; returns (cert_path, key_path)."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=1))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the provider APIs
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"success": True, "code": "0", "data": {}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _start_server(cert_path: str, key_path: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _time_calls(call: Callable[[], requests.Response], calls: int) -> List[float]:
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        call().raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def _summary(latencies: List[float]) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'p50_ms': round(ordered[len(ordered) // 2], 3),
+        'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+    }
+
+def run(calls: int) -> Dict:
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = _self_signed_cert(directory)
+        server = _start_server(cert_path, key_path)
+        url = f"https://127.0.0.1:{server.server_address[1]}/v1/api/inverterDetail"
+        payload = {"id": "1", "sn": "SN1"}
+        try:
+            unpooled = _time_calls(
+                lambda: requests.post(url, json=payload, verify=cert_path, timeout=request_timeout()), calls
+            )
+            # verify per call: a Session-level verify loses to REQUESTS_CA_BUNDLE when trust_env is on
+            session = create_session()
+            pooled = _time_calls(
+                lambda: session.post(url, json=payload, verify=cert_path, timeout=request_timeout()), calls
+            )
+            session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    result = {'calls': calls, 'unpooled': _summary(unpooled), 'pooled': _summary(pooled)}
+    result['speedup'] = round(result['unpooled']['mean_ms'] / result['pooled']['mean_ms'], 2)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-call HTTPS latency with and without a pooled session")
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    result = run(args.calls)
+    for label in ('unpooled', 'pooled'):
+        stats = result[label]
+        print(f"{label:>8}: mean {stats['mean_ms']}ms | p50 {stats['p50_ms']}ms | p99 {stats['p99_ms']}ms")
+    print(f"{'':>8}  x{result['speedup']} over {result['calls']} calls")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# backend/benchmarks/normalize_benchmark.py
+"""
+Per-row normalize_data_entry vs batch normalize_batch.
+
+    python -m backend.benchmarks.normalize_benchmark --records 1000000 --provider solarman
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from backend.services.etl.etl_service import normalize_data_entry
+from backend.services.etl.normalizer import normalize_batch
+
+def _raw_record(provider: str, ts: datetime, rng: random.Random) -> Dict:
+    # Key names as the provider clients emit them
+    record = {'timestamp': ts.strftime('%Y-%m-%d %H:%M:%S')}
+    if provider == 'soliscloud':
+        record.update({
+            'sn': 'SC0001', 'pac': rng.uniform(0, 5000), 'eToday': rng.uniform(0, 30), 'fac': 50.0,
+            'uAc1': 230.0, 'uAc2': 231.0, 'uAc3': 229.0, 'iAc1': 5.0, 'iAc2': 5.1, 'iAc3': 4.9,
+            'storageBatteryVoltage': 51.2, 'storageBatteryCurrent': 3.0, 'inverter_temperature': 41.0,
+            'state': 'online',
+        })
+        for i in range(1, 5):
+            record[f'uPv{i}'] = rng.uniform(200, 400)
+            record[f'iPv{i}'] = rng.uniform(0, 10)
+    elif provider == 'solarman':
+        record.update({'deviceSn': 'SM0001', 'total_power': str(rng.uniform(0, 5000)), 'dpi_t1': '1200', 'a_fo1': '50.0'})
+        for i in range(1, 5):
+            record[f'dv{i}'] = str(rng.uniform(200, 400))
+            record[f'dc{i}'] = str(rng.uniform(0, 10))
+    else:
+        record.update({'device_id': 'SH0001', 'total_power': rng.uniform(0, 5000), 'r_voltage': 230.0,
+                       'faults': [], 'state': 'unknown'})
+        for i in range(1, 4):
+            record[f'pv{i:02d}_voltage'] = rng.uniform(200, 400)
+            record[f'pv{i:02d}_current'] = rng.uniform(0, 10)
+    return record
+
+def make_records(provider: str, count: int, seed: int = 42) -> List[Dict]:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [_raw_record(provider, start + timedelta(minutes=5 * i), rng) for i in range(count)]
+
+def run(provider: str, count: int) -> Dict:
+    records = make_records(provider, count)
+
+    # Per-row results are discarded as they go: 1M row dicts would not fit next to the input
+    started = time.perf_counter()
+    for record in records:
+        normalize_data_entry(record, provider)
+    per_row_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = normalize_batch(records, provider)
+    batch_s = time.perf_counter() - started
+
+    # Spot-check parity on ~1000 evenly spaced rows
+    sample_idx = list(range(0, count, max(1, count // 1000)))
+    sample = batch.select(sample_idx).records()
+    expected = [normalize_data_entry(records[i], provider) for i in sample_idx]
+    mismatches = sum(1 for a, b in zip(sample, expected) if a != b)
+
+    return {
+        'provider': provider,
+        'records': count,
+        'per_row_s': round(per_row_s, 3),
+        'batch_s': round(batch_s, 3),
+        'speedup': round(per_row_s / batch_s, 2) if batch_s else None,
+        'per_row_rows_per_s': int(count / per_row_s) if per_row_s else None,
+        'batch_rows_per_s': int(count / batch_s) if batch_s else None,
+        'sample_mismatches': mismatches,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-row vs batch normalization")
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--provider', choices=['solarman', 'shinemonitor', 'soliscloud', 'all'], default='all')
+    args = parser.parse_args()
+
+    providers = ['solarman', 'shinemonitor', 'soliscloud'] if args.provider == 'all' else [args.provider]
+    for provider in providers:
+        result = run(provider, args.records)
+        print(
+            f"{result['provider']:>12}: {result['records']} records | per-row {result['per_row_s']}s "
+            f"({result['per_row_rows_per_s']}/s) | batch {result['batch_s']}s ({result['batch_rows_per_s']}/s) | "
+            f"x{result['speedup']} | sample mismatches: {result['sample_mismatches']}"
+        )
+
+if __name__ == '__main__':
+    main()
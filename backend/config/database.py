@@ -45,7 +45,8 @@ def init_db():
             ('device_data_historical', 'timestamp'),
             ('predictions', 'timestamp'),
             ('fault_logs', 'timestamp'),
-            ('error_logs', 'timestamp')
+            ('error_logs', 'timestamp'),
+            ('etl_telemetry', 'time')
         ]
         for table, time_col in hypertables:
             try:
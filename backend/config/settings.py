@@ -20,7 +20,58 @@ class Settings(BaseSettings):
     
     # ETL/Providers
     COMPANY_KEY: str = os.getenv("COMPANY_KEY", "your_shinemonitor_company_key")
+    SOLARMAN_BASE_URL: str = os.getenv("SOLARMAN_BASE_URL", "https://globalapi.solarmanpv.com")
+    SHINEMONITOR_BASE_URL: str = os.getenv("SHINEMONITOR_BASE_URL", "http://api.shinemonitor.com/public/")
+    SOLISCLOUD_BASE_URL: str = os.getenv("SOLISCLOUD_BASE_URL", "https://www.soliscloud.com:13333")  # Point all three at the provider simulator for load tests
     BATCH_SIZE: int = os.getenv("BATCH_SIZE", 100)
+    HISTORICAL_LOOKBACK_DAYS: int = os.getenv("HISTORICAL_LOOKBACK_DAYS", 7)  # Window for devices without a watermark
+    WATERMARK_OVERLAP_MINUTES: int = os.getenv("WATERMARK_OVERLAP_MINUTES", 60)  # Re-fetched before the watermark for late rows
+    ETL_WRITE_METHOD: str = os.getenv("ETL_WRITE_METHOD", "values")  # 'values' (multi-row INSERT) or 'copy' (COPY via staging table)
+    ETL_MAX_WORKERS: int = os.getenv("ETL_MAX_WORKERS", 8)  # Credentials processed in parallel; also sizes the DB pool, so larger max_workers are capped to it
+    ETL_SHARD_SIZE: int = os.getenv("ETL_SHARD_SIZE", 20)  # Credentials per mapped Airflow task
+    ETL_MAX_ACTIVE_SHARDS: int = os.getenv("ETL_MAX_ACTIVE_SHARDS", 8)  # Concurrent shard tasks per provider (max_active_tis_per_dag)
+    ETL_CHUNK_SIZE: int = os.getenv("ETL_CHUNK_SIZE", 5000)  # Rows normalized and written per streamed chunk
+    ADAPTIVE_POLLING: bool = os.getenv("ADAPTIVE_POLLING", False)  # Poll each device on its own schedule (etl.poll_scheduler); moves the DAG from hourly to every POLL_TICK_MINUTES
+    POLL_TICK_MINUTES: int = os.getenv("POLL_TICK_MINUTES", 15)  # DAG interval with adaptive polling (hourly without); historical fetches stay hourly
+    POLL_HEARTBEAT_MINUTES: int = os.getenv("POLL_HEARTBEAT_MINUTES", 120)  # Poll interval at night and for offline devices
+    POLL_OFFLINE_AFTER_MINUTES: int = os.getenv("POLL_OFFLINE_AFTER_MINUTES", 60)  # Daylight without new data before a device is offline
+    POLL_TWILIGHT_MINUTES: int = os.getenv("POLL_TWILIGHT_MINUTES", 30)  # Daylight window widened by this before sunrise/after sunset
+    POLL_DEFAULT_TIMEZONE: str = os.getenv("POLL_DEFAULT_TIMEZONE", "Asia/Kolkata")  # Plants whose provider gives no time zone
+    BACKFILL_WORKERS: int = os.getenv("BACKFILL_WORKERS", 4)  # Day shards fetched concurrently per backfill run
+    BACKFILL_MAX_DAYS: int = os.getenv("BACKFILL_MAX_DAYS", 366)  # Longest range one request may queue
+    BACKFILL_MAX_ATTEMPTS: int = os.getenv("BACKFILL_MAX_ATTEMPTS", 5)  # Tries per shard before it is marked failed
+    BACKFILL_RETRY_DELAY_SECONDS: int = os.getenv("BACKFILL_RETRY_DELAY_SECONDS", 60)  # Multiplied by the attempt number
+    BACKFILL_STALE_MINUTES: int = os.getenv("BACKFILL_STALE_MINUTES", 30)  # 'running' shards older than this are reclaimed
+    ETL_TELEMETRY: bool = os.getenv("ETL_TELEMETRY", True)  # Write per-run/credential/device numbers to etl_telemetry
+    PROMETHEUS_PUSHGATEWAY_URL: str = os.getenv("PROMETHEUS_PUSHGATEWAY_URL", "")  # Push ETL metrics here after each run (needs prometheus-client)
+    RAW_ARCHIVE_DIR: str = os.getenv("RAW_ARCHIVE_DIR", "")  # Archive raw provider data responses here (empty = off)
+    RAW_ARCHIVE_COMPRESSION: str = os.getenv("RAW_ARCHIVE_COMPRESSION", "gzip")  # 'gzip' or 'zstd' (needs zstandard)
+    SOLARMAN_MAX_CONCURRENCY: int = os.getenv("SOLARMAN_MAX_CONCURRENCY", 4)
+    SHINEMONITOR_MAX_CONCURRENCY: int = os.getenv("SHINEMONITOR_MAX_CONCURRENCY", 4)
+    SOLISCLOUD_MAX_CONCURRENCY: int = os.getenv("SOLISCLOUD_MAX_CONCURRENCY", 2)  # Strictest quota
+    ASYNC_MAX_CONCURRENCY: int = os.getenv("ASYNC_MAX_CONCURRENCY", 1000)  # In-flight device fetches (async ETL)
+    ASYNC_HTTP_MAX_CONNECTIONS: int = os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", 200)
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # 'memory' (per process) or 'redis' (shared by all workers)
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379")
+    SOLARMAN_RATE_LIMIT: float = os.getenv("SOLARMAN_RATE_LIMIT", 1.0)  # Requests/sec per account
+    SHINEMONITOR_RATE_LIMIT: float = os.getenv("SHINEMONITOR_RATE_LIMIT", 5.0)  # Requests/sec per company key
+    SOLISCLOUD_RATE_LIMIT: float = os.getenv("SOLISCLOUD_RATE_LIMIT", 2.0)  # Requests/sec per API key
+    SOLARMAN_HISTORICAL_MAX_DAYS: int = os.getenv("SOLARMAN_HISTORICAL_MAX_DAYS", 5)  # Days per /device/v1.0/historical request; Solarman caps the range of frame data
+    SOLISCLOUD_REALTIME_MODE: str = os.getenv("SOLISCLOUD_REALTIME_MODE", "bulk")  # 'bulk' (inverterList pages) or 'day' (inverterDay per device), in both the threaded and async fetchers
+    SOLISCLOUD_REALTIME_DETAIL: bool = os.getenv("SOLISCLOUD_REALTIME_DETAIL", True)  # inverterDetail for strings/battery when producing
+    TOKEN_REFRESH_MARGIN: int = os.getenv("TOKEN_REFRESH_MARGIN", 300)  # Seconds before expiry a provider token is renewed
+    SHINEMONITOR_TOKEN_TTL: int = os.getenv("SHINEMONITOR_TOKEN_TTL", 3600)  # Used when auth response has no 'expire'
+    RATE_LIMIT_MAX_BACKOFF: float = os.getenv("RATE_LIMIT_MAX_BACKOFF", 60.0)  # Cap on throttle backoff (seconds)
+    CATALOG_CACHE_TTL: int = os.getenv("CATALOG_CACHE_TTL", 900)  # Seconds station/inverter listings are reused
+    HTTP_POOL_CONNECTIONS: int = os.getenv("HTTP_POOL_CONNECTIONS", 4)  # Hosts kept pooled per provider client
+    HTTP_POOL_MAXSIZE: int = os.getenv("HTTP_POOL_MAXSIZE", 10)  # Keep-alive connections per host
+    HTTP_CONNECT_TIMEOUT: float = os.getenv("HTTP_CONNECT_TIMEOUT", 5.0)  # Seconds
+    HTTP_READ_TIMEOUT: float = os.getenv("HTTP_READ_TIMEOUT", 30.0)  # Seconds
+
+    # Dashboard
+    TIMESERIES_TARGET_POINTS: int = os.getenv("TIMESERIES_TARGET_POINTS", 1000)  # resolution=auto picks the finest bucket under this many points
+    TIMESERIES_MAX_POINTS: int = os.getenv("TIMESERIES_MAX_POINTS", 5000)  # Explicit resolutions returning more points are refused
+    TIMESERIES_BATCH_MAX_DEVICES: int = os.getenv("TIMESERIES_BATCH_MAX_DEVICES", 50)  # Devices per /dashboard/timeseries/batch request
     
     # Solarman
     SOLARMAN_EMAIL: str = os.getenv("SOLARMAN_EMAIL", "example@email.com")
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from ..models.backfill_job import BackfillJob, BackfillRequest, BackfillQueuedResponse, BackfillStatusResponse
+from ..models.plant import Plant
+from ..models.user import Customer
+from ..config.database import get_db
+from ..services.auth_service import get_current_user
+from ..services.etl.backfill import queue_backfill, backfill_status
+
+router = APIRouter(prefix="/backfill", tags=["backfill"])
+
+@router.post("/", response_model=BackfillQueuedResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_backfill(request: BackfillRequest, current_user_id: str = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Shards are queued here and fetched by `python -m backend.services.etl.backfill run` / backfill_dag
+    if not request.customer_id and not request.plant_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="customer_id or plant_id is required")
+    customer_id = request.customer_id
+    if request.plant_id:
+        plant = db.query(Plant).filter(Plant.plant_id == request.plant_id).first()
+        if not plant or (customer_id and plant.customer_id != customer_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Plant not found or unauthorized")
+        customer_id = plant.customer_id
+    customer = db.query(Customer).filter(Customer.customer_id == customer_id, Customer.user_id == current_user_id).first()
+    if not customer:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found or unauthorized")
+
+    try:
+        return queue_backfill(db, customer_id, request.start_date, request.end_date, plant_id=request.plant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/{batch_id}", response_model=BackfillStatusResponse)
+def get_backfill(batch_id: str, current_user_id: str = Depends(get_current_user), db: Session = Depends(get_db)):
+    job = db.query(BackfillJob).join(Customer, BackfillJob.customer_id == Customer.customer_id).filter(
+        BackfillJob.batch_id == batch_id, Customer.user_id == current_user_id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backfill not found or unauthorized")
+    return backfill_status(db, batch_id=batch_id)
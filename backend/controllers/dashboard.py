@@ -1,14 +1,15 @@
 # Update backend/controllers/dashboard.py (Add Timeseries Endpoint)
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
 from ..models.plant import Plant, PlantResponse
 from ..models.device import Device, DeviceResponse
-from ..models.device_data import DeviceDataHistorical, DeviceDataResponse  # Add import
+from ..models.device_data import TimeseriesBatchRequest, TimeseriesSeries
 from ..models.user import Customer
 from ..config.database import get_db
 from ..services.auth_service import get_current_user
+from ..services.timeseries_service import get_batch_timeseries, get_device_timeseries
+from ..services.timeseries_encoding import encode_points, encode_series, negotiate
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
@@ -29,39 +30,67 @@ def get_devices(plant_id: Optional[str] = None, current_user_id: str = Depends(g
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No devices found for user")
     return devices
 
-@router.get("/timeseries/{device_sn}", response_model=List[DeviceDataResponse])
+def _owned_device_sns(db: Session, current_user_id: str, device_sns: List[str]) -> set:
+    return {sn for (sn,) in db.query(Device.device_sn).join(Plant, Device.plant_id == Plant.plant_id).join(Customer, Plant.customer_id == Customer.customer_id).filter(
+        Customer.user_id == current_user_id, Device.device_sn.in_(device_sns)
+    ).all()}
+
+def _negotiate(request: Request, layout: str, arrow: bool = True) -> str:
+    if layout not in ("rows", "columns"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid layout (use rows or columns)")
+    try:
+        return negotiate(request.headers.get("accept"), arrow=arrow)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(e))
+
+@router.get("/timeseries/{device_sn}", response_model=List[Dict[str, Any]])
 def get_timeseries(
     device_sn: str,
+    request: Request,
     metric: Optional[str] = Query(None, description="Metric to filter (e.g., total_power)"),
-    timeRange: Optional[str] = Query("24h", description="Time range (24h, 7d)"),
+    metrics: Optional[str] = Query(None, description="Comma-separated metrics (e.g., total_power,energy_today); all numeric metrics if neither is given"),
+    timeRange: Optional[str] = Query("24h", description="Time range (1h, 24h, 7d, 30d, 90d, 1y)"),
+    resolution: Optional[str] = Query("auto", description="Bucket size (auto, 5m, 15m, 1h, 1d)"),
+    layout: Optional[str] = Query("rows", description="JSON layout: rows or columns ({timestamps: [...], metric: [...]}); msgpack and Arrow are always columnar"),
     current_user_id: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Validate timeRange
-    if timeRange == "24h":
-        start = datetime.utcnow() - timedelta(hours=24)
-    elif timeRange == "7d":
-        start = datetime.utcnow() - timedelta(days=7)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid timeRange (use 24h or 7d)")
-    
-    # Query with filter
-    query = db.query(DeviceDataHistorical).filter(
-        DeviceDataHistorical.device_sn == device_sn,
-        DeviceDataHistorical.timestamp >= start
-    ).order_by(DeviceDataHistorical.timestamp.desc()).limit(1000)  # Limit for performance
-    
-    data = query.all()
-    if not data:
+    # Aggregated in the DB: one point per bucket with avg (under the metric name), _min, _max and _last
+    media_type = _negotiate(request, layout)
+    if device_sn not in _owned_device_sns(db, current_user_id, [device_sn]):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found or unauthorized")
+    try:
+        requested = [m.strip() for m in (metrics or "").split(",") if m.strip()] + ([metric] if metric else [])
+        used, points = get_device_timeseries(db, device_sn, requested, timeRange, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not points:
         raise HTTPException(status_code=404, detail="No data found for device")
-    
-    # Filter metric if specified
-    if metric:
-        filtered = [
-            {"timestamp": item.timestamp, metric: getattr(item, metric, None)} 
-            for item in data
-        ]
-        return filtered
-    else:
-        # Full data
-        return [item.__dict__ for item in data]
\ No newline at end of file
+    # Encoded here rather than validated through response_model: thousands of points per request
+    return Response(content=encode_points(points, media_type, columnar=layout == "columns"), media_type=media_type,
+                    headers={"X-Resolution": used})
+
+@router.post("/timeseries/batch", response_model=List[TimeseriesSeries])
+def get_timeseries_batch(
+    request: TimeseriesBatchRequest,
+    http_request: Request,
+    layout: Optional[str] = Query("rows", description="JSON layout of each series' data: rows or columns; msgpack is always columnar"),
+    current_user_id: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    media_type = _negotiate(http_request, layout, arrow=False)  # Arrow carries one table, not a list of series
+    # Every device must belong to the user; all series come from one query
+    owned = _owned_device_sns(db, current_user_id, request.deviceIds)
+    missing = [sn for sn in request.deviceIds if sn not in owned]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Devices not found or unauthorized: {', '.join(missing)}")
+    try:
+        used, series = get_batch_timeseries(db, request.deviceIds, request.metrics, request.timeRange, request.resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    body = [
+        {"deviceId": s["device_sn"], "metric": s["metric"], "timeRange": request.timeRange, "resolution": used,
+         "columns": s["columns"], "data": s["data"]}
+        for s in series
+    ]
+    return Response(content=encode_series(body, media_type, columnar=layout == "columns"), media_type=media_type)
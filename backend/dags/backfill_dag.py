@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+import sys
+
+# Add backend directory to Python path - this is where it's mounted in the container
+sys.path.insert(0, '/opt/airflow')
+
+from backend.config.settings import settings
+from backend.services.etl.backfill import run_backfill
+
+default_args = {
+    'owner': 'rayvolt',
+    'depends_on_past': False,
+    'start_date': datetime(2025, 10, 21),
+    'retries': 1,
+    'retry_delay': timedelta(minutes=5),
+}
+
+# Drains backfill_jobs queued through POST /backfill or the backfill CLI; a run exits when nothing is left to claim
+dag = DAG(
+    'solar_backfill_dag',
+    default_args=default_args,
+    description='Resumable historical backfills (backfill_jobs day shards)',
+    schedule_interval=timedelta(minutes=10),
+    catchup=False,
+    max_active_runs=1,
+    params={'workers': settings.BACKFILL_WORKERS},
+)
+
+def run_backfill_shards(**kwargs):
+    return run_backfill(workers=kwargs['params'].get('workers'))
+
+backfill_task = PythonOperator(
+    task_id='run_backfill_shards',
+    python_callable=run_backfill_shards,
+    dag=dag,
+)
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from airflow import DAG
+from airflow.exceptions import AirflowException
 from airflow.operators.python import PythonOperator
 import sys
 import os
@@ -13,7 +14,14 @@ from backend.services.providers.solarman_client import SolarmanAPI
 from backend.services.providers.shinemonitor_client import ShinemonitorAPI
 from backend.services.providers.soliscloud_client import SolisCloudAPI
 from backend.services.etl.etl_service import normalize_data_entry, insert_data_to_db
-from backend.services.etl.api_fetcher import fetch_for_all_panels
+from backend.services.etl.api_fetcher import fetch_for_all_panels, merge_summaries, plan_credential_shards
+from backend.services.etl.async_fetcher import run_async_etl
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One mapped task per provider; each runs in the pool 'etl_<provider>' (create with `airflow pools set`)
+PROVIDERS = ('solarman', 'shinemonitor', 'soliscloud')
 
 default_args = {
     'owner': 'rayvolt',
@@ -27,27 +35,92 @@ dag = DAG(
     'solar_etl_dag',
     default_args=default_args,
     description='ETL for Solarman and Solis data',
-    schedule_interval='@hourly',
+    # Adaptive polling decides per device whether a tick fetches it; without it every device is polled hourly
+    schedule_interval=timedelta(minutes=int(settings.POLL_TICK_MINUTES)) if settings.ADAPTIVE_POLLING else '@hourly',
     catchup=False,
     max_active_runs=1,
+    params={  # Override per run via "Trigger DAG w/ config"
+        'max_workers': settings.ETL_MAX_WORKERS,
+        'async_mode': False,  # Run on the asyncio client layer instead of the thread pool
+        'max_concurrency': settings.ASYNC_MAX_CONCURRENCY,
+    },
 )
 
-def run_etl_historical(**kwargs):
-    fetch_for_all_panels(historical=True)  # Last 7 days historical
+def _run_etl(historical: bool, params: dict, credential_ids=None, run_id=None, shard=None):
+    # run_id tags the etl_telemetry rows, so every shard of a DAG run groups together;
+    # shard keeps the Pushgateway metrics of shards on the same worker apart
+    if params.get('async_mode'):
+        return run_async_etl(historical=historical, max_concurrency=params.get('max_concurrency'),
+                             credential_ids=credential_ids, run_id=run_id, shard=shard)
+    return fetch_for_all_panels(historical=historical, max_workers=params.get('max_workers'),
+                                credential_ids=credential_ids, run_id=run_id, shard=shard)
+
+def plan_shards(**kwargs):
+    """Pushes the credential shards of each provider under its own XCom key (IDs only, never secrets)."""
+    shards = plan_credential_shards(settings.ETL_SHARD_SIZE)
+    for provider in set(shards) - set(PROVIDERS):
+        logger.warning(f"Credentials of unknown provider {provider} are not fetched: {sum(map(len, shards[provider]))}")
+    for provider in PROVIDERS:
+        kwargs['ti'].xcom_push(key=provider, value=[{'credential_ids': ids} for ids in shards.get(provider, [])])
+
+def run_shard(credential_ids, **kwargs):
+    # Historical (last 7 days, incremental) then realtime for this shard only; a retry re-runs just this shard.
+    # A credential that fails (bad login, provider outage) does not fail the shard: retrying the shard would
+    # refetch every good credential with it. Failures are reported by merge_shard_metrics instead; only
+    # shard-level errors (database, credential loading) raise here and are retried.
+    ti = kwargs['ti']
+    shard = f"{ti.task_id}-{ti.map_index}"
+    summary = {
+        'historical': _run_etl(True, kwargs['params'], credential_ids, kwargs.get('run_id'), shard),
+        'realtime': _run_etl(False, kwargs['params'], credential_ids, kwargs.get('run_id'), shard),
+    }
+    ti.xcom_push(key='summary', value=summary)
+    failed = sorted(set(summary['historical']['failed_credentials'] + summary['realtime']['failed_credentials']))
+    if failed:
+        logger.warning(f"Credentials {failed} failed in shard {credential_ids}; see the log above")
+    return summary
 
-def run_etl_realtime(**kwargs):
-    fetch_for_all_panels(historical=False)  # Current realtime
+def merge_shard_metrics(**kwargs):
+    ti = kwargs['ti']
+    metrics = {}
+    for provider in PROVIDERS:
+        shard_summaries = [s for s in (ti.xcom_pull(task_ids=f'fetch_{provider}', key='summary') or []) if s]
+        metrics[provider] = {
+            'shards': len(shard_summaries),
+            'historical': merge_summaries([s['historical'] for s in shard_summaries]),
+            'realtime': merge_summaries([s['realtime'] for s in shard_summaries]),
+        }
+    metrics['total'] = {
+        kind: merge_summaries([metrics[provider][kind] for provider in PROVIDERS]) for kind in ('historical', 'realtime')
+    }
+    for name, values in metrics.items():
+        logger.info(f"ETL {name}: {values}")
+    failed = sorted(set(metrics['total']['historical']['failed_credentials'] + metrics['total']['realtime']['failed_credentials']))
+    if failed:
+        # Marks the run failed for alerting; the next run fetches these credentials again as usual
+        raise AirflowException(f"{len(failed)} credentials failed: {failed}; see the fetch_* shard logs")
+    return metrics
 
-historical_task = PythonOperator(
-    task_id='fetch_historical_data',
-    python_callable=run_etl_historical,
+plan_task = PythonOperator(
+    task_id='plan_credential_shards',
+    python_callable=plan_shards,
     dag=dag,
 )
 
-realtime_task = PythonOperator(
-    task_id='fetch_realtime_data',
-    python_callable=run_etl_realtime,
+merge_task = PythonOperator(
+    task_id='merge_shard_metrics',
+    python_callable=merge_shard_metrics,
+    trigger_rule='all_done',  # Report every shard, including failed ones
+    retries=0,
     dag=dag,
 )
 
-historical_task >> realtime_task
+for provider in PROVIDERS:
+    shard_task = PythonOperator.partial(
+        task_id=f'fetch_{provider}',
+        python_callable=run_shard,
+        pool=f'etl_{provider}',
+        max_active_tis_per_dag=settings.ETL_MAX_ACTIVE_SHARDS,
+        dag=dag,
+    ).expand(op_kwargs=plan_task.output[provider])
+    plan_task >> shard_task >> merge_task
@@ -7,6 +7,7 @@ from .config.database import init_db, engine
 from .controllers.auth import router as auth_router
 from .controllers.customers import router as customers_router
 from .controllers.api_credentials import router as api_credentials_router  # Add this
+from .controllers.backfill import router as backfill_router
 from .models.user import Base as ModelsBase  # For create_all
 from .models.plant import Plant
 import time
@@ -32,6 +33,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],  # Explicit OPTIONS
     allow_headers=["*"],
+    expose_headers=["X-Resolution"],  # Bucket size chosen by /dashboard/timeseries
 )
 
 # Include routers
@@ -39,6 +41,7 @@ app.include_router(auth_router)
 app.include_router(customers_router)
 app.include_router(api_credentials_router)
 app.include_router(dashboard_router)
+app.include_router(backfill_router)
 
 # Create tables from models (safe with schema.sql)
 ModelsBase.metadata.create_all(bind=engine)
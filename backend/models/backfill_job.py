@@ -0,0 +1,49 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, ForeignKey, JSON
+from sqlalchemy.sql import func
+from pydantic import BaseModel
+from datetime import date
+from typing import Dict, Optional
+from .user import Base  # Shared Base
+
+class BackfillJob(Base):
+    __tablename__ = "backfill_jobs"
+    job_id = Column(BigInteger, primary_key=True)
+    batch_id = Column(String, nullable=False, index=True)
+    credential_id = Column(Integer, ForeignKey("api_credentials.credential_id"), nullable=False)
+    api_provider = Column(String, nullable=False)  # api_provider_type ENUM in schema
+    customer_id = Column(String, ForeignKey("customers.customer_id"), nullable=False)
+    plant_id = Column(String, nullable=False)
+    device_sn = Column(String, nullable=False)
+    device = Column(JSON, nullable=False)  # JSONB in schema
+    day = Column(Date, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime(timezone=True), server_default=func.now())
+    locked_by = Column(String)
+    locked_at = Column(DateTime(timezone=True))
+    rows_inserted = Column(Integer)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class BackfillRequest(BaseModel):
+    customer_id: Optional[str] = None  # Either a customer (all its plants) ...
+    plant_id: Optional[str] = None  # ... or one plant
+    start_date: date
+    end_date: date
+
+class BackfillQueuedResponse(BaseModel):
+    batch_id: str
+    plants: int
+    devices: int
+    shards: int
+
+class BackfillStatusShards(BaseModel):
+    shards: int
+    rows: int
+    first_day: Optional[date] = None
+    last_day: Optional[date] = None
+
+class BackfillStatusResponse(BaseModel):
+    batch_id: Optional[str] = None
+    statuses: Dict[str, BackfillStatusShards]
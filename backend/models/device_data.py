@@ -2,7 +2,7 @@ from sqlalchemy import Column, String, Float, DateTime, ForeignKey
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from .user import Base  # Shared Base
 
@@ -11,7 +11,7 @@ class DeviceDataHistorical(Base):
     device_sn = Column(String, ForeignKey("devices.device_sn"), primary_key=True)
     timestamp = Column(DateTime(timezone=True), primary_key=True)  # Fixed: DateTime(timezone=True)
     
-    # PV Voltages & Currents (pv01 to pv12)
+    # PV Voltages & Currents (pv01 to pv16)
     pv01_voltage = Column(Float)
     pv01_current = Column(Float)
     pv02_voltage = Column(Float)
@@ -36,6 +36,14 @@ class DeviceDataHistorical(Base):
     pv11_current = Column(Float)
     pv12_voltage = Column(Float)
     pv12_current = Column(Float)
+    pv13_voltage = Column(Float)
+    pv13_current = Column(Float)
+    pv14_voltage = Column(Float)
+    pv14_current = Column(Float)
+    pv15_voltage = Column(Float)
+    pv15_current = Column(Float)
+    pv16_voltage = Column(Float)
+    pv16_current = Column(Float)
     
     # AC Voltages & Currents
     r_voltage = Column(Float)
@@ -89,6 +97,14 @@ class DeviceDataResponse(BaseModel):
     pv11_current: Optional[float]
     pv12_voltage: Optional[float]
     pv12_current: Optional[float]
+    pv13_voltage: Optional[float]
+    pv13_current: Optional[float]
+    pv14_voltage: Optional[float]
+    pv14_current: Optional[float]
+    pv15_voltage: Optional[float]
+    pv15_current: Optional[float]
+    pv16_voltage: Optional[float]
+    pv16_current: Optional[float]
     
     # AC Voltages & Currents
     r_voltage: Optional[float]
@@ -115,4 +131,17 @@ class DeviceDataResponse(BaseModel):
     updated_at: Optional[datetime]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class TimeseriesBatchRequest(BaseModel):
+    deviceIds: List[str]
+    metrics: List[str]  # Columns (total_power) or chart groups (panel_voltages, input_currents, ...)
+    timeRange: str = "24h"
+    resolution: str = "auto"
+
+class TimeseriesSeries(BaseModel):
+    deviceId: str
+    metric: str
+    timeRange: str
+    resolution: str
+    data: List[Dict[str, Any]]
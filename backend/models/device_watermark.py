@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from pydantic import BaseModel
+from datetime import datetime
+from .user import Base  # Shared Base
+
+class DeviceWatermark(Base):
+    __tablename__ = "device_watermarks"
+    device_sn = Column(String, ForeignKey("devices.device_sn"), primary_key=True)
+    api_provider = Column(String, nullable=False)  # api_provider_type ENUM in schema
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)  # Newest stored sample
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class DeviceWatermarkResponse(BaseModel):
+    device_sn: str
+    api_provider: str
+    last_timestamp: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -9,14 +9,38 @@ from backend.config.settings import settings
 from backend.services.providers.solarman_client import SolarmanAPI
 from backend.services.providers.shinemonitor_client import ShinemonitorAPI
 from backend.services.providers.soliscloud_client import SolisCloudAPI
-from backend.services.etl.etl_service import normalize_data_entry, insert_data_to_db
+from backend.services.providers.errors import ProviderFetchError
+from backend.services.etl.etl_service import insert_snapshot_to_db
+from backend.services.etl.normalizer import normalize_batch
+from backend.services.etl.pipeline import ChunkWriter, stream_device
+from backend.services.etl.poll_scheduler import PollScheduler
+from backend.services.etl.telemetry import RunTelemetry, current as current_telemetry
+from backend.services.etl.watermarks import load_watermarks, historical_window, mark_credential_fetched
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional
 
-engine = create_engine(settings.POSTGRES_URL)
+# One connection per concurrent worker; worker counts are capped to it (see cap_workers)
+DB_POOL_SIZE = max(1, int(settings.ETL_MAX_WORKERS))
+engine = create_engine(
+    settings.POSTGRES_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=2,  # Headroom for run-level writes (telemetry, schedules) next to the workers
+    pool_pre_ping=True
+)
 Session = sessionmaker(bind=engine)
 logger = logging.getLogger(__name__)
 
+def cap_workers(requested: Optional[int], default: int) -> int:
+    """Worker threads that each hold a session, capped at the pool size so none blocks on checkout."""
+    workers = max(1, int(requested or default))
+    if workers > DB_POOL_SIZE:
+        logger.warning(f"{workers} workers requested but the DB pool holds {DB_POOL_SIZE} connections (ETL_MAX_WORKERS); using {DB_POOL_SIZE}")
+        return DB_POOL_SIZE
+    return workers
+
 def get_client(api_provider: str, credential: dict):
     api_provider = api_provider.lower()
     if api_provider == 'solarman':
@@ -24,112 +48,289 @@ def get_client(api_provider: str, credential: dict):
             email=credential.get('username', ''),  # Assuming username is email for Solarman
             password_sha256=credential.get('password', ''),
             app_id=credential.get('api_key', ''),
-            app_secret=credential.get('api_secret', '')
+            app_secret=credential.get('api_secret', ''),
+            base_url=settings.SOLARMAN_BASE_URL
         )
     elif api_provider == 'shinemonitor':
-        return ShinemonitorAPI(company_key=settings.COMPANY_KEY)
+        return ShinemonitorAPI(company_key=settings.COMPANY_KEY, base_url=settings.SHINEMONITOR_BASE_URL)
     elif api_provider == 'soliscloud':
         return SolisCloudAPI(
             api_key=credential.get('api_key', ''),
-            api_secret=credential.get('api_secret', '')
+            api_secret=credential.get('api_secret', ''),
+            base_url=settings.SOLISCLOUD_BASE_URL
         )
     raise ValueError(f"Unknown API provider: {api_provider}")
 
-def fetch_for_all_panels(historical: bool = False):
-    with Session() as session:
-        result = session.execute(text("SELECT * FROM api_credentials"))
-        credentials = [dict(row) for row in result.fetchall()]
+# Called as observer(api_provider, device_sn, entries_fetched, seconds) after each device of a credential.
+# Seconds cover fetch and normalization plus any wait for the writer thread to accept the next chunk.
+device_observers: List[Callable[[str, str, int, float], None]] = []
 
-        logger.info(f"Processing {len(credentials)} credentials (historical={historical})")
+PROVIDER_CONCURRENCY = {
+    'solarman': settings.SOLARMAN_MAX_CONCURRENCY,
+    'shinemonitor': settings.SHINEMONITOR_MAX_CONCURRENCY,
+    'soliscloud': settings.SOLISCLOUD_MAX_CONCURRENCY,
+}
 
-        for credential in credentials:
-            uid = credential.get('user_id', 'unknown')
-            prov = credential.get('api_provider', 'unknown').lower()
+def plant_id_of(plant: dict) -> Optional[str]:
+    return plant.get('plant_id') or plant.get('pid') or plant.get('id') or plant.get('station_id')
 
-            try:
-                client = get_client(prov, credential)
-                username = credential.get('username', '')
-                password = credential.get('password', '')
-
-                # Fetch plants/stations
-                if prov == 'solarman':
-                    plants = client.get_plant_list(uid, username, password)
-                elif prov == 'shinemonitor':
-                    plants = client.fetch_plant_list(uid, username, password)
-                elif prov == 'soliscloud':
-                    plants = client.get_all_stations(uid)
-                else:
-                    logger.warning(f"Skipping unknown provider: {prov}")
-                    continue
-
-                logger.info(f"Fetched {len(plants)} plants for user {uid} ({prov})")
+def list_plants(client, api_provider: str, credential: dict) -> List[dict]:
+    """Plants/stations of the credential's account."""
+    uid = credential.get('user_id', 'unknown')
+    if api_provider == 'solarman':
+        return client.get_plant_list(uid, credential.get('username', ''), credential.get('password', ''))
+    if api_provider == 'shinemonitor':
+        return client.fetch_plant_list(uid, credential.get('username', ''), credential.get('password', ''))
+    if api_provider == 'soliscloud':
+        return client.get_all_stations(uid)
+    raise ValueError(f"Unknown API provider: {api_provider}")
 
+def list_devices(client, api_provider: str, credential: dict, plant_id: str) -> List[dict]:
+    """Devices/inverters of one plant."""
+    uid = credential.get('user_id', 'unknown')
+    if api_provider == 'solarman':
+        return client.get_all_devices(uid, credential.get('username', ''), credential.get('password', ''), plant_id)
+    if api_provider == 'shinemonitor':
+        return client.fetch_plant_devices(uid, credential.get('username', ''), credential.get('password', ''), plant_id)
+    if api_provider == 'soliscloud':
+        return client.get_all_inverters(uid, station_id=plant_id)
+    raise ValueError(f"Unknown API provider: {api_provider}")
+
+def iter_device_history(client, api_provider: str, credential: dict, plant_id: str, device: dict,
+                        start_date: str, end_date: str) -> Iterator[List[dict]]:
+    """Pages of raw historical entries of one device between start_date and end_date (YYYY-MM-DD, inclusive)."""
+    uid = credential.get('user_id', 'unknown')
+    if api_provider in ('solarman', 'shinemonitor'):
+        return client.iter_historical_data(uid, credential.get('username', ''), credential.get('password', ''), device, start_date, end_date)
+    if api_provider == 'soliscloud':
+        return client.iter_inverter_historical_data(uid, device=device, start_date=start_date, end_date=end_date, station_id=plant_id)
+    raise ValueError(f"Unknown API provider: {api_provider}")
+
+def _soliscloud_bulk_realtime(client: SolisCloudAPI, session, credential: dict) -> int:
+    """One realtime snapshot of every inverter of the account, written page by page (up to 100 devices each)."""
+    inserted = 0
+    telemetry = current_telemetry()
+    for entries in client.iter_realtime_pages(credential.get('user_id', 'unknown')):
+        if entries:
+            normalized = normalize_batch(entries, 'soliscloud')
+            started = time.perf_counter()
+            counts = insert_snapshot_to_db(session, normalized, credential['customer_id'], 'soliscloud')
+            inserted += counts['inserted']
+            if telemetry is not None:
+                telemetry.add(rows_fetched=len(entries), rows_normalized=len(normalized), rows_inserted=counts['inserted'],
+                              rows_duplicate=counts['duplicates'], rows_rejected=counts['rejected'],
+                              write_seconds=time.perf_counter() - started)
+    return inserted
+
+def process_credential(credential: dict, historical: bool = False, run: Optional[RunTelemetry] = None) -> int:
+    """
+    Fetches and stores data for a single credential in its own DB session.
+    Errors are logged and rolled back here so one bad account never affects the others.
+    Telemetry goes to the run's totals when given, and to etl_telemetry either way.
+    Returns the number of rows inserted.
+    """
+    uid = credential.get('user_id', 'unknown')
+    prov = credential.get('api_provider', 'unknown').lower()
+    rows_written = 0
+    client = None
+    failed = False
+    failed_devices: List[str] = []
+    telemetry = (run or RunTelemetry(historical)).credential(prov, credential.get('credential_id'))
+
+    with Session() as session, telemetry.activate():
+        try:
+            client = get_client(prov, credential)
+            username = credential.get('username', '')
+            password = credential.get('password', '')
+
+            if prov == 'soliscloud' and not historical and settings.SOLISCLOUD_REALTIME_MODE.lower() == 'bulk':
+                rows_written = _soliscloud_bulk_realtime(client, session, credential)
+                session.commit()
+                mark_credential_fetched(session, credential.get('credential_id'))
+                return rows_written
+
+            # Fetch plants/stations
+            plants = list_plants(client, prov, credential)
+            logger.info(f"Fetched {len(plants)} plants for user {uid} ({prov})")
+            scheduler = PollScheduler(prov, historical) if settings.ADAPTIVE_POLLING else None
+
+            with ChunkWriter(session, credential['customer_id'], prov, realtime=not historical) as writer:
                 for plant in plants:
-                    plant_id = plant.get('plant_id') or plant.get('pid') or plant.get('id') or plant.get('station_id')
+                    plant_id = plant_id_of(plant)
                     if not plant_id:
                         logger.warning(f"Skipping plant without ID: {plant}")
                         continue
 
                     # Fetch devices
-                    if prov == 'solarman':
-                        devices = client.get_all_devices(uid, username, password, plant_id)
-                    elif prov == 'shinemonitor':
-                        devices = client.fetch_plant_devices(uid, username, password, plant_id)
-                    elif prov == 'soliscloud':
-                        devices = client.get_all_inverters(uid, station_id=plant_id)
+                    devices = list_devices(client, prov, credential, plant_id)
 
                     logger.info(f"Fetched {len(devices)} devices for plant {plant_id}")
+                    writer.drain()  # The writer thread must be done with the session before we query it here
+                    device_sns = [d.get('sn') or d.get('deviceSn') for d in devices]
+                    watermarks = load_watermarks(session, device_sns) if historical else {}
+                    if scheduler is not None:
+                        scheduler.load_plant(session, plant_id, plant, device_sns)
 
                     for device in devices:
                         device_sn = device.get('sn') or device.get('deviceSn')
                         if not device_sn:
                             logger.warning(f"Skipping device without SN: {device}")
                             continue
+                        if scheduler is not None and not scheduler.is_due(device_sn):
+                            continue
+                        device_started = time.perf_counter()
 
-                        # Fetch data
-                        if historical:
-                            end_date = datetime.now().strftime('%Y-%m-%d')
-                            start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                            if prov == 'solarman':
-                                data = client.get_historical_data(uid, username, password, device, start_date, end_date)
-                            elif prov == 'shinemonitor':
-                                data = client.fetch_historical_data(uid, username, password, device, start_date, end_date)
-                            elif prov == 'soliscloud':
-                                data = client.get_inverter_historical_data(uid, device=device, start_date=start_date, end_date=end_date, station_id=plant_id)
-                        else:
-                            if prov == 'solarman':
-                                data = client.get_realtime_data(uid, username, password, device)
-                            elif prov == 'shinemonitor':
-                                data = client.fetch_current_data(uid, username, password, device)
-                            elif prov == 'soliscloud':
-                                data = client.get_inverter_current_data(uid, device=device, station_id=plant_id)
-
-                        if not data:
-                            logger.info(f"No data fetched for device {device_sn} (historical={historical})")
+                        try:
+                            with telemetry.activate(device_sn):
+                                # Fetch data: historical ranges stream page by page, realtime is a single page
+                                since = None
+                                if historical:
+                                    start_date, end_date, since = historical_window(watermarks.get(device_sn))
+                                    pages = iter_device_history(client, prov, credential, plant_id, device, start_date, end_date)
+                                else:
+                                    if prov == 'solarman':
+                                        data = client.get_realtime_data(uid, username, password, device)
+                                    elif prov == 'shinemonitor':
+                                        data = client.fetch_current_data(uid, username, password, device)
+                                    elif prov == 'soliscloud':
+                                        data = client.get_inverter_current_data(uid, device=device, station_id=plant_id)
+                                    telemetry.add(device_sn, fetch_seconds=time.perf_counter() - device_started)
+                                    pages = [data] if data else []
+
+                                fetched = stream_device(pages, writer, device_sn, since,
+                                                        observe=scheduler.observe if scheduler is not None else None)
+                        except ProviderFetchError as e:
+                            # Historical: the days before the failed one are written and the watermark stops there
+                            logger.warning(f"Fetch of device {device_sn} (historical={historical}) failed: {e}")
+                            failed_devices.append(device_sn)
+                            if scheduler is not None:
+                                scheduler.plan(device_sn, plant_id, failed=True)
                             continue
+                        if not fetched:
+                            logger.info(f"No data fetched for device {device_sn} (historical={historical})")
+                        if scheduler is not None:
+                            scheduler.plan(device_sn, plant_id)
+                        for observer in device_observers:
+                            observer(prov, device_sn, fetched, time.perf_counter() - device_started)
 
-                        normalized = []
-                        for entry in data:
-                            norm = normalize_data_entry(entry, prov)
-                            if norm:
-                                normalized.append(norm)
-
-                        if normalized:
-                            insert_data_to_db(
-                                session,
-                                normalized,
-                                device_sn,
-                                credential['customer_id'],
-                                prov,
-                                realtime=not historical
-                            )
-                            logger.info(f"Inserted {len(normalized)} entries for device {device_sn}")
+                    if scheduler is not None:
+                        writer.drain()
+                        scheduler.flush(session)
 
-                session.commit()
+            rows_written = writer.counts['inserted']
+            if failed_devices:
+                logger.warning(f"{len(failed_devices)} device fetches failed for user {uid} ({prov}); "
+                               f"they are fetched again on the next run")
+            if scheduler is not None and scheduler.skipped:
+                logger.info(f"Skipped {scheduler.skipped} devices not yet due for user {uid} ({prov})")
+            session.commit()
+            mark_credential_fetched(session, credential.get('credential_id'))
+
+        except Exception as e:
+            logger.error(f"Error processing credential for user {uid} ({prov}): {str(e)}", exc_info=True)
+            session.rollback()
+            failed = True
+            raise
+        finally:
+            telemetry.finish(session, failed)
+            if client is not None:
+                client.close()
+
+    return rows_written
+
+def _run_credential(credential: dict, historical: bool, slots: threading.BoundedSemaphore,
+                    run: Optional[RunTelemetry] = None) -> int:
+    # Provider pools cap per-vendor concurrency; the shared slots cap the run as a whole.
+    with slots:
+        return process_credential(credential, historical, run)
+
+def load_api_credentials(credential_ids: Optional[List[int]] = None) -> List[dict]:
+    """Every stored credential, or only the given ones (one shard of the DAG)."""
+    with Session() as session:
+        if credential_ids is None:
+            result = session.execute(text("SELECT * FROM api_credentials"))
+        else:
+            result = session.execute(
+                text("SELECT * FROM api_credentials WHERE credential_id = ANY(:credential_ids)"),
+                {'credential_ids': [int(c) for c in credential_ids]}
+            )
+        return [dict(row) for row in result.fetchall()]
 
-            except Exception as e:
-                logger.error(f"Error processing credential for user {uid} ({prov}): {str(e)}", exc_info=True)
-                session.rollback()
-                continue
+def plan_credential_shards(shard_size: Optional[int] = None) -> Dict[str, List[List[int]]]:
+    """
+    Splits the credential IDs into shards of at most shard_size, grouped by provider
+    ({provider: [[id, ...], ...]}). Only IDs are returned: shards travel through Airflow XCom.
+    """
+    shard_size = max(1, int(shard_size or settings.ETL_SHARD_SIZE))
+    with Session() as session:
+        result = session.execute(text("SELECT credential_id, api_provider FROM api_credentials ORDER BY credential_id"))
+        rows = result.fetchall()
+
+    by_provider: Dict[str, List[int]] = {}
+    for row in rows:
+        by_provider.setdefault(str(row.api_provider).lower(), []).append(row.credential_id)
+    return {
+        prov: [ids[i:i + shard_size] for i in range(0, len(ids), shard_size)]
+        for prov, ids in by_provider.items()
+    }
+
+def merge_summaries(summaries: List[Dict]) -> Dict:
+    """Adds up run summaries (credentials, succeeded, failed, rows, failed_credentials) from several shards or runs."""
+    merged = {'credentials': 0, 'succeeded': 0, 'failed': 0, 'rows': 0, 'failed_credentials': []}
+    for summary in summaries:
+        for key, value in (summary or {}).items():
+            merged[key] = merged.get(key, [] if isinstance(value, list) else 0) + value
+    return merged
+
+def fetch_for_all_panels(historical: bool = False, max_workers: Optional[int] = None,
+                         credential_ids: Optional[List[int]] = None, run_id: Optional[str] = None,
+                         shard: Optional[str] = None) -> Dict:
+    """
+    Runs the ETL for every stored credential (or only credential_ids).
+    Credentials are fanned out over a bounded worker pool (one credential per worker) with a
+    separate concurrency cap per provider; max_workers=1 processes them one at a time.
+    Telemetry rows are tagged with run_id (the Airflow run, so shards of one run group together); shard
+    names the Pushgateway group of this process's metrics.
+    The summary lists the IDs of the credentials that failed under failed_credentials.
+    """
+    credentials = load_api_credentials(credential_ids)
+    max_workers = cap_workers(max_workers, settings.ETL_MAX_WORKERS)
+    logger.info(f"Processing {len(credentials)} credentials (historical={historical}, max_workers={max_workers})")
+
+    by_provider: Dict[str, List[dict]] = {}
+    for credential in credentials:
+        prov = credential.get('api_provider', 'unknown').lower()
+        by_provider.setdefault(prov, []).append(credential)
+
+    slots = threading.BoundedSemaphore(max_workers)
+    run = RunTelemetry(historical, run_id, shard)
+    summary = {'credentials': len(credentials), 'succeeded': 0, 'failed': 0, 'rows': 0, 'failed_credentials': []}
+    executors = []
+    futures = {}
+    try:
+        for prov, provider_credentials in by_provider.items():
+            pool_size = min(max_workers, PROVIDER_CONCURRENCY.get(prov, 1), len(provider_credentials))
+            executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f"etl-{prov}")
+            executors.append(executor)
+            for credential in provider_credentials:
+                futures[executor.submit(_run_credential, credential, historical, slots, run)] = credential
+
+        for future in as_completed(futures):
+            try:
+                summary['rows'] += future.result()
+                summary['succeeded'] += 1
+            except Exception:
+                # Already logged with traceback inside the worker
+                summary['failed'] += 1
+                summary['failed_credentials'].append(futures[future].get('credential_id'))
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True)
+        with Session() as session:
+            run.finish(session)
 
-        logger.info("ETL process completed successfully.")
+    logger.info(
+        f"ETL process completed: {summary['succeeded']}/{summary['credentials']} credentials succeeded, "
+        f"{summary['failed']} failed, {summary['rows']} rows written."
+    )
+    return summary
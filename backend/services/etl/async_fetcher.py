@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+# Fix for container path: Add /opt/airflow to Python path (where backend is mounted)
+import sys
+sys.path.insert(0, '/opt/airflow')
+
+from backend.config.settings import settings
+from backend.services.providers.async_clients import (
+    AsyncSolarmanAPI, AsyncShinemonitorAPI, AsyncSolisCloudAPI, create_http_client
+)
+from backend.services.providers.errors import ProviderDayError, ProviderFetchError
+from backend.services.etl.etl_service import insert_data_to_db, insert_snapshot_to_db
+from backend.services.etl.normalizer import NormalizedBatch, normalize_batch
+from backend.services.etl.api_fetcher import Session, load_api_credentials
+from backend.services.etl.poll_scheduler import PollScheduler
+from backend.services.etl.telemetry import CredentialTelemetry, RunTelemetry, current as current_telemetry
+from backend.services.etl.watermarks import (
+    load_watermarks, historical_window, filter_since, advance_watermark, mark_credential_fetched
+)
+
+logger = logging.getLogger(__name__)
+
+def get_async_client(api_provider: str, credential: dict, http: httpx.AsyncClient):
+    api_provider = api_provider.lower()
+    if api_provider == 'solarman':
+        return AsyncSolarmanAPI(
+            http,
+            email=credential.get('username', ''),  # Assuming username is email for Solarman
+            password_sha256=credential.get('password', ''),
+            app_id=credential.get('api_key', ''),
+            app_secret=credential.get('api_secret', ''),
+            base_url=settings.SOLARMAN_BASE_URL
+        )
+    elif api_provider == 'shinemonitor':
+        return AsyncShinemonitorAPI(http, company_key=settings.COMPANY_KEY, base_url=settings.SHINEMONITOR_BASE_URL)
+    elif api_provider == 'soliscloud':
+        return AsyncSolisCloudAPI(
+            http,
+            api_key=credential.get('api_key', ''),
+            api_secret=credential.get('api_secret', ''),
+            base_url=settings.SOLISCLOUD_BASE_URL
+        )
+    raise ValueError(f"Unknown API provider: {api_provider}")
+
+def _write_device(normalized: NormalizedBatch, device_sn: str, customer_id: str, prov: str, realtime: bool,
+                  telemetry: Optional[CredentialTelemetry] = None) -> Dict[str, int]:
+    # Runs on the DB executor: blocking SQLAlchemy work stays off the event loop
+    started = time.perf_counter()
+    with Session() as session:
+        counts = insert_data_to_db(session, normalized, device_sn, customer_id, prov, realtime=realtime)
+        if not realtime and counts['inserted'] + counts['duplicates']:
+            advance_watermark(session, device_sn, prov, normalized)
+    if telemetry is not None:
+        telemetry.add(device_sn, rows_inserted=counts['inserted'], rows_duplicate=counts['duplicates'],
+                      rows_rejected=counts['rejected'], write_seconds=time.perf_counter() - started)
+    return counts
+
+def _write_snapshot(entries: List[dict], customer_id: str, telemetry: Optional[CredentialTelemetry] = None) -> int:
+    # One bulk realtime page of SolisCloud inverters, on the DB executor
+    normalized = normalize_batch(entries, 'soliscloud')
+    started = time.perf_counter()
+    with Session() as session:
+        counts = insert_snapshot_to_db(session, normalized, customer_id, 'soliscloud')
+    if telemetry is not None:
+        telemetry.add(rows_fetched=len(entries), rows_normalized=len(normalized), rows_inserted=counts['inserted'],
+                      rows_duplicate=counts['duplicates'], rows_rejected=counts['rejected'],
+                      write_seconds=time.perf_counter() - started)
+    return counts['inserted']
+
+async def _soliscloud_bulk_realtime(client: AsyncSolisCloudAPI, credential: dict, db_executor: ThreadPoolExecutor) -> int:
+    """One realtime snapshot of every inverter of the account, as api_fetcher._soliscloud_bulk_realtime does."""
+    loop = asyncio.get_running_loop()
+    telemetry = current_telemetry()
+    inserted = 0
+    async for entries in client.iter_realtime_pages(credential.get('user_id', 'unknown')):
+        if entries:
+            inserted += await loop.run_in_executor(db_executor, _write_snapshot, entries, credential['customer_id'], telemetry)
+    return inserted
+
+def _finish_telemetry(telemetry: CredentialTelemetry, failed: bool) -> None:
+    with Session() as session:
+        telemetry.finish(session, failed)
+
+def _finish_run(run: RunTelemetry) -> None:
+    with Session() as session:
+        run.finish(session)
+
+def _load_watermarks(device_sns: List[str]) -> Dict:
+    with Session() as session:
+        return load_watermarks(session, device_sns)
+
+def _load_schedule(scheduler: PollScheduler, plant_id: str, plant: dict, device_sns: List[str]) -> None:
+    with Session() as session:
+        scheduler.load_plant(session, plant_id, plant, device_sns)
+
+def _flush_schedule(scheduler: PollScheduler) -> None:
+    with Session() as session:
+        scheduler.flush(session)
+
+def _mark_fetched(credential_id: Optional[int]) -> None:
+    with Session() as session:
+        mark_credential_fetched(session, credential_id)
+
+async def _process_device(client, prov: str, credential: dict, plant_id: str, device: dict, historical: bool,
+                          device_slots: asyncio.Semaphore, db_executor: ThreadPoolExecutor,
+                          watermark: Optional[datetime] = None, scheduler: Optional[PollScheduler] = None) -> int:
+    uid = credential.get('user_id', 'unknown')
+    username = credential.get('username', '')
+    password = credential.get('password', '')
+    device_sn = device.get('sn') or device.get('deviceSn')
+    if not device_sn:
+        logger.warning(f"Skipping device without SN: {device}")
+        return 0
+
+    telemetry = current_telemetry()
+    since = None
+    failure = None
+    async with device_slots:
+        started = time.perf_counter()  # Waiting for a device slot is not fetch time
+        with telemetry.activate(device_sn) if telemetry is not None else nullcontext():
+            if historical:
+                start_date, end_date, since = historical_window(watermark)
+                try:
+                    if prov == 'solarman':
+                        data = await client.get_historical_data(uid, username, password, device, start_date, end_date)
+                    elif prov == 'shinemonitor':
+                        data = await client.fetch_historical_data(uid, username, password, device, start_date, end_date)
+                    elif prov == 'soliscloud':
+                        data = await client.get_inverter_historical_data(uid, device=device, start_date=start_date, end_date=end_date, station_id=plant_id)
+                except ProviderDayError as e:
+                    # Only the days before the failed one are written, so the watermark stops there
+                    failure, data = e, e.rows
+            else:
+                if prov == 'solarman':
+                    data = await client.get_realtime_data(uid, username, password, device)
+                elif prov == 'shinemonitor':
+                    data = await client.fetch_current_data(uid, username, password, device)
+                elif prov == 'soliscloud':
+                    data = await client.get_inverter_current_data(uid, device=device, station_id=plant_id)
+    if telemetry is not None:
+        telemetry.add(device_sn, fetch_seconds=time.perf_counter() - started)
+
+    if not data:
+        if failure is not None:
+            raise failure
+        logger.info(f"No data fetched for device {device_sn} (historical={historical})")
+        return 0
+
+    started = time.perf_counter()
+    normalized = filter_since(normalize_batch(data, prov), since)
+    if telemetry is not None:
+        telemetry.add(device_sn, rows_fetched=len(data), rows_normalized=len(normalized),
+                      normalize_seconds=time.perf_counter() - started)
+    inserted = 0
+    if len(normalized):
+        if scheduler is not None:
+            scheduler.observe(device_sn, normalized)  # Event loop thread: no locking needed
+        loop = asyncio.get_running_loop()
+        counts = await loop.run_in_executor(db_executor, _write_device, normalized, device_sn, credential['customer_id'], prov,
+                                            not historical, telemetry)
+        inserted = counts['inserted']
+    if failure is not None:
+        raise failure  # After the good days are written
+    return inserted
+
+async def process_credential_async(credential: dict, historical: bool, http: httpx.AsyncClient,
+                                   device_slots: asyncio.Semaphore, db_executor: ThreadPoolExecutor,
+                                   run: Optional[RunTelemetry] = None) -> int:
+    """
+    Async counterpart of api_fetcher.process_credential: every device of the credential is fetched
+    concurrently (bounded by device_slots). A device whose provider fetch fails is logged and fetched
+    again next run; any other device error reports the credential as failed. Telemetry is collected as
+    in the threaded fetcher.
+    """
+    prov = credential.get('api_provider', 'unknown').lower()
+    telemetry = (run or RunTelemetry(historical)).credential(prov, credential.get('credential_id'))
+    failed = True
+    try:
+        # Device tasks created inside copy this context, so their API calls land on the credential
+        with telemetry.activate():
+            rows = await _process_credential_async(credential, historical, http, device_slots, db_executor)
+        failed = False
+        return rows
+    finally:
+        await asyncio.get_running_loop().run_in_executor(db_executor, _finish_telemetry, telemetry, failed)
+
+async def _process_credential_async(credential: dict, historical: bool, http: httpx.AsyncClient,
+                                    device_slots: asyncio.Semaphore, db_executor: ThreadPoolExecutor) -> int:
+    uid = credential.get('user_id', 'unknown')
+    prov = credential.get('api_provider', 'unknown').lower()
+    username = credential.get('username', '')
+    password = credential.get('password', '')
+
+    client = get_async_client(prov, credential, http)
+    loop = asyncio.get_running_loop()
+    if prov == 'soliscloud' and not historical and settings.SOLISCLOUD_REALTIME_MODE.lower() == 'bulk':
+        rows = await _soliscloud_bulk_realtime(client, credential, db_executor)
+        await loop.run_in_executor(db_executor, _mark_fetched, credential.get('credential_id'))
+        return rows
+
+    if prov == 'solarman':
+        plants = await client.get_plant_list(uid, username, password)
+    elif prov == 'shinemonitor':
+        plants = await client.fetch_plant_list(uid, username, password)
+    else:
+        plants = await client.get_all_stations(uid)
+    logger.info(f"Fetched {len(plants)} plants for user {uid} ({prov})")
+    scheduler = PollScheduler(prov, historical) if settings.ADAPTIVE_POLLING else None
+
+    tasks = []
+    polled = []  # (device_sn, plant_id) per task
+    for plant in plants:
+        plant_id = plant.get('plant_id') or plant.get('pid') or plant.get('id') or plant.get('station_id')
+        if not plant_id:
+            logger.warning(f"Skipping plant without ID: {plant}")
+            continue
+
+        if prov == 'solarman':
+            devices = await client.get_all_devices(uid, username, password, plant_id)
+        elif prov == 'shinemonitor':
+            devices = await client.fetch_plant_devices(uid, username, password, plant_id)
+        else:
+            devices = await client.get_all_inverters(uid, station_id=plant_id)
+        logger.info(f"Fetched {len(devices)} devices for plant {plant_id}")
+        device_sns = [d.get('sn') or d.get('deviceSn') for d in devices]
+        watermarks = {}
+        if historical:
+            watermarks = await loop.run_in_executor(db_executor, _load_watermarks, device_sns)
+        if scheduler is not None:
+            await loop.run_in_executor(db_executor, _load_schedule, scheduler, plant_id, plant, device_sns)
+
+        for device in devices:
+            device_sn = device.get('sn') or device.get('deviceSn')
+            if device_sn and scheduler is not None and not scheduler.is_due(device_sn):
+                continue
+            watermark = watermarks.get(device_sn)
+            tasks.append(_process_device(client, prov, credential, plant_id, device, historical, device_slots, db_executor,
+                                         watermark, scheduler))
+            polled.append((device_sn, plant_id))
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    if scheduler is not None:
+        for (device_sn, plant_id), result in zip(polled, results):
+            if device_sn:
+                scheduler.plan(device_sn, plant_id, failed=isinstance(result, BaseException))
+        await loop.run_in_executor(db_executor, _flush_schedule, scheduler)
+        if scheduler.skipped:
+            logger.info(f"Skipped {scheduler.skipped} devices not yet due for user {uid} ({prov})")
+    # Provider fetch failures stay with the device (as in process_credential); anything else fails the credential
+    fetch_failures = [r for r in results if isinstance(r, ProviderFetchError)]
+    if fetch_failures:
+        for failure in fetch_failures:
+            logger.warning(f"Fetch of device failed for user {uid} ({prov}, historical={historical}): {failure}")
+        logger.warning(f"{len(fetch_failures)} device fetches failed for user {uid} ({prov}); "
+                       f"they are fetched again on the next run")
+    errors = [r for r in results if isinstance(r, BaseException) and not isinstance(r, ProviderFetchError)]
+    for error in errors:
+        logger.error(f"Device fetch failed for user {uid} ({prov}): {error}", exc_info=error)
+    if errors:
+        raise errors[0]
+    await loop.run_in_executor(db_executor, _mark_fetched, credential.get('credential_id'))
+    return sum(r for r in results if not isinstance(r, BaseException))
+
+async def fetch_for_all_panels_async(historical: bool = False, max_concurrency: Optional[int] = None,
+                                     credential_ids: Optional[List[int]] = None, run_id: Optional[str] = None,
+                                     shard: Optional[str] = None) -> Dict:
+    """
+    Runs the ETL for every credential (or only credential_ids) on one event loop with one pooled HTTP client.
+    max_concurrency bounds the number of device fetches in flight across all credentials.
+    """
+    credentials = load_api_credentials(credential_ids)
+    max_concurrency = max(1, int(max_concurrency or settings.ASYNC_MAX_CONCURRENCY))
+    logger.info(f"Processing {len(credentials)} credentials asynchronously (historical={historical}, max_concurrency={max_concurrency})")
+
+    device_slots = asyncio.Semaphore(max_concurrency)
+    run = RunTelemetry(historical, run_id, shard)
+    summary = {'credentials': len(credentials), 'succeeded': 0, 'failed': 0, 'rows': 0, 'failed_credentials': []}
+    with ThreadPoolExecutor(max_workers=settings.ETL_MAX_WORKERS, thread_name_prefix='etl-db') as db_executor:
+        async with create_http_client() as http:
+            results = await asyncio.gather(
+                *(process_credential_async(c, historical, http, device_slots, db_executor, run) for c in credentials),
+                return_exceptions=True
+            )
+        await asyncio.get_running_loop().run_in_executor(db_executor, _finish_run, run)
+
+    for credential, result in zip(credentials, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Error processing credential for user {credential.get('user_id', 'unknown')} ({credential.get('api_provider', 'unknown')}): {result}")
+            summary['failed'] += 1
+            summary['failed_credentials'].append(credential.get('credential_id'))
+        else:
+            summary['succeeded'] += 1
+            summary['rows'] += result
+
+    logger.info(
+        f"Async ETL completed: {summary['succeeded']}/{summary['credentials']} credentials succeeded, "
+        f"{summary['failed']} failed, {summary['rows']} rows written."
+    )
+    return summary
+
+def run_async_etl(historical: bool = False, max_concurrency: Optional[int] = None,
+                  credential_ids: Optional[List[int]] = None, run_id: Optional[str] = None,
+                  shard: Optional[str] = None) -> Dict:
+    """Blocking entry point (Airflow / CLI) for the asyncio ETL."""
+    return asyncio.run(fetch_for_all_panels_async(historical=historical, max_concurrency=max_concurrency,
+                                                  credential_ids=credential_ids, run_id=run_id, shard=shard))
@@ -0,0 +1,297 @@
+# backend/services/etl/backfill.py
+"""
+Resumable historical backfill.
+
+A backfill request (a customer, or one plant of it, over a date range) is split into one shard per device
+and day in backfill_jobs. Workers claim shards with FOR UPDATE SKIP LOCKED, so any number of threads and
+processes can share the queue. Each shard is fetched through the provider client (whose rate limiter
+is shared per account), streamed through the usual normalize/write pipeline and checkpointed as 'done'.
+Failed shards go back to 'pending' with a growing delay until BACKFILL_MAX_ATTEMPTS. Shards left 'running'
+by a killed worker become claimable again after BACKFILL_STALE_MINUTES. An interrupted backfill therefore
+resumes at the shards it had not finished, and rows already written are skipped as duplicates.
+The continuous aggregates only refresh the last few days on their own, so a run re-materializes them
+for the days it wrote.
+
+    python -m backend.services.etl.backfill queue --customer CUST --start 2024-01-01 --end 2024-03-31 [--plant P]
+    python -m backend.services.etl.backfill run [--workers 4] [--batch BATCH_ID]
+    python -m backend.services.etl.backfill status [--batch BATCH_ID]
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+import pytz
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.config.settings import settings
+from backend.services.etl.api_fetcher import (
+    Session as SessionFactory, cap_workers, engine, get_client, iter_device_history, list_devices, list_plants, load_api_credentials, plant_id_of
+)
+from backend.services.etl.pipeline import ChunkWriter, stream_device
+
+logger = logging.getLogger(__name__)
+
+# Continuous aggregates over device_data_historical (see schema.sql)
+CONTINUOUS_AGGREGATES = ('device_data_hourly', 'device_data_daily')
+
+def queue_backfill(session: Session, customer_id: str, start: date, end: date, plant_id: Optional[str] = None) -> Dict:
+    """
+    Queues one shard per device and day for the customer's plants (or only plant_id). Devices are listed
+    through the customer's provider credentials. Re-queuing a device/day resets its shard unless it is running.
+    """
+    if start > end:
+        raise ValueError("start_date is after end_date")
+    if end > date.today():
+        raise ValueError("end_date is in the future")
+    if (end - start).days + 1 > int(settings.BACKFILL_MAX_DAYS):
+        raise ValueError(f"Backfills are limited to {settings.BACKFILL_MAX_DAYS} days")
+
+    credentials = session.execute(
+        text("SELECT credential_id FROM api_credentials WHERE customer_id = :customer_id"), {'customer_id': customer_id}
+    ).fetchall()
+    batch_id = uuid.uuid4().hex
+    shards = []
+    plants_found = 0
+    for credential in load_api_credentials([row.credential_id for row in credentials]):
+        prov = credential['api_provider'].lower()
+        client = get_client(prov, credential)
+        try:
+            for plant in list_plants(client, prov, credential):
+                current_plant = plant_id_of(plant)
+                if not current_plant or (plant_id is not None and str(current_plant) != str(plant_id)):
+                    continue
+                plants_found += 1
+                for device in list_devices(client, prov, credential, current_plant):
+                    device_sn = device.get('sn') or device.get('deviceSn')
+                    if not device_sn:
+                        continue
+                    shards.append({
+                        'batch_id': batch_id, 'credential_id': credential['credential_id'], 'api_provider': prov,
+                        'customer_id': customer_id, 'plant_id': str(current_plant), 'device_sn': device_sn,
+                        'device': json.dumps(device, default=str), 'start': start, 'end': end,
+                    })
+        finally:
+            client.close()
+
+    if plant_id is not None and not plants_found:
+        raise ValueError(f"Plant {plant_id} was not found in the customer's provider accounts")
+    if shards:
+        # One statement per device: generate_series expands it into its day shards
+        session.execute(text("""
+            INSERT INTO backfill_jobs (batch_id, credential_id, api_provider, customer_id, plant_id, device_sn, device, day)
+            SELECT :batch_id, :credential_id, CAST(:api_provider AS api_provider_type), :customer_id, :plant_id, :device_sn,
+                   CAST(:device AS JSONB), d::date
+            FROM generate_series(CAST(:start AS date), CAST(:end AS date), INTERVAL '1 day') AS d
+            ON CONFLICT (device_sn, day) DO UPDATE
+            SET batch_id = EXCLUDED.batch_id,
+                credential_id = EXCLUDED.credential_id,
+                device = EXCLUDED.device,
+                status = 'pending',
+                attempts = 0,
+                last_error = NULL,
+                available_at = NOW(),
+                updated_at = NOW()
+            WHERE backfill_jobs.status <> 'running'
+        """), shards)
+    session.commit()
+    days = (end - start).days + 1
+    logger.info(f"Queued backfill {batch_id} for customer {customer_id}: {len(shards)} devices x {days} days")
+    return {'batch_id': batch_id, 'plants': plants_found, 'devices': len(shards), 'shards': len(shards) * days}
+
+def _claim(session: Session, worker_id: str, batch_id: Optional[str]) -> Optional[Dict]:
+    row = session.execute(text("""
+        UPDATE backfill_jobs
+        SET status = 'running', locked_by = :worker_id, locked_at = NOW(), attempts = attempts + 1, updated_at = NOW()
+        WHERE job_id = (
+            SELECT job_id FROM backfill_jobs
+            WHERE (:batch_id IS NULL OR batch_id = :batch_id)
+              AND ((status = 'pending' AND available_at <= NOW())
+                   OR (status = 'running' AND locked_at < NOW() - make_interval(mins => :stale_minutes)))
+            ORDER BY day, job_id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING job_id, credential_id, api_provider, customer_id, plant_id, device_sn, device, day, attempts
+    """), {'worker_id': worker_id, 'batch_id': batch_id, 'stale_minutes': int(settings.BACKFILL_STALE_MINUTES)}).fetchone()
+    session.commit()
+    return dict(row._mapping) if row is not None else None
+
+def _has_waiting(session: Session, batch_id: Optional[str]) -> bool:
+    # Pending shards still in their retry delay: worth waiting for rather than exiting
+    return bool(session.execute(text("""
+        SELECT 1 FROM backfill_jobs
+        WHERE (:batch_id IS NULL OR batch_id = :batch_id) AND status = 'pending' AND available_at > NOW()
+        LIMIT 1
+    """), {'batch_id': batch_id}).fetchone())
+
+class BackfillWorker:
+    """Claims and runs shards until the queue (or one batch of it) has nothing left to claim."""
+
+    def __init__(self, batch_id: Optional[str] = None):
+        self.batch_id = batch_id
+        self.stats = {'done': 0, 'retried': 0, 'failed': 0, 'rows': 0}
+        self.written_days = set()
+        self._credentials: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _credential(self, credential_id: int) -> dict:
+        with self._lock:
+            if credential_id not in self._credentials:
+                found = load_api_credentials([credential_id])
+                if not found:
+                    raise ValueError(f"Credential {credential_id} no longer exists")
+                self._credentials[credential_id] = found[0]
+            return self._credentials[credential_id]
+
+    def _client(self, job: Dict):
+        # One client per thread and credential: tokens and HTTP sessions are not shared across threads
+        clients = self._local.__dict__.setdefault('clients', {})
+        if job['credential_id'] not in clients:
+            clients[job['credential_id']] = get_client(job['api_provider'], self._credential(job['credential_id']))
+        return clients[job['credential_id']]
+
+    def _run_shard(self, session: Session, job: Dict) -> int:
+        """
+        Fetches and writes the shard's device/day; returns the rows inserted. Raises ProviderFetchError when
+        the day could not be fetched (a ProviderDayError for API errors and for throttling that outlasted the
+        client's retries), so the shard goes back to pending instead of being checkpointed as done.
+        """
+        prov = job['api_provider']
+        device = job['device'] if isinstance(job['device'], dict) else json.loads(job['device'])
+        day = job['day'].strftime('%Y-%m-%d')
+        pages = iter_device_history(self._client(job), prov, self._credential(job['credential_id']),
+                                    job['plant_id'], device, day, day)
+        with ChunkWriter(session, job['customer_id'], prov) as writer:
+            stream_device(pages, writer, job['device_sn'])
+        return writer.counts['inserted']
+
+    def _finish(self, session: Session, job: Dict, rows: int) -> None:
+        session.execute(text("""
+            UPDATE backfill_jobs
+            SET status = 'done', rows_inserted = :rows, last_error = NULL, locked_by = NULL, updated_at = NOW()
+            WHERE job_id = :job_id
+        """), {'job_id': job['job_id'], 'rows': rows})
+        session.commit()
+
+    def _fail(self, session: Session, job: Dict, error: Exception) -> bool:
+        """Returns True when the shard will be retried."""
+        retry = job['attempts'] < int(settings.BACKFILL_MAX_ATTEMPTS)
+        delay = int(settings.BACKFILL_RETRY_DELAY_SECONDS) * job['attempts']
+        session.rollback()
+        session.execute(text("""
+            UPDATE backfill_jobs
+            SET status = :status, last_error = :error, locked_by = NULL,
+                available_at = NOW() + make_interval(secs => :delay), updated_at = NOW()
+            WHERE job_id = :job_id
+        """), {'job_id': job['job_id'], 'status': 'pending' if retry else 'failed', 'error': str(error)[:2000], 'delay': delay})
+        session.commit()
+        return retry
+
+    def work(self) -> None:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}-{threading.current_thread().name}"
+        try:
+            while True:
+                with SessionFactory() as session:
+                    job = _claim(session, worker_id, self.batch_id)
+                    if job is None:
+                        if _has_waiting(session, self.batch_id):
+                            time.sleep(min(5, int(settings.BACKFILL_RETRY_DELAY_SECONDS)))
+                            continue
+                        return
+                    try:
+                        rows = self._run_shard(session, job)
+                        self._finish(session, job, rows)
+                        outcome = ('done', rows)
+                    except Exception as e:
+                        logger.warning(f"Backfill shard {job['device_sn']} {job['day']} failed (attempt {job['attempts']}): {e}")
+                        outcome = ('retried' if self._fail(session, job, e) else 'failed', 0)
+                with self._lock:
+                    self.stats[outcome[0]] += 1
+                    self.stats['rows'] += outcome[1]
+                    if outcome[1]:
+                        self.written_days.add(job['day'])
+        finally:
+            for client in self._local.__dict__.get('clients', {}).values():
+                client.close()
+
+def run_backfill(workers: Optional[int] = None, batch_id: Optional[str] = None) -> Dict[str, int]:
+    """Runs shards on `workers` threads until none is left to claim; returns done/retried/failed/rows counts."""
+    workers = cap_workers(workers, settings.BACKFILL_WORKERS)
+    worker = BackfillWorker(batch_id)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backfill') as executor:
+        for future in [executor.submit(worker.work) for _ in range(workers)]:
+            future.result()
+    if worker.written_days:
+        refresh_aggregates(min(worker.written_days), max(worker.written_days))
+    logger.info(f"Backfill run finished: {worker.stats}")
+    return worker.stats
+
+def refresh_aggregates(start: date, end: date) -> None:
+    """Re-materializes the continuous aggregates for days start..end. Failures are logged, not raised."""
+    # Local midnights, so the window holds the local day buckets of device_data_daily whole
+    tz = pytz.timezone(settings.POLL_DEFAULT_TIMEZONE)
+    window = {'start': tz.localize(datetime.combine(start, datetime.min.time())),
+              'end': tz.localize(datetime.combine(end + timedelta(days=1), datetime.min.time()))}
+    # refresh_continuous_aggregate cannot run inside a transaction block
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        for view in CONTINUOUS_AGGREGATES:
+            try:
+                conn.execute(
+                    text(f"CALL refresh_continuous_aggregate('{view}', CAST(:start AS TIMESTAMPTZ), CAST(:end AS TIMESTAMPTZ))"),
+                    window
+                )
+            except Exception as e:
+                logger.warning(f"Could not refresh {view} for {start}..{end}: {e}")
+
+def backfill_status(session: Session, batch_id: Optional[str] = None, customer_id: Optional[str] = None) -> Dict:
+    """Shard counts and rows per status, for one batch, one customer or the whole queue."""
+    result = session.execute(text("""
+        SELECT status, COUNT(*) AS shards, COALESCE(SUM(rows_inserted), 0) AS rows, MIN(day) AS first_day, MAX(day) AS last_day
+        FROM backfill_jobs
+        WHERE (:batch_id IS NULL OR batch_id = :batch_id) AND (:customer_id IS NULL OR customer_id = :customer_id)
+        GROUP BY status
+    """), {'batch_id': batch_id, 'customer_id': customer_id})
+    statuses = {row.status: {'shards': row.shards, 'rows': int(row.rows), 'first_day': row.first_day, 'last_day': row.last_day}
+                for row in result.fetchall()}
+    return {'batch_id': batch_id, 'statuses': statuses}
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue and run resumable historical backfills")
+    commands = parser.add_subparsers(dest='command', required=True)
+    queue = commands.add_parser('queue', help="Queue day shards for a customer or plant")
+    queue.add_argument('--customer', required=True)
+    queue.add_argument('--plant', default=None)
+    queue.add_argument('--start', required=True, help="First day (YYYY-MM-DD)")
+    queue.add_argument('--end', required=True, help="Last day (YYYY-MM-DD)")
+    run = commands.add_parser('run', help="Run queued shards until none is left")
+    run.add_argument('--workers', type=int, default=None, help="Concurrent shards (default: BACKFILL_WORKERS)")
+    run.add_argument('--batch', default=None, help="Only this batch")
+    status = commands.add_parser('status', help="Shard counts per status")
+    status.add_argument('--batch', default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'run':
+        print(run_backfill(args.workers, args.batch))
+        return
+    with SessionFactory() as session:
+        if args.command == 'queue':
+            start = datetime.strptime(args.start, '%Y-%m-%d').date()
+            end = datetime.strptime(args.end, '%Y-%m-%d').date()
+            print(queue_backfill(session, args.customer, start, end, plant_id=args.plant))
+        else:
+            print(backfill_status(session, args.batch))
+
+if __name__ == '__main__':
+    main()
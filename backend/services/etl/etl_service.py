@@ -1,9 +1,18 @@
 # backend/services/etl/etl_service.py
+import csv
+import io
+import json
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple, Union
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+import psycopg2
+from psycopg2.extras import execute_values
+
+from backend.config.settings import settings
+from backend.services.etl.normalizer import NormalizedBatch
 
 logger = logging.getLogger(__name__)
 
@@ -40,8 +49,8 @@ def normalize_data_entry(entry: Dict, api_provider: str) -> Optional[Dict]:
         'tr_voltage': float(entry.get('tr_voltage') or 0.0),
     }
 
-    # PV strings (up to 12, as per schema/management)
-    for i in range(1, 13):
+    # PV strings (up to 16, as per schema/management)
+    for i in range(1, 17):
         pv_num = f'pv{i:02d}'
         normalized[f'{pv_num}_voltage'] = float(entry.get(f'{pv_num}_voltage') or entry.get(f'uPv{i}') or entry.get(f'dv{i}') or entry.get(f'PV{i} voltage') or 0.0)
         normalized[f'{pv_num}_current'] = float(entry.get(f'{pv_num}_current') or entry.get(f'iPv{i}') or entry.get(f'dc{i}') or entry.get(f'PV{i} current') or 0.0)
@@ -64,7 +73,7 @@ def normalize_data_entry(entry: Dict, api_provider: str) -> Optional[Dict]:
         if 19 <= hour or hour < 7:
             normalized['total_power'] = 0.0
             normalized['energy_today'] = 0.0
-            for i in range(1, 13):
+            for i in range(1, 17):
                 normalized[f'pv{i:02d}_voltage'] = 0.0
                 normalized[f'pv{i:02d}_current'] = 0.0
     except ValueError as e:
@@ -72,78 +81,178 @@ def normalize_data_entry(entry: Dict, api_provider: str) -> Optional[Dict]:
 
     return normalized if normalized.get('total_power') is not None else None  # Filter empty
 
-def insert_data_to_db(session: Session, normalized_data: List[Dict], device_sn: str, customer_id: str, api_provider: str, realtime: bool = False):
+# Column order shared by every write path (multi-row VALUES and COPY staging)
+DEVICE_DATA_COLUMNS = (
+    ['device_sn', 'customer_id', 'api_provider', 'timestamp',
+     'total_power', 'energy_today', 'pr', 'state', 'faults', 'reactive_power', 'cuf', 'frequency',
+     'r_voltage', 's_voltage', 't_voltage', 'r_current', 's_current', 't_current',
+     'rs_voltage', 'st_voltage', 'tr_voltage']
+    + [f'pv{i:02d}_{kind}' for i in range(1, 17) for kind in ('voltage', 'current')]
+    + ['total_dc_input_power', 'battery_voltage', 'battery_current', 'inverter_temperature']
+)
+_DATA_COLUMNS = DEVICE_DATA_COLUMNS[4:]  # Everything taken from the normalized entry after timestamp
+
+def _row_values(entry: Dict, device_sn: str, customer_id: str, api_provider: str) -> tuple:
+    values = [device_sn, customer_id, api_provider, entry['timestamp']]
+    for column in _DATA_COLUMNS:
+        if column == 'faults':
+            values.append(json.dumps(entry.get('faults') or []))  # JSONB in schema
+        elif column == 'total_dc_input_power':
+            values.append(entry.get(column, 0.0))  # For Solarman
+        else:
+            values.append(entry.get(column))
+    return tuple(values)
+
+def _batch_row_values(batch: NormalizedBatch, device_sn: str, customer_id: str, api_provider: str) -> List[tuple]:
+    # Column-wise: one tolist() per array instead of one dict lookup per cell
+    n = len(batch)
+    columns = []
+    for column in _DATA_COLUMNS:
+        if column == 'state':
+            columns.append(batch.states)
+        elif column == 'faults':
+            columns.append([json.dumps(f) for f in batch.faults])  # JSONB in schema
+        elif column in batch.columns:
+            columns.append(batch.columns[column].tolist())
+        elif column == 'total_dc_input_power':
+            columns.append(repeat(0.0, n))  # For Solarman
+        else:
+            columns.append(repeat(None, n))
+    return list(zip(repeat(device_sn), repeat(customer_id), repeat(api_provider), batch.timestamps, *columns))
+
+def _copy_to_staging(cursor, table_name: str, rows: List[tuple]) -> str:
+    staging = f"_staging_{table_name}"
+    cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(['' if v is None else v for v in row])
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {staging} ({', '.join(DEVICE_DATA_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+    return staging
+
+def _write_batch(cursor, table_name: str, rows: List[tuple], method: str) -> int:
+    """Writes rows in one statement per page (values) or one COPY + one merge (copy). Returns rows inserted."""
+    columns = ', '.join(DEVICE_DATA_COLUMNS)
+    if method == 'copy':
+        staging = _copy_to_staging(cursor, table_name, rows)
+        cursor.execute(f"""
+            INSERT INTO {table_name} ({columns})
+            SELECT {columns} FROM {staging}
+            ON CONFLICT (device_sn, timestamp) DO NOTHING
+        """)
+        inserted = cursor.rowcount
+        cursor.execute(f"TRUNCATE {staging}")
+        return inserted
+
+    returned = execute_values(
+        cursor,
+        f"INSERT INTO {table_name} ({columns}) VALUES %s ON CONFLICT (device_sn, timestamp) DO NOTHING RETURNING 1",
+        rows,
+        page_size=max(1, int(settings.BATCH_SIZE)),
+        fetch=True
+    )
+    return len(returned)
+
+def _write_rows(session: Session, table_name: str, rows: List[tuple], method: str, label: str) -> Tuple[int, int]:
+    """Bulk write under a savepoint, falling back to row-by-row savepoints. Returns (inserted, rejected)."""
+    inserted = 0
+    db_rejected = 0
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT bulk_insert")
+        try:
+            inserted = _write_batch(cursor, table_name, rows, method)
+            cursor.execute("RELEASE SAVEPOINT bulk_insert")
+        except psycopg2.Error as e:
+            logger.warning(f"Bulk insert into {table_name} failed for {label}, retrying row by row: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_insert")
+            for row in rows:
+                cursor.execute("SAVEPOINT row_insert")
+                try:
+                    inserted += _write_batch(cursor, table_name, [row], 'values')
+                    cursor.execute("RELEASE SAVEPOINT row_insert")
+                except psycopg2.Error as row_error:
+                    logger.error(f"Insert failed for {row[0]} at {row[3]}: {row_error}")
+                    cursor.execute("ROLLBACK TO SAVEPOINT row_insert")
+                    db_rejected += 1
+    finally:
+        cursor.close()
+    return inserted, db_rejected
+
+def insert_data_to_db(session: Session, normalized_data: Union[List[Dict], NormalizedBatch], device_sn: str, customer_id: str, api_provider: str, realtime: bool = False, method: Optional[str] = None) -> Dict[str, int]:
     """
-    Inserts normalized data to hypertable (historical or realtime).
-    Uses raw SQL for speed; ON CONFLICT skips duplicates.
+    Inserts a normalized batch to hypertable (historical or realtime) in bulk.
+    method='values' sends multi-row INSERT ... VALUES pages of BATCH_SIZE rows; method='copy' COPYs the
+    batch into a temp staging table and merges it with a single INSERT ... SELECT (default: ETL_WRITE_METHOD).
+    ON CONFLICT skips duplicates.
+    If the batch is refused (e.g. a CHECK violation), rows are retried one by one under savepoints so only
+    the offending rows are dropped. Accepts row dicts or a columnar NormalizedBatch.
+    Returns {'inserted', 'duplicates', 'rejected'} counts.
     """
     table_name = 'device_data_realtime' if realtime else 'device_data_historical'
-    
-    for entry in normalized_data:
-        try:
-            params = {
-                'device_sn': device_sn,
-                'customer_id': customer_id,  # For tracing
-                'api_provider': api_provider,
-                'timestamp': entry['timestamp'],
-                'total_power': entry['total_power'],
-                'energy_today': entry['energy_today'],
-                'pr': entry['pr'],
-                'state': entry['state'],
-                'faults': entry['faults'],  # JSONB in schema
-                'reactive_power': entry['reactive_power'],
-                'cuf': entry['cuf'],
-                'frequency': entry['frequency'],
-                'r_voltage': entry['r_voltage'],
-                's_voltage': entry['s_voltage'],
-                't_voltage': entry['t_voltage'],
-                'r_current': entry['r_current'],
-                's_current': entry['s_current'],
-                't_current': entry['t_current'],
-                'rs_voltage': entry['rs_voltage'],
-                'st_voltage': entry['st_voltage'],
-                'tr_voltage': entry['tr_voltage'],
-            }
-            # Add PV fields
-            for i in range(1, 13):
-                pv_num = f'pv{i:02d}'
-                params[f'{pv_num}_voltage'] = entry[f'{pv_num}_voltage']
-                params[f'{pv_num}_current'] = entry[f'{pv_num}_current']
-            
-            # Provider extras (if schema has columns)
-            if api_provider.lower() == 'soliscloud':
-                params['battery_voltage'] = entry.get('battery_voltage', 0.0)
-                params['battery_current'] = entry.get('battery_current', 0.0)
-                params['inverter_temperature'] = entry.get('inverter_temperature', 0.0)
-            params['total_dc_input_power'] = entry.get('total_dc_input_power', 0.0)  # For Solarman
-
-            session.execute(text(f"""
-                INSERT INTO {table_name} (
-                    device_sn, customer_id, api_provider, timestamp,
-                    total_power, energy_today, pr, state, faults, reactive_power, cuf, frequency,
-                    r_voltage, s_voltage, t_voltage, r_current, s_current, t_current,
-                    rs_voltage, st_voltage, tr_voltage,
-                    pv01_voltage, pv01_current, pv02_voltage, pv02_current, pv03_voltage, pv03_current,
-                    pv04_voltage, pv04_current, pv05_voltage, pv05_current, pv06_voltage, pv06_current,
-                    pv07_voltage, pv07_current, pv08_voltage, pv08_current, pv09_voltage, pv09_current,
-                    pv10_voltage, pv10_current, pv11_voltage, pv11_current, pv12_voltage, pv12_current,
-                    total_dc_input_power, battery_voltage, battery_current, inverter_temperature
-                ) VALUES (
-                    :device_sn, :customer_id, :api_provider, :timestamp,
-                    :total_power, :energy_today, :pr, :state, :faults, :reactive_power, :cuf, :frequency,
-                    :r_voltage, :s_voltage, :t_voltage, :r_current, :s_current, :t_current,
-                    :rs_voltage, :st_voltage, :tr_voltage,
-                    :pv01_voltage, :pv01_current, :pv02_voltage, :pv02_current, :pv03_voltage, :pv03_current,
-                    :pv04_voltage, :pv04_current, :pv05_voltage, :pv05_current, :pv06_voltage, :pv06_current,
-                    :pv07_voltage, :pv07_current, :pv08_voltage, :pv08_current, :pv09_voltage, :pv09_current,
-                    :pv10_voltage, :pv10_current, :pv11_voltage, :pv11_current, :pv12_voltage, :pv12_current,
-                    :total_dc_input_power, :battery_voltage, :battery_current, :inverter_temperature
-                ) ON CONFLICT (device_sn, timestamp) DO NOTHING
-            """), params)
-        except Exception as e:
-            logger.error(f"Insert failed for {device_sn}: {e}")
-            session.rollback()
+    method = (method or settings.ETL_WRITE_METHOD).lower()
+    counts = {'inserted': 0, 'duplicates': 0, 'rejected': 0}
+
+    # Validate and de-duplicate within the batch first; the DB only sees distinct timestamps
+    if isinstance(normalized_data, NormalizedBatch):
+        candidates = _batch_row_values(normalized_data, device_sn, customer_id, api_provider)
+    else:
+        candidates = [
+            _row_values(entry, device_sn, customer_id, api_provider) if entry and entry.get('timestamp') else None
+            for entry in normalized_data
+        ]
+    rows_by_ts = {}
+    for row in candidates:
+        if row is None or not row[3]:
+            counts['rejected'] += 1
             continue
-    
+        if row[3] in rows_by_ts:
+            counts['duplicates'] += 1
+            continue
+        rows_by_ts[row[3]] = row
+    rows = list(rows_by_ts.values())
+
+    if rows:
+        inserted, db_rejected = _write_rows(session, table_name, rows, method, device_sn)
+        counts['inserted'] = inserted
+        counts['rejected'] += db_rejected
+        counts['duplicates'] += len(rows) - inserted - db_rejected  # Skipped by ON CONFLICT
+
+    session.commit()
+    logger.info(
+        f"Wrote batch of {len(normalized_data)} rows for {device_sn} into {table_name}: "
+        f"{counts['inserted']} inserted, {counts['duplicates']} duplicates, {counts['rejected']} rejected"
+    )
+    return counts
+
+def insert_snapshot_to_db(session: Session, normalized: NormalizedBatch, customer_id: str, api_provider: str, method: Optional[str] = None) -> Dict[str, int]:
+    """
+    Writes one realtime snapshot covering many devices (device_sn taken per row from the batch's device ids)
+    into device_data_realtime with a single bulk statement. Same counts and fallback as insert_data_to_db.
+    """
+    method = (method or settings.ETL_WRITE_METHOD).lower()
+    counts = {'inserted': 0, 'duplicates': 0, 'rejected': 0}
+    rows_by_key = {}
+    for device_sn, row in zip(normalized.device_ids, _batch_row_values(normalized, None, customer_id, api_provider)):
+        if not device_sn or not row[3]:
+            counts['rejected'] += 1
+            continue
+        if (device_sn, row[3]) in rows_by_key:
+            counts['duplicates'] += 1
+            continue
+        rows_by_key[(device_sn, row[3])] = (device_sn,) + row[1:]
+    rows = list(rows_by_key.values())
+
+    if rows:
+        inserted, db_rejected = _write_rows(session, 'device_data_realtime', rows, method, f"{api_provider} snapshot")
+        counts['inserted'] = inserted
+        counts['rejected'] += db_rejected
+        counts['duplicates'] += len(rows) - inserted - db_rejected
+
     session.commit()
-    logger.info(f"Inserted {len(normalized_data)} rows into {table_name}")
\ No newline at end of file
+    logger.info(
+        f"Wrote {api_provider} snapshot of {len(rows)} devices into device_data_realtime: "
+        f"{counts['inserted']} inserted, {counts['duplicates']} duplicates, {counts['rejected']} rejected"
+    )
+    return counts
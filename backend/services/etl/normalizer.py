@@ -0,0 +1,195 @@
+# backend/services/etl/normalizer.py
+"""
+Batch counterpart of etl_service.normalize_data_entry.
+
+The provider key priorities are resolved into a lookup plan once per provider; a batch of raw entries
+is then converted column by column into NumPy arrays and night hours are zeroed with one mask for the
+whole batch. Output is value-for-value identical to calling normalize_data_entry on each entry.
+"""
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (normalized column, raw keys in priority order); the first truthy value wins, else 0.0
+COMMON_FIELDS: List[Tuple[str, Tuple[str, ...]]] = [
+    ('total_power', ('total_power', 'pac', 'tpg')),
+    ('energy_today', ('energy_today', 'eToday', 'etdy_ge1')),
+    ('pr', ('pr',)),
+    ('reactive_power', ('reactive_power',)),
+    ('cuf', ('cuf',)),
+    ('frequency', ('frequency', 'fac', 'a_fo1')),
+    # Grid phases
+    ('r_voltage', ('r_voltage', 'uAc1', 'av1')),
+    ('s_voltage', ('s_voltage', 'uAc2', 'av2')),
+    ('t_voltage', ('t_voltage', 'uAc3', 'av3')),
+    ('r_current', ('r_current', 'iAc1', 'ac1')),
+    ('s_current', ('s_current', 'iAc2', 'ac2')),
+    ('t_current', ('t_current', 'iAc3', 'ac3')),
+    ('rs_voltage', ('rs_voltage',)),
+    ('st_voltage', ('st_voltage',)),
+    ('tr_voltage', ('tr_voltage',)),
+]
+
+PV_COUNT = 16  # Strings per inverter in the schema
+PV_FIELDS: List[Tuple[str, Tuple[str, ...]]] = []
+for _i in range(1, PV_COUNT + 1):
+    PV_FIELDS.append((f'pv{_i:02d}_voltage', (f'pv{_i:02d}_voltage', f'uPv{_i}', f'dv{_i}', f'PV{_i} voltage')))
+    PV_FIELDS.append((f'pv{_i:02d}_current', (f'pv{_i:02d}_current', f'iPv{_i}', f'dc{_i}', f'PV{_i} current')))
+
+PROVIDER_FIELDS: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {
+    'soliscloud': [
+        ('battery_voltage', ('battery_voltage', 'storageBatteryVoltage')),
+        ('battery_current', ('battery_current', 'storageBatteryCurrent')),
+        ('inverter_temperature', ('inverter_temperature',)),
+    ],
+    'solarman': [
+        ('total_dc_input_power', ('total_dc_input_power', 'dpi_t1')),
+    ],
+}
+
+# Zeroed between 19:00 and 07:00 (no solar generation)
+NIGHT_ZEROED = ['total_power', 'energy_today'] + [column for column, _ in PV_FIELDS]
+
+def _first_truthy(getters: List, keys: Sequence[str], default):
+    # One comprehension per arity: no per-value function call or inner loop
+    if len(keys) == 1:
+        k0, = keys
+        return [g(k0) or default for g in getters]
+    if len(keys) == 2:
+        k0, k1 = keys
+        return [g(k0) or g(k1) or default for g in getters]
+    if len(keys) == 3:
+        k0, k1, k2 = keys
+        return [g(k0) or g(k1) or g(k2) or default for g in getters]
+    if len(keys) == 4:
+        k0, k1, k2, k3 = keys
+        return [g(k0) or g(k1) or g(k2) or g(k3) or default for g in getters]
+    return [next((v for v in map(g, keys) if v), default) for g in getters]
+
+def _hours(timestamps: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (hour, valid) per timestamp for the '%Y-%m-%d %H:%M:%S' layout, checked without strptime."""
+    n = len(timestamps)
+    hours = np.zeros(n, dtype=np.int64)
+    valid = np.zeros(n, dtype=bool)
+    if n == 0:
+        return hours, valid
+
+    arr = np.array(timestamps, dtype=str)
+    width = arr.dtype.itemsize // 4
+    canonical = np.zeros(n, dtype=bool)
+    if width >= 19:
+        codes = arr.view(np.uint32).reshape(n, width)[:, :19].astype(np.int64)
+        digits = codes - ord('0')
+        digit_positions = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+        canonical = np.char.str_len(arr) == 19
+        canonical &= ((digits[:, digit_positions] >= 0) & (digits[:, digit_positions] <= 9)).all(axis=1)
+        canonical &= (codes[:, 4] == ord('-')) & (codes[:, 7] == ord('-')) & (codes[:, 10] == ord(' '))
+        canonical &= (codes[:, 13] == ord(':')) & (codes[:, 16] == ord(':'))
+        month = digits[:, 5] * 10 + digits[:, 6]
+        day = digits[:, 8] * 10 + digits[:, 9]
+        hour = digits[:, 11] * 10 + digits[:, 12]
+        minute = digits[:, 14] * 10 + digits[:, 15]
+        second = digits[:, 17] * 10 + digits[:, 18]
+        canonical &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 28)
+        canonical &= (hour <= 23) & (minute <= 59) & (second <= 61)
+        hours[canonical] = hour[canonical]
+        valid[canonical] = True
+
+    # Anything else (end-of-month days, odd layouts) takes the strict per-row parse
+    invalid = 0
+    for idx in np.flatnonzero(~canonical):
+        try:
+            hours[idx] = datetime.strptime(timestamps[idx], '%Y-%m-%d %H:%M:%S').hour
+            valid[idx] = True
+        except (TypeError, ValueError):
+            invalid += 1
+    if invalid:
+        logger.warning(f"Invalid timestamp format in {invalid} entries; night zeroing skipped for them")
+    return hours, valid
+
+def night_mask(timestamps: List[str]) -> np.ndarray:
+    hours, valid = _hours(timestamps)
+    return valid & ((hours >= 19) | (hours < 7))
+
+class NormalizedBatch:
+    """Columnar normalized data: one float64 array per numeric column plus timestamp/text/fault lists."""
+
+    def __init__(self, api_provider: str, timestamps: List, device_ids: List, states: List, faults: List,
+                 columns: Dict[str, np.ndarray]):
+        self.api_provider = api_provider
+        self.timestamps = timestamps
+        self.device_ids = device_ids
+        self.states = states
+        self.faults = faults
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def select(self, indices) -> 'NormalizedBatch':
+        """Subset by integer indices or boolean mask."""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        pick = indices.tolist()
+        return NormalizedBatch(
+            self.api_provider,
+            [self.timestamps[i] for i in pick],
+            [self.device_ids[i] for i in pick],
+            [self.states[i] for i in pick],
+            [self.faults[i] for i in pick],
+            {name: values[indices] for name, values in self.columns.items()},
+        )
+
+    def records(self) -> List[Dict]:
+        """Row dicts, as normalize_data_entry returns them."""
+        names = ['timestamp', 'device_id', 'state', 'faults'] + list(self.columns)
+        lists = [self.timestamps, self.device_ids, self.states, self.faults] + [v.tolist() for v in self.columns.values()]
+        return [dict(zip(names, row)) for row in zip(*lists)]
+
+class NormalizationPlan:
+    def __init__(self, api_provider: str):
+        self.api_provider = api_provider.lower()
+        self.numeric_fields = COMMON_FIELDS + PV_FIELDS + PROVIDER_FIELDS.get(self.api_provider, [])
+
+    def apply(self, entries: List[Dict]) -> NormalizedBatch:
+        valid_entries = [e for e in entries if e and 'timestamp' in e]
+        skipped = len(entries) - len(valid_entries)
+        if skipped:
+            logger.warning(f"Skipping {skipped} invalid entries without timestamp")
+
+        getters = [e.get for e in valid_entries]
+        timestamps = [g('timestamp') for g in getters]
+        device_ids = _first_truthy(getters, ('device_id', 'sn', 'deviceSn'), None)
+        states = _first_truthy(getters, ('state', 'status'), 'unknown')
+        faults = [g('faults') or [] for g in getters]
+
+        # Keys no entry carries cannot win the or-chain: drop them, and skip columns with none left
+        present = set().union(*valid_entries) if valid_entries else set()
+        columns = {}
+        for column, keys in self.numeric_fields:
+            keys = [k for k in keys if k in present]
+            if keys:
+                columns[column] = np.array(_first_truthy(getters, keys, 0.0), dtype=np.float64)
+            else:
+                columns[column] = np.zeros(len(valid_entries), dtype=np.float64)
+
+        night = night_mask(timestamps)
+        if night.any():
+            for column in NIGHT_ZEROED:
+                columns[column][night] = 0.0
+
+        return NormalizedBatch(self.api_provider, timestamps, device_ids, states, faults, columns)
+
+@lru_cache(maxsize=None)
+def get_plan(api_provider: str) -> NormalizationPlan:
+    return NormalizationPlan(api_provider)
+
+def normalize_batch(entries: List[Dict], api_provider: str) -> NormalizedBatch:
+    """Normalizes a whole batch of raw provider entries into columnar form."""
+    return get_plan(api_provider.lower()).apply(entries)
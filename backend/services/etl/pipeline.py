@@ -0,0 +1,139 @@
+# backend/services/etl/pipeline.py
+"""
+Streaming fetch -> normalize -> write pipeline.
+
+Provider iterators yield one page or day of raw entries at a time. Pages are regrouped into chunks of
+ETL_CHUNK_SIZE rows, and each chunk is normalized and handed to a single writer thread as soon as it
+fills, so the next page is fetched while the previous chunk is written. At most one write is in
+flight: memory stays at about two chunks however long the backfill is.
+
+When a credential's telemetry is active (see telemetry.py), the time spent waiting on pages (fetch),
+normalizing and writing is added to it per device, with the row counts of each stage.
+"""
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from backend.config.settings import settings
+from backend.services.etl.etl_service import insert_data_to_db
+from backend.services.etl.normalizer import NormalizedBatch, normalize_batch
+from backend.services.etl.telemetry import CredentialTelemetry, current
+from backend.services.etl.watermarks import advance_watermark, filter_since
+from backend.services.providers.errors import ProviderDayError
+
+logger = logging.getLogger(__name__)
+
+def chunked(pages: Iterable[List[Dict]], size: Optional[int] = None) -> Iterator[List[Dict]]:
+    """
+    Regroups variable-sized pages into lists of exactly `size` entries (the last may be shorter).
+    When a historical day fails, the entries of the days before it are still yielded, then the
+    ProviderDayError is raised: they are written and the watermark stops before the failed day.
+    """
+    size = max(1, int(size or settings.ETL_CHUNK_SIZE))
+    chunk: List[Dict] = []
+    try:
+        for page in pages:
+            chunk.extend(page)
+            while len(chunk) >= size:
+                yield chunk[:size]
+                chunk = chunk[size:]
+    except ProviderDayError as e:
+        chunk.extend(e.rows)
+        for start in range(0, len(chunk), size):
+            yield chunk[start:start + size]
+        raise
+    if chunk:
+        yield chunk
+
+class ChunkWriter:
+    """
+    Writes normalized chunks on one background thread, one chunk at a time.
+    The session belongs to the writer thread while a write is pending: call drain() before the
+    fetching thread touches the session itself. Write errors are re-raised in the fetching thread.
+    """
+
+    def __init__(self, session: Session, customer_id: str, api_provider: str, realtime: bool = False):
+        self.session = session
+        self.customer_id = customer_id
+        self.api_provider = api_provider
+        self.realtime = realtime
+        self.counts = {'inserted': 0, 'duplicates': 0, 'rejected': 0}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='etl-writer')
+        self._pending: Optional[Future] = None
+        # Captured here: the writer thread does not see the fetching thread's context
+        self.telemetry = current()
+
+    def __enter__(self) -> 'ChunkWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self.drain()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _write(self, normalized: NormalizedBatch, device_sn: str) -> Dict[str, int]:
+        started = time.perf_counter()
+        counts = insert_data_to_db(
+            self.session, normalized, device_sn, self.customer_id, self.api_provider, realtime=self.realtime
+        )
+        if not self.realtime and counts['inserted'] + counts['duplicates']:
+            advance_watermark(self.session, device_sn, self.api_provider, normalized)
+        if self.telemetry is not None:
+            self.telemetry.add(device_sn, rows_inserted=counts['inserted'], rows_duplicate=counts['duplicates'],
+                               rows_rejected=counts['rejected'], write_seconds=time.perf_counter() - started)
+        return counts
+
+    def drain(self) -> None:
+        """Waits for the pending write and adds its counts."""
+        if self._pending is None:
+            return
+        pending, self._pending = self._pending, None
+        for key, value in pending.result().items():
+            self.counts[key] += value
+
+    def submit(self, normalized: NormalizedBatch, device_sn: str) -> None:
+        self.drain()  # Backpressure: never more than one chunk waiting on the database
+        self._pending = self._executor.submit(self._write, normalized, device_sn)
+
+def _timed_pages(pages: Iterable[List[Dict]], telemetry: CredentialTelemetry, device_sn: str) -> Iterator[List[Dict]]:
+    """Adds the time spent waiting on each page (API calls, rate limiting, paging) to fetch_seconds."""
+    iterator = iter(pages)
+    while True:
+        started = time.perf_counter()
+        try:
+            page = next(iterator)
+        except StopIteration:
+            telemetry.add(device_sn, fetch_seconds=time.perf_counter() - started)
+            return
+        telemetry.add(device_sn, fetch_seconds=time.perf_counter() - started)
+        yield page
+
+def stream_device(pages: Iterable[List[Dict]], writer: ChunkWriter, device_sn: str,
+                  since: Optional[datetime] = None, chunk_size: Optional[int] = None,
+                  observe: Optional[Callable[[str, NormalizedBatch], None]] = None) -> int:
+    """
+    Normalizes and writes one device's pages chunk by chunk; returns the number of raw entries fetched.
+    observe(device_sn, normalized) sees every chunk that is written.
+    """
+    fetched = 0
+    telemetry = current()
+    if telemetry is not None:
+        pages = _timed_pages(pages, telemetry, device_sn)
+    for chunk in chunked(pages, chunk_size):
+        fetched += len(chunk)
+        started = time.perf_counter()
+        normalized = filter_since(normalize_batch(chunk, writer.api_provider), since)
+        if telemetry is not None:
+            telemetry.add(device_sn, rows_fetched=len(chunk), rows_normalized=len(normalized),
+                          normalize_seconds=time.perf_counter() - started)
+        if len(normalized):
+            if observe is not None:
+                observe(device_sn, normalized)
+            writer.submit(normalized, device_sn)
+    return fetched
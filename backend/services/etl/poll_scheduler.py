@@ -0,0 +1,243 @@
+# backend/services/etl/poll_scheduler.py
+"""
+Adaptive per-device polling.
+
+Each fetch kind (historical, realtime) keeps its own row per device in device_poll_schedule. After a
+device is polled its next poll is planned from:
+
+- the provider's data interval while the device is reporting in daylight ('active'),
+- local sunrise/sunset: outside daylight the device only gets a POLL_HEARTBEAT_MINUTES heartbeat, and is
+  polled again at sunrise ('night'),
+- how recently it reported: after POLL_OFFLINE_AFTER_MINUTES of daylight without new data (or with the
+  device itself reporting 'offline') it also drops to the heartbeat ('offline') until data comes back.
+  A fetch that failed says nothing about the device: it neither counts as a report nor as silence.
+
+Historical fetches are never planned closer than HISTORICAL_MIN_INTERVAL, the hourly cadence they have
+without adaptive polling; only realtime fetches follow the faster DAG tick.
+
+Daylight comes from the plant's `location` when it holds coordinates ("12.97,77.59"); otherwise the
+07:00-19:00 window normalize_data_entry already uses is applied in the plant's time zone (the station's
+offset for SolisCloud, POLL_DEFAULT_TIMEZONE for the others). Devices with no schedule row are due.
+"""
+import logging
+import math
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.config.settings import settings
+from backend.services.etl.normalizer import NormalizedBatch
+
+logger = logging.getLogger(__name__)
+
+# Minutes between data points the providers record for an inverter
+PROVIDER_DATA_INTERVAL_MINUTES = {
+    'solarman': 5,
+    'shinemonitor': 5,
+    'soliscloud': 5,
+}
+
+# Generation window when the plant has no coordinates (same hours normalize_data_entry keeps)
+DEFAULT_DAYLIGHT_HOURS = (7, 19)
+
+# Historical fetches re-read whole days: no more often than the hourly DAG runs without adaptive polling
+HISTORICAL_MIN_INTERVAL = timedelta(hours=1)
+
+# Slack when comparing next_poll_at with the DAG tick, so a poll planned a few seconds after the tick is not pushed to the next one
+DUE_GRACE = timedelta(minutes=1)
+
+# Decimal degrees only: "12.97,77.59" or "12.97 77.59" (addresses with bare numbers do not match)
+_COORDINATES = re.compile(r'^\s*(-?\d{1,2}\.\d+)\s*[,;\s]\s*(-?\d{1,3}\.\d+)\s*$')
+_J2000 = datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+
+def parse_location(location: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Returns (latitude, longitude) when the location is a "lat,lon" pair, else None (addresses, names)."""
+    match = _COORDINATES.match(location or '')
+    if not match:
+        return None
+    latitude, longitude = float(match.group(1)), float(match.group(2))
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+def sun_times(day: date, latitude: float, longitude: float) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Sunrise and sunset (UTC) for the solar day nearest `day` at the given coordinates, from the standard
+    sunrise equation (within a couple of minutes). None during polar day or night.
+    """
+    n = (day - _J2000.date()).days - longitude / 360.0
+    anomaly = math.radians((357.5291 + 0.98560028 * n) % 360)
+    center = 1.9148 * math.sin(anomaly) + 0.0200 * math.sin(2 * anomaly) + 0.0003 * math.sin(3 * anomaly)
+    ecliptic = math.radians((math.degrees(anomaly) + center + 180 + 102.9372) % 360)
+    transit = n + 0.0053 * math.sin(anomaly) - 0.0069 * math.sin(2 * ecliptic)
+    declination = math.asin(math.sin(ecliptic) * math.sin(math.radians(23.4397)))
+    phi = math.radians(latitude)
+    cos_hour_angle = (math.sin(math.radians(-0.833)) - math.sin(phi) * math.sin(declination)) / (math.cos(phi) * math.cos(declination))
+    if not -1 <= cos_hour_angle <= 1:
+        return None
+    half_day = math.degrees(math.acos(cos_hour_angle)) / 360.0
+    return _J2000 + timedelta(days=transit - half_day), _J2000 + timedelta(days=transit + half_day)
+
+def plant_timezone(plant: Dict):
+    """tzinfo of a provider plant: SolisCloud stations carry an hour offset, the others use POLL_DEFAULT_TIMEZONE."""
+    offset = plant.get('time_zone')
+    if offset is not None:
+        try:
+            return timezone(timedelta(hours=float(offset)))
+        except (TypeError, ValueError):
+            pass
+    return pytz.timezone(settings.POLL_DEFAULT_TIMEZONE)
+
+def daylight_windows(now: datetime, tz, coordinates: Optional[Tuple[float, float]] = None) -> List[Tuple[datetime, datetime]]:
+    """(start, end) UTC daylight windows of yesterday, today and tomorrow (local), widened by POLL_TWILIGHT_MINUTES."""
+    margin = timedelta(minutes=int(settings.POLL_TWILIGHT_MINUTES))
+    today = now.astimezone(tz).date()
+    windows = []
+    for offset in (-1, 0, 1):
+        day = today + timedelta(days=offset)
+        times = sun_times(day, *coordinates) if coordinates is not None else None
+        if times is not None:
+            sunrise, sunset = times
+        else:
+            # No coordinates, or polar day/night
+            start_hour, end_hour = DEFAULT_DAYLIGHT_HOURS
+            midnight = datetime.combine(day, datetime.min.time())
+            sunrise = _localize(tz, midnight + timedelta(hours=start_hour))
+            sunset = _localize(tz, midnight + timedelta(hours=end_hour))
+        windows.append((sunrise - margin, sunset + margin))
+    return windows
+
+def _localize(tz, value: datetime) -> datetime:
+    # pytz zones need localize(); fixed offsets take the tzinfo directly
+    localized = tz.localize(value) if hasattr(tz, 'localize') else value.replace(tzinfo=tz)
+    return localized.astimezone(timezone.utc)
+
+def newest_entry(normalized: NormalizedBatch) -> Optional[Tuple[str, str]]:
+    """(timestamp, state) of the newest row in the batch."""
+    if not len(normalized):
+        return None
+    newest = max(range(len(normalized)), key=lambda i: str(normalized.timestamps[i]))
+    return str(normalized.timestamps[newest]), normalized.states[newest]
+
+def plan_next_poll(api_provider: str, now: datetime, windows: List[Tuple[datetime, datetime]],
+                   reported: bool, last_reported_at: Optional[datetime]) -> Tuple[datetime, str]:
+    """Returns (next_poll_at, poll_mode) for a device polled at `now`."""
+    heartbeat = timedelta(minutes=int(settings.POLL_HEARTBEAT_MINUTES))
+    current = next(((start, end) for start, end in windows if start <= now < end), None)
+    if current is None:
+        sunrise = min((start for start, _ in windows if start > now), default=now + heartbeat)
+        return min(now + heartbeat, sunrise), 'night'
+
+    interval = timedelta(minutes=PROVIDER_DATA_INTERVAL_MINUTES.get(api_provider, 5))
+    if not reported:
+        # Silence before sunrise does not count against the device
+        silent_since = max(last_reported_at or current[0], current[0])
+        if now - silent_since >= timedelta(minutes=int(settings.POLL_OFFLINE_AFTER_MINUTES)):
+            return min(now + heartbeat, current[1]), 'offline'
+    return now + interval, 'active'
+
+class PollScheduler:
+    """
+    Schedule of one credential's devices for one fetch kind. Used from the fetching thread only: load_plant()
+    and flush() touch the session, so the ChunkWriter must be drained first.
+    """
+
+    def __init__(self, api_provider: str, historical: bool, now: Optional[datetime] = None):
+        self.api_provider = api_provider
+        self.historical = historical
+        self.now = now or datetime.now(timezone.utc)
+        self.skipped = 0
+        self._schedule: Dict[str, Dict] = {}
+        self._windows: Dict[str, List[Tuple[datetime, datetime]]] = {}
+        self._latest: Dict[str, Tuple[str, str]] = {}
+        self._planned: List[Dict] = []
+
+    def load_plant(self, session: Session, plant_id: str, plant: Dict, device_sns: List[str]) -> None:
+        """Reads the plant's location and its devices' schedule rows."""
+        location = session.execute(
+            text("SELECT location FROM plants WHERE plant_id = :plant_id"), {'plant_id': str(plant_id)}
+        ).scalar()
+        coordinates = parse_location(location)
+        self._windows[plant_id] = daylight_windows(self.now, plant_timezone(plant), coordinates)
+
+        device_sns = [sn for sn in device_sns if sn]
+        if not device_sns:
+            return
+        result = session.execute(
+            text("""
+                SELECT device_sn, next_poll_at, last_data_timestamp, last_reported_at
+                FROM device_poll_schedule
+                WHERE device_sn = ANY(:device_sns) AND historical = :historical
+            """),
+            {'device_sns': device_sns, 'historical': self.historical}
+        )
+        for row in result.fetchall():
+            self._schedule[row.device_sn] = {
+                'next_poll_at': row.next_poll_at,
+                'last_data_timestamp': row.last_data_timestamp,
+                'last_reported_at': row.last_reported_at,
+            }
+
+    def is_due(self, device_sn: str) -> bool:
+        entry = self._schedule.get(device_sn)
+        if entry is None or entry['next_poll_at'] is None or entry['next_poll_at'] <= self.now + DUE_GRACE:
+            return True
+        self.skipped += 1
+        return False
+
+    def observe(self, device_sn: str, normalized: NormalizedBatch) -> None:
+        """Records the newest row of each written chunk (stream_device observer)."""
+        newest = newest_entry(normalized)
+        if newest is not None and (device_sn not in self._latest or newest[0] >= self._latest[device_sn][0]):
+            self._latest[device_sn] = newest
+
+    def plan(self, device_sn: str, plant_id: str, failed: bool = False) -> Tuple[datetime, str]:
+        """
+        Plans the device's next poll after it was fetched; written on flush(). failed=True when the provider
+        fetch failed: the device is then planned as if it had reported, without recording a report.
+        """
+        entry = self._schedule.get(device_sn, {})
+        latest = self._latest.pop(device_sn, None)
+        previous = entry.get('last_data_timestamp')
+        if isinstance(previous, datetime):
+            previous = previous.strftime('%Y-%m-%d %H:%M:%S')
+        # New data only: the watermark overlap and realtime day pages repeat rows the device sent earlier
+        reported = (latest is not None and (previous is None or latest[0] > previous)
+                    and str(latest[1]).lower() != 'offline')
+        last_reported_at = self.now if reported else entry.get('last_reported_at')
+        windows = self._windows.get(plant_id) or daylight_windows(self.now, plant_timezone({}))
+        next_poll_at, mode = plan_next_poll(self.api_provider, self.now, windows, reported or failed, last_reported_at)
+        if self.historical:
+            next_poll_at = max(next_poll_at, self.now + HISTORICAL_MIN_INTERVAL)
+        self._planned.append({
+            'device_sn': device_sn, 'historical': self.historical, 'api_provider': self.api_provider,
+            'next_poll_at': next_poll_at, 'poll_mode': mode,
+            'last_data_timestamp': latest[0] if latest is not None else None, 'last_reported_at': last_reported_at,
+        })
+        return next_poll_at, mode
+
+    def flush(self, session: Session) -> None:
+        if not self._planned:
+            return
+        planned, self._planned = self._planned, []
+        session.execute(text("""
+            INSERT INTO device_poll_schedule
+                (device_sn, historical, api_provider, next_poll_at, poll_mode, last_data_timestamp, last_reported_at, updated_at)
+            VALUES (:device_sn, :historical, :api_provider, :next_poll_at, :poll_mode,
+                    CAST(:last_data_timestamp AS TIMESTAMP), :last_reported_at, NOW())
+            ON CONFLICT (device_sn, historical) DO UPDATE
+            SET next_poll_at = EXCLUDED.next_poll_at,
+                poll_mode = EXCLUDED.poll_mode,
+                last_data_timestamp = GREATEST(device_poll_schedule.last_data_timestamp, EXCLUDED.last_data_timestamp),
+                last_reported_at = EXCLUDED.last_reported_at,
+                updated_at = NOW()
+        """), planned)
+        session.commit()
+        modes = {}
+        for row in planned:
+            modes[row['poll_mode']] = modes.get(row['poll_mode'], 0) + 1
+        logger.debug(f"Planned {len(planned)} {self.api_provider} polls (historical={self.historical}): {modes}")
@@ -0,0 +1,162 @@
+# backend/services/etl/replay.py
+"""
+Rebuilds device_data_historical from the raw response archive, without calling the vendor APIs.
+
+Archived responses go back through the current provider parsers, normalize_batch and insert_data_to_db,
+so a mapping fix can be applied to past data at local speed:
+
+    python -m backend.services.etl.replay --provider soliscloud --start 2024-05-01 --end 2024-05-31 --replace
+
+--start/--end select archived responses by the days of data they hold, whenever they were fetched. A day
+re-fetched by several hourly runs yields overlapping rows; they are counted as duplicates on insert.
+--replace deletes the stored rows at the replayed timestamps before inserting (otherwise existing rows are
+kept, as in a normal run); --dry-run only parses and normalizes.
+"""
+import argparse
+import logging
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.config.settings import settings
+from backend.services.etl.etl_service import insert_data_to_db
+from backend.services.etl.normalizer import NormalizedBatch, normalize_batch
+from backend.services.providers.raw_archive import ARCHIVED_ENDPOINTS, iter_records
+from backend.services.providers.shinemonitor_client import ShinemonitorAPI
+from backend.services.providers.solarman_client import SolarmanAPI
+from backend.services.providers.soliscloud_client import SolisCloudAPI
+
+logger = logging.getLogger(__name__)
+
+class RecordParser:
+    """Turns one archived response into (device_sn, raw entries) with the providers' own parsers."""
+
+    def __init__(self):
+        # Offline instances: only their parse methods are used
+        self.solarman = SolarmanAPI(email='', password_sha256='', app_id='', app_secret='')
+        self.shinemonitor = ShinemonitorAPI(company_key='')
+        self.soliscloud = SolisCloudAPI(api_key='', api_secret='')
+
+    def parse(self, record: Dict) -> Tuple[Optional[str], List[Dict]]:
+        provider = record.get('provider')
+        request = record.get('request') or {}
+        response = record.get('response') or {}
+        if provider == 'solarman':
+            device = {'deviceSn': request.get('deviceSn')}
+            fetched_at = datetime.strptime(record['fetched_at'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+            entries = self.solarman._parse_param_data_list(response.get('paramDataList') or [], device, fetched_at)
+            return device['deviceSn'], entries
+        if provider == 'shinemonitor':
+            if response.get('err') != 0 or not response.get('dat', {}).get('row'):
+                return None, []
+            device = {'sn': request.get('sn'), 'devcode': request.get('devcode')}
+            if 'startDate' in request:
+                return device['sn'], self.shinemonitor._parse_historical_rows(response['dat'], device)
+            return device['sn'], self.shinemonitor._parse_current_rows(response['dat'], device)
+        if provider == 'soliscloud':
+            device = {'id': request.get('id'), 'sn': request.get('sn')}
+            entries, _ = self.soliscloud._parse_day_page(response, device, request.get('time', ''))
+            return device['sn'], entries or []
+        return None, []
+
+def _customer_ids(session: Session, device_sns: List[str]) -> Dict[str, str]:
+    result = session.execute(
+        text("""
+            SELECT d.device_sn, p.customer_id
+            FROM devices d JOIN plants p ON p.plant_id = d.plant_id
+            WHERE d.device_sn = ANY(:device_sns)
+        """),
+        {'device_sns': list(device_sns)}
+    )
+    return {row.device_sn: row.customer_id for row in result.fetchall()}
+
+def _delete_existing(session: Session, device_sn: str, normalized: NormalizedBatch) -> None:
+    # Runs in the same transaction as the insert that follows (insert_data_to_db commits both)
+    session.execute(
+        text("DELETE FROM device_data_historical WHERE device_sn = :device_sn AND timestamp = ANY(CAST(:timestamps AS timestamptz[]))"),
+        {'device_sn': device_sn, 'timestamps': list(normalized.timestamps)}
+    )
+
+def replay(session: Optional[Session], provider: str, start: date, end: date, root: Optional[str] = None,
+           replace: bool = False, dry_run: bool = False, chunk_size: Optional[int] = None) -> Dict[str, int]:
+    """Replays one provider's archive for [start, end]; returns record/row counts."""
+    root = root or settings.RAW_ARCHIVE_DIR
+    if not root:
+        raise ValueError("RAW_ARCHIVE_DIR is not set and no archive root was given")
+    chunk_size = max(1, int(chunk_size or settings.ETL_CHUNK_SIZE))
+    parser = RecordParser()
+    stats = {'records': 0, 'entries': 0, 'normalized': 0, 'inserted': 0, 'duplicates': 0, 'rejected': 0, 'skipped_devices': 0}
+    buffers: Dict[str, List[Dict]] = {}
+    customers: Dict[str, Optional[str]] = {}
+
+    def flush(device_sn: str) -> None:
+        entries = buffers.pop(device_sn, [])
+        if not entries:
+            return
+        normalized = normalize_batch(entries, provider)
+        stats['normalized'] += len(normalized)
+        if dry_run or not len(normalized):
+            return
+        if device_sn not in customers:
+            customers[device_sn] = _customer_ids(session, [device_sn]).get(device_sn)
+        customer_id = customers[device_sn]
+        if customer_id is None:
+            stats['skipped_devices'] += 1
+            logger.warning(f"Skipping {len(normalized)} rows for unknown device {device_sn}")
+            return
+        if replace:
+            _delete_existing(session, device_sn, normalized)
+        counts = insert_data_to_db(session, normalized, device_sn, customer_id, provider)
+        for key in ('inserted', 'duplicates', 'rejected'):
+            stats[key] += counts[key]
+
+    for record in iter_records(root, provider, start, end):
+        stats['records'] += 1
+        device_sn, entries = parser.parse(record)
+        if not device_sn or not entries:
+            continue
+        stats['entries'] += len(entries)
+        buffer = buffers.setdefault(device_sn, [])
+        buffer.extend(entries)
+        if len(buffer) >= chunk_size:
+            flush(device_sn)
+
+    for device_sn in list(buffers):
+        flush(device_sn)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild historical device data from the raw response archive")
+    parser.add_argument('--provider', choices=sorted(ARCHIVED_ENDPOINTS) + ['all'], default='all')
+    parser.add_argument('--start', required=True, help="First day of data (YYYY-MM-DD)")
+    parser.add_argument('--end', required=True, help="Last day of data (YYYY-MM-DD)")
+    parser.add_argument('--root', default=None, help="Archive directory (default: RAW_ARCHIVE_DIR)")
+    parser.add_argument('--replace', action='store_true', help="Overwrite stored rows at the replayed timestamps")
+    parser.add_argument('--dry-run', action='store_true', help="Parse and normalize only")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start = datetime.strptime(args.start, '%Y-%m-%d').date()
+    end = datetime.strptime(args.end, '%Y-%m-%d').date()
+    providers = sorted(ARCHIVED_ENDPOINTS) if args.provider == 'all' else [args.provider]
+
+    session = None
+    if not args.dry_run:
+        from backend.services.etl.api_fetcher import Session as SessionFactory
+        session = SessionFactory()
+    try:
+        for provider in providers:
+            started = time.perf_counter()
+            stats = replay(session, provider, start, end, root=args.root, replace=args.replace, dry_run=args.dry_run)
+            elapsed = time.perf_counter() - started
+            rate = int(stats['normalized'] / elapsed) if elapsed else 0
+            print(f"{provider:>12}: {stats} in {elapsed:.1f}s ({rate} rows/s)")
+    finally:
+        if session is not None:
+            session.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+# backend/services/etl/telemetry.py
+"""
+Structured telemetry of ETL runs.
+
+Every credential processed by the fetchers collects, per device and per API endpoint: API calls, errors,
+retries and latency, rows fetched/normalized/inserted/duplicated/rejected, and the seconds spent in the
+fetch, normalize and write stages. At the end of the credential the numbers are written to the
+etl_telemetry hypertable (scopes 'credential', 'device' and 'endpoint'; fetch_for_all_panels adds one
+'run' row) and added to Prometheus counters, which are pushed to PROMETHEUS_PUSHGATEWAY_URL after each
+run when prometheus_client is installed.
+
+API calls are recorded by hooks on the provider HTTP sessions and attributed through a context variable,
+so they land on the credential and device being fetched in the current thread or asyncio task.
+"""
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+except ImportError:  # Optional: telemetry is still written to etl_telemetry
+    prometheus_client = None
+
+COUNTERS = ('api_calls', 'api_errors', 'retries', 'rows_fetched', 'rows_normalized',
+            'rows_inserted', 'rows_duplicate', 'rows_rejected')
+TIMERS = ('api_seconds', 'fetch_seconds', 'normalize_seconds', 'write_seconds')
+
+# (credential telemetry, device_sn) of the fetch running in this thread / task
+_current: contextvars.ContextVar[Optional[Tuple['CredentialTelemetry', Optional[str]]]] = contextvars.ContextVar(
+    'etl_telemetry', default=None
+)
+
+class Stats:
+    __slots__ = COUNTERS + TIMERS + ('api_max_seconds',)
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def add(self, **values) -> None:
+        for name, value in values.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def merge(self, other: 'Stats') -> None:
+        for name in COUNTERS + TIMERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.api_max_seconds = max(self.api_max_seconds, other.api_max_seconds)
+
+    def row(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def endpoint_name(url: str) -> str:
+    """Low-cardinality endpoint label: ShineMonitor's action parameter, else the URL path."""
+    parts = urlsplit(url)
+    action = dict(parse_qsl(parts.query)).get('action')
+    return action or parts.path or url
+
+class CredentialTelemetry:
+    """Numbers of one credential's run. Thread-safe: the ChunkWriter thread reports writes here too."""
+
+    def __init__(self, run_id: str, api_provider: str, credential_id: Optional[int], historical: bool,
+                 run: Optional['RunTelemetry'] = None):
+        self.run_id = run_id
+        self.api_provider = api_provider
+        self.credential_id = credential_id
+        self.historical = historical
+        self.run = run
+        self.total = Stats()
+        self.endpoints: Dict[str, Stats] = {}
+        self.devices: Dict[str, Stats] = {}
+        self.failed = False
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self, device_sn: Optional[str] = None) -> Iterator['CredentialTelemetry']:
+        """Attributes API calls made in this thread/task (to device_sn when given) to this credential."""
+        token = _current.set((self, device_sn))
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def add(self, device_sn: Optional[str] = None, **values) -> None:
+        with self._lock:
+            self.total.add(**values)
+            if device_sn:
+                self.devices.setdefault(device_sn, Stats()).add(**values)
+
+    def api_call(self, endpoint: str, seconds: float, ok: bool, device_sn: Optional[str] = None) -> None:
+        values = {'api_calls': 1, 'api_errors': 0 if ok else 1, 'api_seconds': seconds}
+        with self._lock:
+            for stats in (self.total, self.endpoints.setdefault(endpoint, Stats()),
+                          self.devices.setdefault(device_sn, Stats()) if device_sn else None):
+                if stats is not None:
+                    stats.add(**values)
+                    stats.api_max_seconds = max(stats.api_max_seconds, seconds)
+        metrics = _prometheus()
+        if metrics is not None:
+            metrics['api_latency'].labels(self.api_provider, endpoint).observe(seconds)
+
+    def retry(self, endpoint: str, device_sn: Optional[str] = None) -> None:
+        with self._lock:
+            for stats in (self.total, self.endpoints.setdefault(endpoint, Stats()),
+                          self.devices.setdefault(device_sn, Stats()) if device_sn else None):
+                if stats is not None:
+                    stats.retries += 1
+
+    def rows(self) -> List[Dict]:
+        now = datetime.now(timezone.utc)
+        base = {'time': now, 'run_id': self.run_id, 'historical': self.historical, 'api_provider': self.api_provider,
+                'credential_id': self.credential_id, 'device_sn': None, 'endpoint': None, 'duration_seconds': None,
+                'failed': self.failed}
+        rows = [{**base, 'scope': 'credential', **self.total.row(), 'duration_seconds': time.perf_counter() - self._started}]
+        rows += [{**base, 'scope': 'endpoint', 'endpoint': endpoint, **stats.row()} for endpoint, stats in self.endpoints.items()]
+        rows += [{**base, 'scope': 'device', 'device_sn': device_sn, **stats.row()} for device_sn, stats in self.devices.items()]
+        return rows
+
+    def finish(self, session: Optional[Session], failed: bool = False) -> None:
+        """Writes the credential's rows and updates the Prometheus counters. Never raises."""
+        self.failed = failed
+        if self.run is not None:
+            self.run.merge(self)
+        try:
+            _count(self)
+        except Exception as e:
+            logger.warning(f"Could not update ETL metrics: {e}")
+        if session is None or not settings.ETL_TELEMETRY:
+            return
+        try:
+            write_rows(session, self.rows())
+        except Exception as e:
+            # Telemetry is best effort: never fail a credential because of it
+            session.rollback()
+            logger.warning(f"Could not write ETL telemetry for credential {self.credential_id}: {e}")
+
+class RunTelemetry:
+    """Totals of one fetch_for_all_panels (or async) run across its credentials."""
+
+    def __init__(self, historical: bool, run_id: Optional[str] = None, shard: Optional[str] = None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.shard = shard
+        self.historical = historical
+        self.total = Stats()
+        self.credentials = 0
+        self.failed = 0
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def credential(self, api_provider: str, credential_id: Optional[int]) -> CredentialTelemetry:
+        return CredentialTelemetry(self.run_id, api_provider, credential_id, self.historical, run=self)
+
+    def merge(self, credential: CredentialTelemetry) -> None:
+        with self._lock:
+            self.total.merge(credential.total)
+            self.credentials += 1
+            self.failed += int(credential.failed)
+
+    def finish(self, session: Optional[Session]) -> None:
+        duration = time.perf_counter() - self._started
+        metrics = _prometheus()
+        if metrics is not None:
+            metrics['run_duration'].labels('historical' if self.historical else 'realtime').set(duration)
+            push_metrics('historical' if self.historical else 'realtime', self.shard)
+        if session is None or not settings.ETL_TELEMETRY:
+            return
+        try:
+            write_rows(session, [{
+                'time': datetime.now(timezone.utc), 'run_id': self.run_id, 'scope': 'run', 'historical': self.historical,
+                'api_provider': None, 'credential_id': None, 'device_sn': None, 'endpoint': None,
+                **self.total.row(), 'duration_seconds': duration, 'failed': self.failed > 0,
+            }])
+        except Exception as e:
+            session.rollback()
+            logger.warning(f"Could not write ETL run telemetry: {e}")
+
+def current() -> Optional[CredentialTelemetry]:
+    active = _current.get()
+    return active[0] if active else None
+
+def record_api_call(url: str, seconds: float, status_code: Optional[int]) -> None:
+    active = _current.get()
+    if active is not None:
+        telemetry, device_sn = active
+        telemetry.api_call(endpoint_name(url), seconds, status_code is not None and status_code < 400, device_sn)
+
+def record_response(response, *args, **kwargs) -> None:
+    """requests response hook (see http_session.create_session)."""
+    record_api_call(response.request.url, response.elapsed.total_seconds(), response.status_code)
+
+async def mark_request_async(request) -> None:
+    """httpx request hook: the async client has no elapsed time before the body is read."""
+    request.extensions['etl_started'] = time.perf_counter()
+
+async def record_response_async(response) -> None:
+    """httpx response hook (see async_clients.create_http_client)."""
+    started = response.request.extensions.get('etl_started')
+    seconds = time.perf_counter() - started if started is not None else 0.0
+    record_api_call(str(response.request.url), seconds, response.status_code)
+
+def record_retry(retry_state) -> None:
+    """tenacity before_sleep hook on the provider request methods."""
+    active = _current.get()
+    if active is None:
+        return
+    telemetry, device_sn = active
+    # The endpoint is the first path/URL argument (after self); token calls have none
+    target = next((a for a in retry_state.args[1:] if isinstance(a, str) and ('/' in a or 'action=' in a)), None)
+    telemetry.retry(endpoint_name(target) if target else retry_state.fn.__name__, device_sn)
+
+def write_rows(session: Session, rows: List[Dict]) -> None:
+    if not rows:
+        return
+    columns = ['time', 'run_id', 'scope', 'historical', 'api_provider', 'credential_id', 'device_sn', 'endpoint',
+               *COUNTERS, *TIMERS, 'api_max_seconds', 'duration_seconds', 'failed']
+    session.execute(
+        text(f"INSERT INTO etl_telemetry ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})"),
+        rows
+    )
+    session.commit()
+
+# Prometheus
+
+_metrics: Optional[Dict] = None
+_metrics_lock = threading.Lock()
+
+def _prometheus() -> Optional[Dict]:
+    """Process-wide metrics in their own registry (created on first use); None without prometheus_client."""
+    global _metrics
+    if prometheus_client is None:
+        return None
+    with _metrics_lock:
+        if _metrics is None:
+            registry = prometheus_client.CollectorRegistry()
+            account = ['provider', 'account']
+            _metrics = {
+                'registry': registry,
+                'api_calls': prometheus_client.Counter('etl_api_calls_total', 'Provider API calls', account + ['endpoint', 'outcome'], registry=registry),
+                'api_latency': prometheus_client.Histogram('etl_api_latency_seconds', 'Provider API latency', ['provider', 'endpoint'], registry=registry),
+                'retries': prometheus_client.Counter('etl_api_retries_total', 'Retried provider API calls', account + ['endpoint'], registry=registry),
+                'rows': prometheus_client.Counter('etl_rows_total', 'Rows per pipeline stage', account + ['kind'], registry=registry),
+                'stage_seconds': prometheus_client.Counter('etl_stage_seconds_total', 'Seconds per pipeline stage', account + ['stage'], registry=registry),
+                'credential_runs': prometheus_client.Counter('etl_credential_runs_total', 'Credential runs', account + ['run', 'outcome'], registry=registry),
+                'run_duration': prometheus_client.Gauge('etl_run_duration_seconds', 'Duration of the last run', ['run'], registry=registry),
+            }
+        return _metrics
+
+def _count(telemetry: CredentialTelemetry) -> None:
+    metrics = _prometheus()
+    if metrics is None:
+        return
+    labels = (telemetry.api_provider, str(telemetry.credential_id))
+    for endpoint, stats in telemetry.endpoints.items():
+        if stats.api_calls - stats.api_errors:
+            metrics['api_calls'].labels(*labels, endpoint, 'ok').inc(stats.api_calls - stats.api_errors)
+        if stats.api_errors:
+            metrics['api_calls'].labels(*labels, endpoint, 'error').inc(stats.api_errors)
+        if stats.retries:
+            metrics['retries'].labels(*labels, endpoint).inc(stats.retries)
+    total = telemetry.total
+    for kind in ('fetched', 'normalized', 'inserted', 'duplicate', 'rejected'):
+        metrics['rows'].labels(*labels, kind).inc(getattr(total, f'rows_{kind}'))
+    for stage in ('api', 'fetch', 'normalize', 'write'):
+        metrics['stage_seconds'].labels(*labels, stage).inc(getattr(total, f'{stage}_seconds'))
+    run = 'historical' if telemetry.historical else 'realtime'
+    metrics['credential_runs'].labels(*labels, run, 'failed' if telemetry.failed else 'ok').inc()
+
+def push_metrics(run: str, shard: Optional[str] = None) -> None:
+    """
+    Pushes the process's metrics to the Pushgateway, grouped by host, run kind and shard. Never raises.
+    Shards running on one host push separate groups instead of replacing each other's; a shard is the
+    Airflow task and map index (stable from one DAG run to the next), else the process ID.
+    """
+    metrics = _prometheus()
+    if metrics is None or not settings.PROMETHEUS_PUSHGATEWAY_URL:
+        return
+    try:
+        prometheus_client.push_to_gateway(
+            settings.PROMETHEUS_PUSHGATEWAY_URL, job='solar_etl', registry=metrics['registry'],
+            grouping_key={'instance': socket.gethostname(), 'run': run, 'shard': shard or f"pid-{os.getpid()}"},
+        )
+    except Exception as e:
+        logger.warning(f"Could not push ETL metrics to {settings.PROMETHEUS_PUSHGATEWAY_URL}: {e}")
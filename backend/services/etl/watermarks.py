@@ -0,0 +1,100 @@
+# backend/services/etl/watermarks.py
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+
+from backend.config.settings import settings
+from backend.services.etl.normalizer import NormalizedBatch
+
+logger = logging.getLogger(__name__)
+
+def _naive(value: datetime) -> datetime:
+    # Normalized timestamps are naive 'YYYY-MM-DD HH:MM:SS' strings; compare everything naive
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return _naive(value)
+    try:
+        return _naive(datetime.fromisoformat(str(value)))
+    except ValueError:
+        return None
+
+def load_watermarks(session: Session, device_sns: List[str]) -> Dict[str, datetime]:
+    """Returns {device_sn: last stored timestamp} for the given devices (devices never fetched are absent)."""
+    if not device_sns:
+        return {}
+    result = session.execute(
+        text("""
+            SELECT device_sn, last_timestamp::timestamp AS last_timestamp
+            FROM device_watermarks WHERE device_sn = ANY(:device_sns)
+        """),
+        {'device_sns': list(device_sns)}
+    )
+    return {row.device_sn: row.last_timestamp for row in result.fetchall()}
+
+def historical_window(watermark: Optional[datetime], now: Optional[datetime] = None) -> Tuple[str, str, Optional[datetime]]:
+    """
+    Returns (start_date, end_date, since) for a historical fetch.
+    Without a watermark the full HISTORICAL_LOOKBACK_DAYS window is requested; otherwise the fetch starts
+    at the watermark minus WATERMARK_OVERLAP_MINUTES (late-arriving rows) and `since` is that cutoff.
+    """
+    now = now or datetime.now()
+    end_date = now.strftime('%Y-%m-%d')
+    if watermark is None:
+        start = now - timedelta(days=int(settings.HISTORICAL_LOOKBACK_DAYS))
+        return start.strftime('%Y-%m-%d'), end_date, None
+
+    since = watermark - timedelta(minutes=int(settings.WATERMARK_OVERLAP_MINUTES))
+    # Never reach further back than a cold start would
+    since = max(since, now - timedelta(days=int(settings.HISTORICAL_LOOKBACK_DAYS)))
+    return since.strftime('%Y-%m-%d'), end_date, since
+
+def filter_since(normalized_data: Union[List[Dict], NormalizedBatch], since: Optional[datetime]):
+    """Drops entries older than the cutoff; providers only page by day, so the first day comes back whole."""
+    if since is None:
+        return normalized_data
+    if isinstance(normalized_data, NormalizedBatch):
+        parsed = map(_parse_timestamp, normalized_data.timestamps)
+        return normalized_data.select([ts is None or ts >= since for ts in parsed])
+    kept = []
+    for entry in normalized_data:
+        ts = _parse_timestamp(entry.get('timestamp'))
+        if ts is None or ts >= since:
+            kept.append(entry)
+    return kept
+
+def advance_watermark(session: Session, device_sn: str, api_provider: str,
+                      normalized_data: Union[List[Dict], NormalizedBatch]) -> Optional[datetime]:
+    """Moves the device watermark forward to the newest stored timestamp (never backwards)."""
+    if isinstance(normalized_data, NormalizedBatch):
+        raw = normalized_data.timestamps
+    else:
+        raw = [e.get('timestamp') for e in normalized_data]
+    timestamps = [ts for ts in map(_parse_timestamp, raw) if ts is not None]
+    if not timestamps:
+        return None
+    newest = max(timestamps)
+    session.execute(text("""
+        INSERT INTO device_watermarks (device_sn, api_provider, last_timestamp, updated_at)
+        VALUES (:device_sn, :api_provider, :last_timestamp, NOW())
+        ON CONFLICT (device_sn) DO UPDATE
+        SET last_timestamp = GREATEST(device_watermarks.last_timestamp, EXCLUDED.last_timestamp),
+            updated_at = NOW()
+    """), {'device_sn': device_sn, 'api_provider': api_provider, 'last_timestamp': newest})
+    session.commit()
+    return newest
+
+def mark_credential_fetched(session: Session, credential_id: Optional[int]) -> None:
+    """Stamps api_credentials.last_fetched after a successful run of the credential."""
+    if credential_id is None:
+        return
+    session.execute(
+        text("UPDATE api_credentials SET last_fetched = NOW() WHERE credential_id = :credential_id"),
+        {'credential_id': credential_id}
+    )
+    session.commit()
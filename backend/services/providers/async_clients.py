@@ -0,0 +1,494 @@
+"""
+Asyncio variants of the provider clients.
+
+Each class subclasses its blocking counterpart so signing (calculate_sign, generate_signature),
+token bookkeeping and response parsing are shared; only the transport is replaced by a pooled
+httpx.AsyncClient that every client in the process shares (see create_http_client).
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from pytz import timezone
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+
+from backend.config.settings import settings
+from backend.services.providers.solarman_client import SolarmanAPI
+from backend.services.providers.shinemonitor_client import ShinemonitorAPI
+from backend.services.providers.soliscloud_client import SolisCloudAPI
+from backend.services.providers.errors import ProviderDayError, ProviderFetchError
+from backend.services.providers.rate_limiter import ProviderThrottled
+from backend.services.providers.token_cache import is_auth_error
+from backend.services.providers.raw_archive import archive_response
+from backend.services.etl.telemetry import mark_request_async, record_response_async, record_retry
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_client(max_connections: Optional[int] = None) -> httpx.AsyncClient:
+    """One pooled client per event loop; pass it to every async provider client."""
+    max_connections = max_connections or settings.ASYNC_HTTP_MAX_CONNECTIONS
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(30.0),
+        event_hooks={'request': [mark_request_async], 'response': [record_response_async]},
+    )
+
+
+class AsyncSolarmanAPI(SolarmanAPI):
+    def __init__(self, http: httpx.AsyncClient, email: str, password_sha256: str, app_id: str, app_secret: str, base_url: str = "https://globalapi.solarmanpv.com"):
+        super().__init__(email=email, password_sha256=password_sha256, app_id=app_id, app_secret=app_secret, base_url=base_url)
+        self.http = http
+        self._token_lock = asyncio.Lock()
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type(httpx.HTTPError),
+        before_sleep=record_retry,
+        reraise=True
+    )
+    async def get_access_token(self) -> None:
+        url = f"{self.base_url}/account/v1.0/token?appId={self.app_id}"
+        headers = {"Content-Type": "application/json"}
+        await self.rate_limiter.acquire_async()
+        try:
+            response = await self.http.post(url, headers=headers, json=self._token_payload(), timeout=30)
+            response.raise_for_status()
+            self._store_token(response.json())
+        except httpx.HTTPError as e:
+            logger.error(f"Error obtaining access token: {str(e)}")
+            raise
+
+    async def _ensure_token(self) -> None:
+        if not self._is_token_expired():
+            return
+        async with self._token_lock:
+            # Concurrent device fetches share one login
+            if self._is_token_expired() and not await asyncio.to_thread(self._load_cached_token):
+                logger.info("Access token expired or not set. Obtaining new token...")
+                await self.get_access_token()
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=2, min=4, max=20),
+        retry=retry_if_exception_type((httpx.HTTPError, ProviderThrottled)),
+        before_sleep=record_retry,
+        reraise=True
+    )
+    async def _make_request(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None) -> Dict:
+        url = f"{self.base_url}{endpoint}"
+        try:
+            for attempt in range(2):
+                await self._ensure_token()
+                await self.rate_limiter.acquire_async()
+                if method.upper() == "GET":
+                    response = await self.http.get(url, headers=self._auth_headers(), params=params, timeout=30)
+                elif method.upper() == "POST":
+                    response = await self.http.post(url, headers=self._auth_headers(), params=params, json=data, timeout=30)
+                else:
+                    raise ValueError(f"Unsupported HTTP method: {method}")
+                self.rate_limiter.check(response.status_code, response.headers)
+                result = response.json() if response.status_code < 400 else None
+                if attempt == 0 and self._auth_rejected(response.status_code, result):
+                    # Token revoked or expired early: log in again and retry once
+                    logger.warning(f"Access token rejected for {endpoint}; re-authenticating")
+                    await asyncio.to_thread(self._invalidate_token)
+                    continue
+                break
+            response.raise_for_status()
+            if not result.get("success"):
+                self.rate_limiter.check(message=result.get("msg"))
+            self.rate_limiter.success()
+            archive_response("solarman", endpoint, data, result)
+            return self._check_result(endpoint, result)
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Error making API request to {endpoint}: {str(e)}")
+            logger.error(f"Response content: {e.response.text}")
+            raise
+        except httpx.HTTPError as e:
+            logger.error(f"Error making API request to {endpoint}: {str(e)}")
+            raise
+
+    async def get_plant_list(self, user_id: str, username: str, password: str) -> List[Dict]:
+        try:
+            response = await self._make_request("POST", "/station/v1.0/list?language=en", data={})
+            return response.get("stationList", [])
+        except Exception as e:
+            logger.error(f"Error fetching plant list: {str(e)}")
+            raise
+
+    async def get_all_devices(self, user_id: str, username: str, password: str, plant_id: str) -> List[Dict]:
+        payload = {"stationId": plant_id, "deviceType": "INVERTER"}
+        try:
+            response = await self._make_request("POST", "/station/v1.0/device?language=en", data=payload)
+            return response.get("deviceListItems", []) or response.get("deviceList", [])
+        except Exception as e:
+            logger.error(f"Error fetching devices for plant {plant_id}: {str(e)}")
+            raise
+
+    async def get_historical_data(self, user_id: str, username: str, password: str, device: Dict, start_date: str, end_date: str) -> List[Dict]:
+        start_dt, end_dt, now = self._historical_window(start_date, end_date)
+        normalized_data = []
+        for first_dt, last_dt in self._historical_chunks(start_dt, end_dt):
+            payload = self._historical_payload(device, first_dt, last_dt)
+            try:
+                response = await self._make_request("POST", "/device/v1.0/historical?language=en", data=payload)
+            except Exception as e:
+                logger.error(f"Error fetching Solarman historical data for {device.get('deviceSn')} from {first_dt.strftime('%Y-%m-%d')} to {last_dt.strftime('%Y-%m-%d')}: {str(e)}")
+                raise ProviderDayError("solarman", device.get("deviceSn"), first_dt.strftime('%Y-%m-%d'), str(e), rows=normalized_data) from e
+            normalized_data.extend(self._parse_param_data_list(response.get("paramDataList", []), device, now))
+        return normalized_data
+
+    async def get_current_day_data(self, user_id: str, username: str, password: str, device: Dict) -> List[Dict]:
+        today = datetime.now().strftime('%Y-%m-%d')
+        start_dt, end_dt, now = self._historical_window(today, today)
+        normalized_data = []
+        current_dt = start_dt
+        while current_dt <= end_dt:
+            payload = self._historical_payload(device, current_dt, current_dt)
+            try:
+                response = await self._make_request("POST", "/device/v1.0/historical?language=en", data=payload)
+                normalized_data.extend(self._parse_param_data_list(response.get("paramDataList", []), device, now))
+            except Exception as e:
+                logger.error(f"Error fetching Solarman historical data for {device.get('deviceSn')} on {current_dt.strftime('%Y-%m-%d')}: {str(e)}")
+            current_dt += timedelta(days=1)
+        return normalized_data
+
+    async def get_realtime_data(self, user_id: str, username: str, password: str, device: Dict) -> List[Dict]:
+        try:
+            response = await self._make_request("POST", "/device/v1.0/currentData", params={"language": "en"}, data=self._realtime_payload(device))
+            return self._parse_realtime_response(response, device)
+        except Exception as e:
+            logger.error(f"Error fetching Solarman current data for {device.get('deviceSn')}: {str(e)}")
+            raise ProviderFetchError(f"solarman device {device.get('deviceSn')}: {e}") from e
+
+
+class AsyncShinemonitorAPI(ShinemonitorAPI):
+    def __init__(self, http: httpx.AsyncClient, company_key=None, base_url="http://api.shinemonitor.com/public/"):
+        super().__init__(company_key=company_key, base_url=base_url)
+        self.http = http
+        self._auth_lock = asyncio.Lock()
+
+    async def authenticate(self, username, password):
+        self._login = (username, password)
+        if await asyncio.to_thread(self._load_cached_auth, username):
+            return self.secret, self.token
+        try:
+            return self._store_auth(await self._get(partial(self._auth_url, username, password), timeout=10), username)
+        except httpx.HTTPError as e:
+            self.logger.error(f"Error during authentication: {e}")
+            self.secret = None
+            self.token = None
+            return None, None
+
+    async def _ensure_auth(self, username, password):
+        if not self._auth_expired():
+            return True
+        async with self._auth_lock:
+            if self._auth_expired():
+                await self.authenticate(username, password)
+        return bool(self.secret and self.token)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type(ProviderThrottled),
+        before_sleep=record_retry,
+        reraise=True
+    )
+    async def _get(self, build_url, timeout=10):
+        await self.rate_limiter.acquire_async()
+        response = await self.http.get(build_url(), timeout=timeout)
+        self.rate_limiter.check(response.status_code, response.headers)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("err") != 0:
+            self.rate_limiter.check(message=data.get("desc"))
+        self.rate_limiter.success()
+        return data
+
+    async def _query(self, action_params, timeout=10):
+        # URL is signed per attempt (_get calls the builder on every retry): the salt is a timestamp
+        data = await self._get(partial(self._signed_url, action_params), timeout=timeout)
+        if data.get("err") != 0 and self._login and is_auth_error("shinemonitor", code=data.get("err"), message=data.get("desc")):
+            self.logger.warning(f"Session token rejected ({data.get('desc')}); re-authenticating")
+            username, password = self._login
+            async with self._auth_lock:
+                await asyncio.to_thread(self._invalidate_auth, username)
+                await self.authenticate(username, password)
+            if self.secret and self.token:
+                data = await self._get(partial(self._signed_url, action_params), timeout=timeout)
+        self._archive(action_params, data)
+        return data
+
+    async def fetch_plant_list(self, user_id, username, password):
+        if not await self._ensure_auth(username, password):
+            return []
+        try:
+            data = await self._query("&action=queryPlants&pagesize=50")
+            if data.get("err") != 0:
+                self.logger.error(f"Error fetching plant list for user {user_id}: {data.get('desc')}")
+                return []
+            return self._parse_plants(data["dat"])
+        except httpx.HTTPError as e:
+            self.logger.error(f"Error fetching plant list for user {user_id}: {e}")
+            return []
+
+    async def fetch_plant_info(self, user_id, username, password, plant_id):
+        if not await self._ensure_auth(username, password):
+            return None
+        try:
+            data = await self._query(f"&action=queryPlantInfo&plantid={plant_id}")
+            if data.get("err") != 0:
+                self.logger.error(f"Error fetching plant info for plant {plant_id}: {data.get('desc')}")
+                return None
+            return {"install_date": data["dat"]["install"]}
+        except httpx.HTTPError as e:
+            self.logger.error(f"Error fetching plant info for plant {plant_id}: {e}")
+            return None
+
+    async def fetch_plant_devices(self, user_id, username, password, plant_id):
+        if not await self._ensure_auth(username, password):
+            return []
+        try:
+            data = await self._query(f"&action=queryDevices&plantid={plant_id}&pagesize=50")
+            if data.get("err") != 0:
+                self.logger.error(f"Error fetching devices for plant {plant_id}, user {user_id}: {data.get('desc')}")
+                return []
+            plant_info = await self.fetch_plant_info(user_id, username, password, plant_id)
+            install_date = plant_info.get("install_date") if plant_info else None
+            return self._parse_devices(data["dat"]["device"], install_date)
+        except httpx.HTTPError as e:
+            self.logger.error(f"Error fetching devices for plant {plant_id}, user {user_id}: {e}")
+            return []
+
+    async def fetch_historical_data(self, user_id, username, password, device, start_date, end_date):
+        """Rows of every day in the range; raises ProviderDayError (with the rows before it) at the first failed day."""
+        if not await self._ensure_auth(username, password):
+            raise ProviderDayError("shinemonitor", device.get("sn"), start_date, "not authenticated")
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+        all_data = []
+        current_date = start
+        while current_date <= end:
+            date_str = current_date.strftime('%Y-%m-%d')
+            try:
+                data = await self._query(self._day_action_params(device, date_str), timeout=30)
+            except (httpx.HTTPError, ProviderThrottled) as e:
+                self.logger.error(f"Error fetching historical data for device {device['sn']}: {e}")
+                raise ProviderDayError("shinemonitor", device.get("sn"), date_str, str(e), rows=all_data) from e
+            rows = self._day_rows(data, device, date_str)
+            if rows is None:
+                raise ProviderDayError("shinemonitor", device.get("sn"), date_str, f"err {data.get('err')}: {data.get('desc')}",
+                                       rows=all_data)
+            all_data.extend(rows)
+            current_date += timedelta(days=1)
+        return all_data
+
+    async def fetch_current_data(self, user_id, username, password, device, since=None):
+        if not await self._ensure_auth(username, password):
+            raise ProviderFetchError(f"shinemonitor device {device.get('sn')}: not authenticated")
+        try:
+            date_str = datetime.utcnow().strftime("%Y-%m-%d")
+            data = await self._query(self._current_action_params(device, date_str, since))
+        except httpx.HTTPError as e:
+            self.logger.error(f"Error fetching current data for device {device['sn']}: {e}")
+            raise ProviderFetchError(f"shinemonitor device {device.get('sn')}: {e}") from e
+        return self._current_rows(data, device)
+
+
+class AsyncSolisCloudAPI(SolisCloudAPI):
+    def __init__(self, http: httpx.AsyncClient, api_key: str, api_secret: str, base_url: str = "https://www.soliscloud.com:13333", rate_limit_delay: Optional[float] = None):
+        super().__init__(api_key=api_key, api_secret=api_secret, base_url=base_url, rate_limit_delay=rate_limit_delay)
+        self.http = http
+        self._catalog_locks: Dict[Any, asyncio.Lock] = {}
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((httpx.HTTPError, ProviderThrottled)),
+        before_sleep=record_retry,
+        reraise=True
+    )
+    async def make_request(self, method: str, endpoint: str, payload: Optional[Dict] = None) -> Optional[Dict]:
+        endpoint = endpoint.lstrip("/")
+        await self.rate_limiter.acquire_async()
+        url, headers = self._signed_request(method, endpoint, payload)
+        try:
+            response = await self.http.request(method, url, headers=headers, json=payload, timeout=30)
+            self.rate_limiter.check(response.status_code, response.headers)
+            if is_auth_error("soliscloud", status_code=response.status_code):
+                logger.error(f"SolisCloud rejected the API key for {endpoint}; check the credential")
+            response.raise_for_status()
+            body = response.json()
+            if not body.get("success") or body.get("code") != "0":
+                self.rate_limiter.check(message=body.get("msg"))
+            self.rate_limiter.success()
+            archive_response("soliscloud", endpoint, payload, body)
+            return self._check_response(endpoint, body)
+        except httpx.HTTPError as e:
+            logger.error(f"API request failed for {endpoint}: {str(e)}")
+            return None
+
+    async def _list_pages(self, endpoint: str, params: Dict[str, Any], parse) -> List[Dict[str, Any]]:
+        page_no = 1
+        page_size = 100
+        results = []
+        while True:
+            response = await self.make_request("POST", endpoint, {**params, "pageNo": page_no, "pageSize": page_size})
+            if not response:
+                logger.error(f"{endpoint} request failed for page {page_no} ({params})")
+                break
+            page = response.get("data", {}).get("page", {})
+            for record in page.get("records", []):
+                parsed = parse(record)
+                if parsed:
+                    results.append(parsed)
+            if page_no * page_size >= page.get("total", 0):
+                break
+            page_no += 1
+        return results
+
+    async def _cached_listing(self, key, load) -> List[Dict[str, Any]]:
+        # Same sharing as catalog.get_or_load, with an asyncio lock so coroutines wait instead of the loop
+        cached = self.catalog.get(key)
+        if cached is not None:
+            return cached
+        async with self._catalog_locks.setdefault(key, asyncio.Lock()):
+            cached = self.catalog.get(key)
+            if cached is None:
+                cached = await load()
+                self.catalog.set(key, cached)
+            return cached
+
+    async def _list_stations(self) -> List[Dict[str, Any]]:
+        stations = await self._list_pages("userStationList", {}, self._parse_station)
+        logger.info(f"Fetched a total of {len(stations)} stations")
+        return stations
+
+    async def _list_inverters(self, station_id: str) -> List[Dict[str, Any]]:
+        inverters = await self._list_pages("inverterList", {"stationId": station_id}, self._parse_inverter)
+        logger.info(f"Fetched a total of {len(inverters)} inverters for station {station_id}")
+        return inverters
+
+    async def get_all_stations(self, user_id: str, username: str = None, password: str = None) -> List[Dict[str, Any]]:
+        return await self._cached_listing("stations", self._list_stations)
+
+    async def get_all_inverters(self, user_id: str, username: str = None, password: str = None, station_id: str = None) -> List[Dict[str, Any]]:
+        return await self._cached_listing(("inverters", station_id), lambda: self._list_inverters(station_id))
+
+    async def _resolve_device(self, user_id: str, device: Optional[Dict[str, Any]], station_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if device and device.get("id") and device.get("sn"):
+            return device
+        if not station_id:
+            logger.error("Invalid device data and no station_id provided")
+            return None
+        inverters = await self.get_all_inverters(user_id, station_id=station_id)
+        if not inverters:
+            logger.error(f"No inverters found for station {station_id}")
+            return None
+        return inverters[0]
+
+    async def _station_time_zone(self, user_id: str, station_id: Optional[str]) -> float:
+        stations = await self.get_all_stations(user_id)
+        station = next((s for s in stations if s["station_id"] == station_id), None) if station_id else None
+        return station["time_zone"] if station else 5.5
+
+    async def _fetch_inverter_days(self, device: Dict[str, Any], dates: List[str], time_zone: float, realtime: bool = False) -> List[Dict[str, Any]]:
+        historical_data = []
+        for date_str in dates:
+            page_no = 1
+            page_size = 100
+            while True:
+                params = self._inverter_day_params(device, date_str, time_zone, page_no, page_size, realtime=realtime)
+                try:
+                    response = await self.make_request("POST", "inverterDay", params)
+                except ProviderThrottled as e:
+                    raise ProviderDayError("soliscloud", device.get("sn"), date_str, str(e), rows=historical_data) from e
+                entries, total_records = self._parse_day_page(response, device, date_str) if response else (None, 0)
+                if entries is None:
+                    logger.warning(f"No data for device {device['sn']} on {date_str}, page {page_no}")
+                    raise ProviderDayError("soliscloud", device.get("sn"), date_str, f"inverterDay page {page_no} failed",
+                                           rows=historical_data)
+                historical_data.extend(entries)
+                if page_no * page_size >= total_records:
+                    break
+                page_no += 1
+        return historical_data
+
+    async def get_inverter_current_data(self, user_id: str, username: str = None, password: str = None, device: Dict[str, Any] = None, station_id: str = None) -> List[Dict[str, Any]]:
+        device = await self._resolve_device(user_id, device, station_id)
+        if not device:
+            raise ProviderFetchError(f"soliscloud: no inverter found for station {station_id}")
+        today = datetime.now(timezone('Asia/Kolkata')).strftime('%Y-%m-%d')
+        dates = self._day_window(today, today)
+        if dates is None:
+            return []
+        time_zone = await self._station_time_zone(user_id, station_id)
+        return await self._fetch_inverter_days(device, dates, time_zone, realtime=True)
+
+    async def _detail_fields(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.make_request("POST", "inverterDetail", {"id": entry["id"], "sn": entry["sn"]})
+        return self._detail_subset(response, entry)
+
+    async def iter_realtime_pages(self, user_id: str, station_id: str = None, with_detail: Optional[bool] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Async counterpart of SolisCloudAPI.iter_realtime_pages: one inverterList page (up to 100 inverters)
+        per request; the inverterDetail calls of a page run concurrently, paced by the rate limiter.
+        """
+        with_detail = settings.SOLISCLOUD_REALTIME_DETAIL if with_detail is None else with_detail
+        page_no = 1
+        page_size = 100
+        detail_calls = 0
+
+        while True:
+            params = {"pageNo": page_no, "pageSize": page_size}
+            if station_id:
+                params["stationId"] = station_id
+            response = await self.make_request("POST", "inverterList", params)
+            if not response:
+                logger.error(f"Inverter list request failed for page {page_no} ({station_id or 'all stations'})")
+                break
+
+            page = response.get("data", {}).get("page", {})
+            parsed = [(record, self._parse_list_realtime(record)) for record in page.get("records", [])]
+            entries = [entry for _, entry in parsed if entry]
+            needs_detail = [entry for record, entry in parsed if entry and with_detail and self._needs_detail(record)]
+            details = await asyncio.gather(*(self._detail_fields(entry) for entry in needs_detail))
+            for entry, fields in zip(needs_detail, details):
+                entry.update(fields)
+            detail_calls += len(needs_detail)
+            yield entries
+
+            if page_no * page_size >= page.get("total", 0):
+                break
+            page_no += 1
+
+        logger.info(f"Bulk realtime finished after {page_no} inverterList pages and {detail_calls} detail calls")
+
+    async def get_inverter_real_time_data(self, user_id: str, username: str = None, password: str = None, device: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        if not device or not device.get("id") or not device.get("sn"):
+            logger.error("Invalid device data provided")
+            return []
+        response = await self.make_request("POST", "inverterDetail", {"id": device["id"], "sn": device["sn"]})
+        if not response:
+            logger.warning(f"No CURRENT data for device {device['sn']}")
+            return []
+        return self._parse_detail_response(response, device)
+
+    async def get_inverter_historical_data(self, user_id: str, username: str = None, password: str = None, device: Dict[str, Any] = None, start_date: str = None, end_date: str = None, station_id: str = None) -> List[Dict[str, Any]]:
+        device = await self._resolve_device(user_id, device, station_id)
+        if not device:
+            raise ProviderDayError("soliscloud", None, start_date, f"no inverter found for station {station_id}")
+        if not start_date or not end_date:
+            logger.error("Start date and end date must be provided")
+            return []
+        dates = self._day_window(start_date, end_date)
+        if dates is None:
+            return []
+        time_zone = await self._station_time_zone(user_id, station_id)
+        return await self._fetch_inverter_days(device, dates, time_zone)
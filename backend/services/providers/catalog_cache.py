@@ -0,0 +1,69 @@
+"""
+Short-lived cache for provider catalog listings (stations, inverters).
+
+Per-device fetches need station metadata such as the time zone, and sometimes the inverter ids of a
+station. Listing them is a paginated, rate-limited walk, so one listing per account is reused by every
+device fetch until it is CATALOG_CACHE_TTL seconds old. Concurrent threads that miss on the same key wait for
+a single load instead of each paging through the listing.
+"""
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from backend.config.settings import settings
+
+class CatalogCache:
+    def __init__(self, ttl: float):
+        self.ttl = float(ttl)
+        self._entries: Dict[Hashable, Tuple[float, List]] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable) -> Optional[List]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            return None
+        return list(entry[1])
+
+    def set(self, key: Hashable, items: List) -> None:
+        # An empty listing is usually a failed request; let the next caller retry it
+        if not items:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(items))
+
+    def get_or_load(self, key: Hashable, load: Callable[[], List]) -> List:
+        """Returns the cached listing, loading it once (per key, across threads) when missing or stale."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            items = load()
+            self.set(key, items)
+            return items
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+_catalogs: Dict[Tuple[str, str], CatalogCache] = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog_cache(provider: str, account: str) -> CatalogCache:
+    """Returns the process-wide catalog cache for one provider account (created on first use)."""
+    key = (provider.lower(), account or '')
+    with _catalogs_lock:
+        cache = _catalogs.get(key)
+        if cache is None:
+            cache = CatalogCache(int(settings.CATALOG_CACHE_TTL))
+            _catalogs[key] = cache
+        return cache
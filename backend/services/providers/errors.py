@@ -0,0 +1,27 @@
+"""
+Errors raised by the provider clients.
+
+Historical iterators fetch one day (or one range of days) after the other. When a day cannot be fetched
+they raise ProviderDayError instead of skipping it: the days before it have already been yielded, so
+the caller's watermark only covers the unbroken run of days that succeeded, and the failed day is
+fetched again on the next run.
+
+Realtime fetches raise ProviderFetchError, so a failed request is not mistaken for a device that has
+nothing new to report (see PollScheduler.plan).
+"""
+from typing import Any, Dict, List, Optional
+
+class ProviderFetchError(Exception):
+    """A device's data could not be fetched (API error, request error, missing session)."""
+
+class ProviderDayError(ProviderFetchError):
+    """A day of historical data could not be fetched; `rows` holds the entries of the days before it."""
+
+    def __init__(self, api_provider: str, device_sn: Optional[str], day: str, reason: str,
+                 rows: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(f"{api_provider} device {device_sn}: day {day} failed: {reason}")
+        self.api_provider = api_provider
+        self.device_sn = device_sn
+        self.day = day
+        self.reason = reason
+        self.rows = rows or []
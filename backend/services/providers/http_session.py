@@ -0,0 +1,30 @@
+"""
+Pooled HTTP sessions for the synchronous provider clients.
+
+Each client owns one requests.Session, so consecutive calls to a provider reuse a keep-alive connection
+instead of paying a new TCP and TLS handshake every time. Pool sizes and timeouts come from Settings.
+Every response is reported to the ETL telemetry of the credential being fetched (if any).
+"""
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.config.settings import settings
+from backend.services.etl.telemetry import record_response
+
+def create_session(pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None) -> requests.Session:
+    """Returns a Session whose http/https adapters keep up to pool_maxsize connections per host alive."""
+    adapter = HTTPAdapter(
+        pool_connections=int(pool_connections or settings.HTTP_POOL_CONNECTIONS),
+        pool_maxsize=int(pool_maxsize or settings.HTTP_POOL_MAXSIZE),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks['response'].append(record_response)
+    return session
+
+def request_timeout(read: Optional[float] = None) -> Tuple[float, float]:
+    """(connect, read) timeout tuple; read defaults to HTTP_READ_TIMEOUT."""
+    return float(settings.HTTP_CONNECT_TIMEOUT), float(read if read is not None else settings.HTTP_READ_TIMEOUT)
@@ -0,0 +1,222 @@
+"""
+Token-bucket rate limiting for provider APIs.
+
+One limiter exists per (provider, account) and is shared by every client instance, thread and
+coroutine in the process. With RATE_LIMIT_BACKEND=redis the bucket state lives in Redis so all
+Airflow workers draw from the same quota. Throttling responses (HTTP 429 or a vendor "too frequent"
+error) block the bucket for Retry-After or an exponential backoff.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from backend.config.settings import settings
+from backend.services.providers.errors import ProviderFetchError
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_RATES = {
+    'solarman': settings.SOLARMAN_RATE_LIMIT,
+    'shinemonitor': settings.SHINEMONITOR_RATE_LIMIT,
+    'soliscloud': settings.SOLISCLOUD_RATE_LIMIT,
+}
+
+# Vendors report throttling in the JSON body rather than with a 429
+THROTTLE_MARKERS = ('too many', 'too frequent', 'frequently', 'rate limit')
+
+class ProviderThrottled(ProviderFetchError):
+    """
+    The provider throttled the request; the limiter has already backed off, so retrying is safe.
+    Once the client's retries are used up it fails that device's fetch like any other fetch error.
+    """
+
+def is_throttled(status_code: Optional[int] = None, message: Optional[str] = None) -> bool:
+    if status_code == 429:
+        return True
+    text = (message or '').lower()
+    return any(marker in text for marker in THROTTLE_MARKERS)
+
+def retry_after_seconds(headers) -> Optional[float]:
+    value = (headers or {}).get('Retry-After')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None  # HTTP-date form; fall back to exponential backoff
+
+class LocalTokenBucket:
+    """Thread-safe in-process bucket."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Takes tokens if available and returns 0, otherwise returns the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def block(self, seconds: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+class RedisTokenBucket:
+    """Bucket shared through Redis; refill and take run atomically in one Lua script on server time."""
+
+    _ACQUIRE = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local requested = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'blocked_until')
+    local blocked = tonumber(state[3]) or 0
+    if now < blocked then
+        return tostring(blocked - now)
+    end
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local wait = 0
+    if tokens >= requested then
+        tokens = tokens - requested
+    else
+        wait = (requested - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+    return tostring(wait)
+    """
+
+    _BLOCK = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local until_ts = now + tonumber(ARGV[1])
+    local current = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+    if until_ts > current then
+        redis.call('HSET', KEYS[1], 'blocked_until', tostring(until_ts), 'tokens', '0', 'ts', tostring(now))
+    end
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[1])) + 60)
+    return 1
+    """
+
+    def __init__(self, client, key: str, rate: float, capacity: float):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self._acquire = client.register_script(self._ACQUIRE)
+        self._block = client.register_script(self._BLOCK)
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        return float(self._acquire(keys=[self.key], args=[self.rate, self.capacity, tokens]))
+
+    def block(self, seconds: float) -> None:
+        self._block(keys=[self.key], args=[seconds])
+
+class RateLimiter:
+    def __init__(self, provider: str, account: str, rate: float, capacity: Optional[float] = None):
+        self.provider = provider
+        self.rate = max(0.01, float(rate))
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self._local = LocalTokenBucket(self.rate, self.capacity)
+        self._bucket = self._local
+        self._strikes = 0
+        self._strike_lock = threading.Lock()
+        if str(settings.RATE_LIMIT_BACKEND).lower() == 'redis':
+            try:
+                import redis
+                client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=2)
+                account_hash = hashlib.sha1(account.encode('utf-8')).hexdigest()[:16]  # Keep keys/secrets out of Redis
+                self._bucket = RedisTokenBucket(client, f"ratelimit:{provider}:{account_hash}", self.rate, self.capacity)
+            except Exception as e:
+                logger.warning(f"Redis rate limiter unavailable for {provider}, using in-process bucket: {e}")
+
+    def set_rate(self, rate: float) -> None:
+        self.rate = max(0.01, float(rate))
+        self.capacity = max(1.0, self.rate)
+        for bucket in {id(self._local): self._local, id(self._bucket): self._bucket}.values():
+            bucket.rate, bucket.capacity = self.rate, self.capacity
+
+    def _try_acquire(self) -> float:
+        try:
+            return self._bucket.try_acquire()
+        except Exception as e:
+            if self._bucket is self._local:
+                raise
+            logger.warning(f"Redis rate limiter error for {self.provider}, falling back to in-process bucket: {e}")
+            self._bucket = self._local
+            return self._local.try_acquire()
+
+    def acquire(self) -> None:
+        """Blocks until a request may be sent."""
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        while True:
+            if self._bucket is self._local:
+                wait = self._try_acquire()
+            else:
+                wait = await asyncio.to_thread(self._try_acquire)  # Redis round trip stays off the loop
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def backoff(self, retry_after: Optional[float] = None) -> float:
+        """Blocks the bucket after a throttling response; returns the delay applied."""
+        with self._strike_lock:
+            self._strikes += 1
+            strikes = self._strikes
+        delay = retry_after if retry_after is not None else min(
+            float(settings.RATE_LIMIT_MAX_BACKOFF), (1.0 / self.rate) * 2 ** strikes
+        )
+        logger.warning(f"{self.provider} throttled the client; backing off {delay:.1f}s (strike {strikes})")
+        try:
+            self._bucket.block(delay)
+        except Exception as e:
+            logger.warning(f"Could not record backoff in Redis for {self.provider}: {e}")
+            self._local.block(delay)
+        return delay
+
+    def check(self, status_code: Optional[int] = None, headers=None, message: Optional[str] = None) -> None:
+        """Raises ProviderThrottled (after backing off) if the response signals throttling."""
+        if is_throttled(status_code, message):
+            self.backoff(retry_after_seconds(headers) if status_code == 429 else None)
+            raise ProviderThrottled(f"{self.provider} throttled the request (status={status_code}, message={message})")
+
+    def success(self) -> None:
+        if self._strikes:
+            with self._strike_lock:
+                self._strikes = 0
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider: str, account: str) -> RateLimiter:
+    """Returns the process-wide limiter for one provider account (created on first use)."""
+    provider = provider.lower()
+    key = (provider, account or '')
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(provider, account or '', PROVIDER_RATES.get(provider, 1.0))
+            _limiters[key] = limiter
+        return limiter
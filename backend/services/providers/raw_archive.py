@@ -0,0 +1,192 @@
+"""
+Compressed archive of raw provider responses.
+
+When RAW_ARCHIVE_DIR is set, every data response (the endpoints in ARCHIVED_ENDPOINTS) is appended as one
+JSON line to RAW_ARCHIVE_DIR/<provider>/<YYYY-MM-DD>/<host>-<pid>.jsonl.gz (or .jsonl.zst with
+RAW_ARCHIVE_COMPRESSION=zstd and the zstandard package installed). Each process writes its own file, so
+concurrent Airflow workers never interleave. The archive lets etl.replay rebuild history offline after a
+parser or normalizer fix instead of refetching it through the vendor rate limits.
+
+The <YYYY-MM-DD> directory is the first day of data the request asked for (see data_days), not the day it
+was fetched, so a backfill and the hourly runs that re-fetch today both land under the day they describe.
+Responses whose request names no day fall back to the fetch day.
+"""
+import atexit
+import gzip
+import io
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import date, datetime, timedelta, timezone
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # Optional: gzip is always available
+    zstandard = None
+
+# Responses that carry device data; listings and auth calls are not archived
+ARCHIVED_ENDPOINTS = {
+    'solarman': ('/device/v1.0/historical',),
+    'shinemonitor': ('queryDeviceDataOneDay',),
+    'soliscloud': ('inverterDay',),
+}
+
+# Request fields naming the first and last day of data in the response, per archived endpoint
+_FIRST_DAY_FIELDS = ('startDate', 'date', 'time', 'startTime')
+_LAST_DAY_FIELDS = ('endDate', 'endTime')
+
+# Open streams per process; a backfill walks the days in order, so a few cover the days in flight
+_MAX_OPEN_WRITERS = 8
+
+def _parse_day(value: Any) -> Optional[date]:
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def data_days(request: Any) -> Optional[Tuple[date, date]]:
+    """(first, last) day of data a request asked for, or None when it names no day."""
+    if not isinstance(request, dict):
+        return None
+    first = next((_parse_day(request[field]) for field in _FIRST_DAY_FIELDS if request.get(field)), None)
+    if first is None:
+        return None
+    last = next((_parse_day(request[field]) for field in _LAST_DAY_FIELDS if request.get(field)), None)
+    return first, max(first, last or first)
+
+class RawArchive:
+    def __init__(self, root: str, compression: str = 'gzip'):
+        self.root = root
+        self.compression = compression.lower()
+        if self.compression == 'zstd' and zstandard is None:
+            logger.warning("RAW_ARCHIVE_COMPRESSION=zstd but zstandard is not installed; using gzip")
+            self.compression = 'gzip'
+        self._writers: 'OrderedDict[Tuple[str, str], Any]' = OrderedDict()  # (provider, day) -> open stream
+        self._lock = threading.Lock()
+
+    def _path(self, provider: str, day: str) -> str:
+        directory = os.path.join(self.root, provider, day)
+        os.makedirs(directory, exist_ok=True)
+        suffix = 'zst' if self.compression == 'zstd' else 'gz'
+        return os.path.join(directory, f"{socket.gethostname()}-{os.getpid()}.jsonl.{suffix}")
+
+    def _writer(self, provider: str, day: str):
+        key = (provider, day)
+        if key in self._writers:
+            self._writers.move_to_end(key)
+            return self._writers[key]
+        if len(self._writers) >= _MAX_OPEN_WRITERS:
+            _, oldest = self._writers.popitem(last=False)
+            oldest.close()  # Reopened in append mode if that day comes back
+        path = self._path(provider, day)
+        if self.compression == 'zstd':
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'ab'), closefd=True)
+        else:
+            stream = gzip.open(path, 'ab', compresslevel=6)
+        self._writers[key] = stream
+        return stream
+
+    def record(self, provider: str, endpoint: str, request: Any, response: Any) -> None:
+        if not any(endpoint.startswith(prefix) for prefix in ARCHIVED_ENDPOINTS.get(provider, ())):
+            return
+        fetched_at = datetime.now(timezone.utc)
+        days = data_days(request)
+        day = days[0] if days else fetched_at.date()
+        line = json.dumps({
+            'fetched_at': fetched_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'provider': provider,
+            'endpoint': endpoint,
+            'request': request,
+            'response': response,
+        }, separators=(',', ':'), ensure_ascii=False)
+        try:
+            with self._lock:
+                self._writer(provider, day.isoformat()).write(line.encode('utf-8') + b'\n')
+        except Exception as e:
+            # Archiving is best effort: never fail a fetch because of it
+            logger.warning(f"Could not archive {provider} {endpoint} response: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            for stream in self._writers.values():
+                try:
+                    stream.close()
+                except Exception as e:
+                    logger.warning(f"Could not close raw archive stream: {e}")
+            self._writers.clear()
+
+def _open_lines(path: str) -> Iterator[str]:
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        with open(path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            yield from io.TextIOWrapper(reader, encoding='utf-8')
+    else:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            yield from f
+
+def _record_days(record: Dict) -> Optional[Tuple[date, date]]:
+    days = data_days(record.get('request'))
+    if days is None:
+        fetched = _parse_day(record.get('fetched_at', ''))
+        days = (fetched, fetched) if fetched else None
+    return days
+
+def iter_records(root: str, provider: str, start: date, end: date) -> Iterator[Dict]:
+    """
+    Yields archived records of one provider whose data overlaps start..end (inclusive), in day order.
+
+    A ranged request (Solarman) is filed under its first day, so directories up to
+    SOLARMAN_HISTORICAL_MAX_DAYS before start are read too; such a record is yielded whole, with the
+    days of its range that fall outside start..end.
+    """
+    provider_dir = os.path.join(root, provider)
+    if not os.path.isdir(provider_dir):
+        return
+    lookback = timedelta(days=max(1, int(settings.SOLARMAN_HISTORICAL_MAX_DAYS)) - 1) if provider == 'solarman' else timedelta(0)
+    for day in sorted(os.listdir(provider_dir)):
+        day_date = _parse_day(day)
+        if day_date is None or not start - lookback <= day_date <= end:
+            continue
+        day_dir = os.path.join(provider_dir, day)
+        for name in sorted(os.listdir(day_dir)):
+            path = os.path.join(day_dir, name)
+            try:
+                for line in _open_lines(path):
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    days = _record_days(record)
+                    if days is None or (days[0] <= end and days[1] >= start):
+                        yield record
+            except (EOFError, OSError, ValueError) as e:
+                # A worker killed mid-write leaves a truncated tail; keep what was readable
+                logger.warning(f"Stopped reading {path} early: {e}")
+
+_raw_archive: Optional[RawArchive] = None
+_raw_archive_lock = threading.Lock()
+
+def get_raw_archive() -> Optional[RawArchive]:
+    """Returns the process-wide archive, or None when RAW_ARCHIVE_DIR is not set."""
+    global _raw_archive
+    if not settings.RAW_ARCHIVE_DIR:
+        return None
+    with _raw_archive_lock:
+        if _raw_archive is None:
+            _raw_archive = RawArchive(settings.RAW_ARCHIVE_DIR, settings.RAW_ARCHIVE_COMPRESSION)
+            atexit.register(_raw_archive.close)
+        return _raw_archive
+
+def archive_response(provider: str, endpoint: str, request: Any, response: Any) -> None:
+    archive = get_raw_archive()
+    if archive is not None:
+        archive.record(provider, endpoint, request, response)
@@ -4,17 +4,97 @@ import logging
 import hashlib
 import time
 import requests
+from functools import partial
+from urllib.parse import parse_qsl
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from datetime import datetime, timedelta
 from config.settings import settings
 from pytz import timezone
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from backend.services.providers.errors import ProviderDayError, ProviderFetchError
+from backend.services.providers.rate_limiter import get_rate_limiter, ProviderThrottled
+from backend.services.providers.token_cache import get_token_cache, is_auth_error
+from backend.services.providers.http_session import create_session, request_timeout
+from backend.services.providers.raw_archive import archive_response
+from backend.services.etl.telemetry import record_retry
+
+# Title -> column rules, checked in order; the first substring match decides the column. Line
+# voltages ("grid voltage AB") come before phase voltages, whose "grid voltage A" they contain.
+TITLE_RULES = [
+    (("PV1 input voltage", "PV1 voltage", "String 1 voltage", "DC voltage 1"), "pv01_voltage"),
+    (("PV2 input voltage", "PV2 voltage", "String 2 voltage", "DC voltage 2"), "pv02_voltage"),
+    (("PV3 input voltage", "PV3 voltage", "String 3 voltage", "DC voltage 3"), "pv03_voltage"),
+    (("PV1 Input current", "String 1 current", "DC current 1"), "pv01_current"),
+    (("PV2 Input current", "String 2 current", "DC current 2"), "pv02_current"),
+    (("PV3 Input current", "String 3 current", "DC current 3"), "pv03_current"),
+    (("R phase grid current", "grid current A"), "r_current"),
+    (("S phase grid current", "grid current B"), "s_current"),
+    (("T phase grid current", "grid current C"), "t_current"),
+    (("Grid line voltage RS", "grid voltage AB"), "rs_voltage"),
+    (("Grid line voltage ST", "grid voltage BC"), "st_voltage"),
+    (("Grid line voltage TR", "grid voltage AC"), "tr_voltage"),
+    (("R phase grid voltage", "grid voltage A"), "r_voltage"),
+    (("S phase grid voltage", "grid voltage B"), "s_voltage"),
+    (("T phase grid voltage", "grid voltage C"), "t_voltage"),
+    (("Grid frequency",), "frequency"),
+    (("Grid connected power", "output power", "PV power generation today (kWh)"), "total_power"),
+    (("output reactive power", "total reactive energy"), "reactive_power"),
+    (("CUF", "cuf"), "cuf"),
+    (("Inverter operation mode", "running state", "Inverter status"), "state"),
+    (("inverter efficiency",), "pr"),
+    (("today energy", "energy today"), "energy_today"),
+    (("fault information 1",), ("FAULT_1", "medium")),
+    (("fault information 2",), ("FAULT_2", "medium")),
+    (("fault information 3",), ("FAULT_3", "high")),
+    (("fault information 4",), ("FAULT_4", "high")),
+]
+
+# ERR_NO_RECORD: the device stored nothing that day, an empty day rather than a failure
+NO_RECORD_ERR = 12
+
+ROW_DEFAULTS = {f"pv{i:02d}_{kind}": 0 for i in range(1, 13) for kind in ("voltage", "current")}
+ROW_DEFAULTS.update({
+    "r_voltage": 0, "s_voltage": 0, "t_voltage": 0,
+    "r_current": 0, "s_current": 0, "t_current": 0,
+    "rs_voltage": 0, "st_voltage": 0, "tr_voltage": 0,
+    "frequency": 0, "total_power": 0, "reactive_power": 0,
+    "cuf": 0, "pr": 0, "state": "unknown",
+})
+
+# (devcode, header titles) -> resolved column positions; headers only vary by device model
+_column_mappings = {}
+
+def column_mapping(devcode, titles):
+    """Resolves a queryDeviceDataOneDay header to (float columns, state columns, fault columns) by position."""
+    header = tuple(title["title"] for title in titles)
+    key = (devcode, header)
+    mapping = _column_mappings.get(key)
+    if mapping is None:
+        floats, states, faults = [], [], []
+        for idx, title_text in enumerate(header):
+            target = next((t for keys, t in TITLE_RULES if any(k in title_text for k in keys)), None)
+            if target is None:
+                continue
+            if isinstance(target, tuple):
+                faults.append((idx,) + target)
+            elif target == "state":
+                states.append(idx)
+            else:
+                floats.append((idx, target))
+        mapping = (floats, states, faults)
+        _column_mappings[key] = mapping
+    return mapping
 
 class ShinemonitorAPI:
-    def __init__(self, company_key=None, base_url="http://api.shinemonitor.com/public/"):
+    def __init__(self, company_key=None, base_url="http://api.shinemonitor.com/public/", session=None):
         self.company_key = company_key if company_key is not None else settings.COMPANY_KEY
         self.base_url = base_url
         self.secret = None
         self.token = None
+        self.token_expiry = None
+        self._login = None  # (username, password) of the current session, for re-authentication
+        self.rate_limiter = get_rate_limiter("shinemonitor", self.company_key)  # Quota is per company key
+        self.session = session or create_session()  # Keep-alive connections reused across calls
         self.logger = logging.getLogger(__name__)
         if not self.logger.handlers:
             logging.basicConfig(
@@ -26,6 +106,9 @@ class ShinemonitorAPI:
                 ]
             )
 
+    def close(self):
+        self.session.close()
+
     def calculate_sign(self, salt, secret_or_pwd, additional_params, is_auth=False):
         if is_auth:
             pwd_hash = hashlib.sha1(secret_or_pwd.encode('utf-8')).hexdigest()
@@ -34,82 +117,163 @@ class ShinemonitorAPI:
             data = f"{salt}{secret_or_pwd}{additional_params}"
         return hashlib.sha1(data.encode('utf-8')).hexdigest()
 
-    def authenticate(self, username, password):
-        try:
-            salt = str(int(time.time() * 1000))
-            action_params = f"&action=auth&usr={username}&company-key={self.company_key}"
-            sign = self.calculate_sign(salt, password, action_params, is_auth=True)
-            url = f"{self.base_url}?sign={sign}&salt={salt}{action_params}"
+    def _auth_url(self, username, password):
+        salt = str(int(time.time() * 1000))
+        action_params = f"&action=auth&usr={username}&company-key={self.company_key}"
+        sign = self.calculate_sign(salt, password, action_params, is_auth=True)
+        return f"{self.base_url}?sign={sign}&salt={salt}{action_params}"
 
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+    def _token_account(self, username):
+        return f"{self.company_key}:{username}"
 
-            if data.get("err") != 0:
-                self.logger.error(f"Authentication failed: {data.get('desc')}")
-                self.secret = None
-                self.token = None
-                return None, None
-
-            self.secret = data["dat"]["secret"]
-            self.token = data["dat"]["token"]
-            self.logger.info("Authentication successful")
+    def _auth_expired(self):
+        if not self.secret or not self.token:
+            return True
+        return self.token_expiry is not None and time.time() >= self.token_expiry
+
+    def _load_cached_auth(self, username):
+        cached = get_token_cache().get("shinemonitor", self._token_account(username))
+        if not cached:
+            return False
+        self.secret = cached["secret"]
+        self.token = cached["token"]
+        self.token_expiry = cached["expires_at"] - int(settings.TOKEN_REFRESH_MARGIN)
+        self.logger.info("Using cached Shinemonitor session")
+        return True
+
+    def _invalidate_auth(self, username):
+        self.secret = None
+        self.token = None
+        self.token_expiry = None
+        get_token_cache().invalidate("shinemonitor", self._token_account(username))
+
+    def _store_auth(self, data, username=None):
+        if data.get("err") != 0:
+            self.logger.error(f"Authentication failed: {data.get('desc')}")
+            self.secret = None
+            self.token = None
+            return None, None
+
+        self.secret = data["dat"]["secret"]
+        self.token = data["dat"]["token"]
+        # 'expire' is the session lifetime in seconds
+        expires_at = time.time() + int(data["dat"].get("expire") or settings.SHINEMONITOR_TOKEN_TTL)
+        self.token_expiry = expires_at - int(settings.TOKEN_REFRESH_MARGIN)
+        if username is not None:
+            get_token_cache().set("shinemonitor", self._token_account(username), {"secret": self.secret, "token": self.token}, expires_at)
+        self.logger.info("Authentication successful")
+        return self.secret, self.token
+
+    def _signed_url(self, action_params):
+        salt = str(int(time.time() * 1000))
+        sign = self.calculate_sign(salt, self.secret, f"{self.token}{action_params}")
+        return f"{self.base_url}?sign={sign}&salt={salt}&token={self.token}{action_params}"
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type(ProviderThrottled),
+        before_sleep=record_retry,
+        reraise=True
+    )
+    def _get(self, build_url, timeout=10):
+        """GETs build_url(); the URL is built per attempt, so every retry carries a fresh salt and sign."""
+        self.rate_limiter.acquire()
+        response = self.session.get(build_url(), timeout=request_timeout(timeout))
+        self.rate_limiter.check(response.status_code, response.headers)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("err") != 0:
+            self.rate_limiter.check(message=data.get("desc"))
+        self.rate_limiter.success()
+        return data
+
+    def _query(self, action_params, timeout=10):
+        """Signed API call; re-authenticates and retries once if the session token was rejected."""
+        data = self._get(partial(self._signed_url, action_params), timeout=timeout)
+        if data.get("err") != 0 and self._login and is_auth_error("shinemonitor", code=data.get("err"), message=data.get("desc")):
+            self.logger.warning(f"Session token rejected ({data.get('desc')}); re-authenticating")
+            username, password = self._login
+            self._invalidate_auth(username)
+            self.authenticate(username, password)
+            if self.secret and self.token:
+                data = self._get(partial(self._signed_url, action_params), timeout=timeout)
+        self._archive(action_params, data)
+        return data
+
+    def _archive(self, action_params, data):
+        # Only the action parameters: the signed URL carries the session token
+        params = dict(parse_qsl(action_params.lstrip("&")))
+        archive_response("shinemonitor", params.get("action", ""), params, data)
+
+    def authenticate(self, username, password):
+        self._login = (username, password)
+        if self._load_cached_auth(username):
             return self.secret, self.token
+        try:
+            return self._store_auth(self._get(partial(self._auth_url, username, password), timeout=10), username)
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Error during authentication: {e}")
             self.secret = None
             self.token = None
             return None, None
 
+    def _parse_plants(self, dat):
+        return [
+            {
+                "plant_id": p["pid"],
+                "plant_name": p.get("name"),
+                "capacity": float(p.get("nominalPower", 0)),
+                "total_energy": float(p.get("energyYearEstimate", 0)),
+                "install_date": p.get("install")
+            }
+            for p in dat["plant"]
+        ]
+
+    def _parse_devices(self, devices, install_date):
+        return [
+            {
+                "sn": d["sn"],
+                "first_install_date": install_date,
+                "inverter_model": "Unknown",
+                "panel_model": "Unknown",
+                "pn": d["pn"],
+                "devcode": d["devcode"],
+                "devaddr": d["devaddr"],
+                "pv_count": 3,
+                "string_count": 0
+            }
+            for d in devices
+        ]
+
     def fetch_plant_list(self, user_id, username, password):
-        if not self.secret or not self.token:
+        if self._auth_expired():
             self.authenticate(username, password)
         if not self.secret or not self.token:
             return []
 
         try:
-            salt = str(int(time.time() * 1000))
             action_params = "&action=queryPlants&pagesize=50"
-            sign = self.calculate_sign(salt, self.secret, f"{self.token}{action_params}")
-            url = f"{self.base_url}?sign={sign}&salt={salt}&token={self.token}{action_params}"
-
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = self._query(action_params, timeout=10)
 
             if data.get("err") != 0:
                 self.logger.error(f"Error fetching plant list for user {user_id}: {data.get('desc')}")
                 return []
 
-            return [
-                {
-                    "plant_id": p["pid"],
-                    "plant_name": p.get("name"),
-                    "capacity": float(p.get("nominalPower", 0)),
-                    "total_energy": float(p.get("energyYearEstimate", 0)),
-                    "install_date": p.get("install")
-                }
-                for p in data["dat"]["plant"]
-            ]
+            return self._parse_plants(data["dat"])
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Error fetching plant list for user {user_id}: {e}")
             return []
 
     def fetch_plant_info(self, user_id, username, password, plant_id):
-        if not self.secret or not self.token:
+        if self._auth_expired():
             self.authenticate(username, password)
         if not self.secret or not self.token:
             return None
 
         try:
-            salt = str(int(time.time() * 1000))
             action_params = f"&action=queryPlantInfo&plantid={plant_id}"
-            sign = self.calculate_sign(salt, self.secret, f"{self.token}{action_params}")
-            url = f"{self.base_url}?sign={sign}&salt={salt}&token={self.token}{action_params}"
-
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = self._query(action_params, timeout=10)
 
             if data.get("err") != 0:
                 self.logger.error(f"Error fetching plant info for plant {plant_id}: {data.get('desc')}")
@@ -121,20 +285,14 @@ class ShinemonitorAPI:
             return None
 
     def fetch_plant_devices(self, user_id, username, password, plant_id):
-        if not self.secret or not self.token:
+        if self._auth_expired():
             self.authenticate(username, password)
         if not self.secret or not self.token:
             return []
 
         try:
-            salt = str(int(time.time() * 1000))
             action_params = f"&action=queryDevices&plantid={plant_id}&pagesize=50"
-            sign = self.calculate_sign(salt, self.secret, f"{self.token}{action_params}")
-            url = f"{self.base_url}?sign={sign}&salt={salt}&token={self.token}{action_params}"
-
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = self._query(action_params, timeout=10)
 
             if data.get("err") != 0:
                 self.logger.error(f"Error fetching devices for plant {plant_id}, user {user_id}: {data.get('desc')}")
@@ -144,289 +302,115 @@ class ShinemonitorAPI:
             plant_info = self.fetch_plant_info(user_id, username, password, plant_id)
             install_date = plant_info.get("install_date") if plant_info else None
 
-            return [
-                {
-                    "sn": d["sn"],
-                    "first_install_date": install_date,
-                    "inverter_model": "Unknown",
-                    "panel_model": "Unknown",
-                    "pn": d["pn"],
-                    "devcode": d["devcode"],
-                    "devaddr": d["devaddr"],
-                    "pv_count": 3,
-                    "string_count": 0
-                }
-                for d in devices
-            ]
+            return self._parse_devices(devices, install_date)
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Error fetching devices for plant {plant_id}, user {user_id}: {e}")
             return []
 
+    def _day_action_params(self, device, date_str):
+        return f"&action=queryDeviceDataOneDay&i18n=en_US&pn={device['pn']}&devcode={device['devcode']}&devaddr={device['devaddr']}&sn={device['sn']}&startDate={date_str}&endDate={date_str}"
+
+    def _current_action_params(self, device, date_str, since=None):
+        action_params = f"&action=queryDeviceDataOneDay&i18n=en_US&pn={device['pn']}&devcode={device['devcode']}&devaddr={device['devaddr']}&sn={device['sn']}&date={date_str}"
+        if since:
+            action_params += f"&since={since}"
+        return action_params
+
+    def _parse_historical_rows(self, dat, device):
+        return self._map_rows(dat, device)
+
+    def _parse_current_rows(self, dat, device):
+        # Rows without a today-energy column fall back to the response-level figure
+        return self._map_rows(dat, device, energy_today=float(dat.get("energy_today", 0)))
+
+    def _map_rows(self, dat, device, **defaults):
+        floats, states, faults_at = column_mapping(device.get("devcode"), dat["title"])
+        base = dict(ROW_DEFAULTS, **defaults)
+        device_sn = device["sn"]
+        rows = []
+        for row in dat["row"]:
+            fields = row["field"]
+            entry = dict(base)
+            entry["device_id"] = device_sn
+            entry["timestamp"] = fields[1]
+            for idx, column in floats:
+                value = fields[idx]
+                if value:
+                    entry[column] = float(value)
+            for idx in states:
+                if fields[idx]:
+                    entry["state"] = fields[idx]
+            entry["faults"] = [
+                {"code": code, "description": fields[idx], "severity": severity}
+                for idx, code, severity in faults_at if fields[idx]
+            ]
+            rows.append(entry)
+        return rows
+
     def fetch_historical_data(self, user_id, username, password, device, start_date, end_date):
-        if not self.secret or not self.token:
+        return [row for day in self.iter_historical_data(user_id, username, password, device, start_date, end_date) for row in day]
+
+    def _day_rows(self, data, device, date_str):
+        """Parsed rows of one queryDeviceDataOneDay response; None when the day failed (logged)."""
+        if data.get("err") == NO_RECORD_ERR:
+            return []
+        if data.get("err") != 0:
+            self.logger.error(f"Error fetching historical data for device {device['sn']} on {date_str}: {data.get('desc')}")
+            return None
+        daily_data = data["dat"]["row"]
+        self.logger.info(f"Received {len(daily_data)} data rows for device {device['sn']} on {date_str}")
+        return self._parse_historical_rows(data["dat"], device) if daily_data else []
+
+    def iter_historical_data(self, user_id, username, password, device, start_date, end_date):
+        """
+        Yields the parsed rows of one day at a time, as each day arrives.
+        Raises ProviderDayError at the first day that fails (no session, API error, request error).
+        """
+        if self._auth_expired():
             self.authenticate(username, password)
         if not self.secret or not self.token:
+            raise ProviderDayError("shinemonitor", device.get("sn"), start_date, "not authenticated")
+
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+        current_date = start
+
+        while current_date <= end:
+            date_str = current_date.strftime('%Y-%m-%d')
+            try:
+                data = self._query(self._day_action_params(device, date_str), timeout=30)
+            except (requests.exceptions.RequestException, ProviderThrottled) as e:
+                self.logger.error(f"Error fetching historical data for device {device['sn']}: {e}")
+                raise ProviderDayError("shinemonitor", device.get("sn"), date_str, str(e)) from e
+            rows = self._day_rows(data, device, date_str)
+            if rows is None:
+                raise ProviderDayError("shinemonitor", device.get("sn"), date_str, f"err {data.get('err')}: {data.get('desc')}")
+            if rows:
+                yield rows
+            current_date += timedelta(days=1)
+
+    def _current_rows(self, data, device):
+        """Parsed rows of a current-day response; raises ProviderFetchError when the API reported an error."""
+        if data.get("err") == NO_RECORD_ERR:
             return []
-
-        try:
-            start = datetime.strptime(start_date, "%Y-%m-%d")
-            end = datetime.strptime(end_date, "%Y-%m-%d")
-            all_data = []
-            current_date = start
-
-            while current_date <= end:
-                date_str = current_date.strftime('%Y-%m-%d')
-                salt = str(int(time.time() * 1000))
-                action_params = f"&action=queryDeviceDataOneDay&i18n=en_US&pn={device['pn']}&devcode={device['devcode']}&devaddr={device['devaddr']}&sn={device['sn']}&startDate={date_str}&endDate={date_str}"
-                sign = self.calculate_sign(salt, self.secret, f"{self.token}{action_params}")
-                url = f"{self.base_url}?sign={sign}&salt={salt}&token={self.token}{action_params}"
-
-                response = requests.get(url, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-
-                if data.get("err") != 0:
-                    self.logger.error(f"Error fetching historical data for device {device['sn']} on {date_str}: {data.get('desc')}")
-                else:
-                    daily_data = data["dat"]["row"]
-                    self.logger.info(f"Received {len(daily_data)} data rows for device {device['sn']} on {date_str}")
-                    if daily_data:
-                        for row in daily_data:
-                            fields = row["field"]
-                            entry = {"device_id": device["sn"], "timestamp": fields[1]}
-                            faults = []
-                            for idx, title in enumerate(data["dat"]["title"]):
-                                value = fields[idx]
-                                if not value or value == "":
-                                    continue
-                                title_text = title["title"]
-
-                                if any(k in title_text for k in ["PV1 input voltage", "PV1 voltage", "String 1 voltage", "DC voltage 1"]):
-                                    entry["pv01_voltage"] = float(value)
-                                elif any(k in title_text for k in ["PV2 input voltage", "PV2 voltage", "String 2 voltage", "DC voltage 2"]):
-                                    entry["pv02_voltage"] = float(value)
-                                elif any(k in title_text for k in ["PV3 input voltage", "PV3 voltage", "String 3 voltage", "DC voltage 3"]):
-                                    entry["pv03_voltage"] = float(value)
-                                elif any(k in title_text for k in ["PV1 Input current", "String 1 current", "DC current 1"]):
-                                    entry["pv01_current"] = float(value)
-                                elif any(k in title_text for k in ["PV2 Input current", "String 2 current", "DC current 2"]):
-                                    entry["pv02_current"] = float(value)
-                                elif any(k in title_text for k in ["PV3 Input current", "String 3 current", "DC current 3"]):
-                                    entry["pv03_current"] = float(value)
-                                elif "R phase grid current" in title_text or "grid current A" in title_text:
-                                    entry["r_current"] = float(value)
-                                elif "S phase grid current" in title_text or "grid current B" in title_text:
-                                    entry["s_current"] = float(value)
-                                elif "T phase grid current" in title_text or "grid current C" in title_text:
-                                    entry["t_current"] = float(value)
-                                elif "Grid line voltage RS" in title_text or "grid voltage AB" in title_text:
-                                    entry["rs_voltage"] = float(value)
-                                elif "Grid line voltage ST" in title_text or "grid voltage BC" in title_text:
-                                    entry["st_voltage"] = float(value)
-                                elif "Grid line voltage TR" in title_text or "grid voltage AC" in title_text:
-                                    entry["tr_voltage"] = float(value)
-                                elif "R phase grid voltage" in title_text or "grid voltage A" in title_text:
-                                    entry["r_voltage"] = float(value)
-                                elif "S phase grid voltage" in title_text or "grid voltage B" in title_text:
-                                    entry["s_voltage"] = float(value)
-                                elif "T phase grid voltage" in title_text or "grid voltage C" in title_text:
-                                    entry["t_voltage"] = float(value)
-                                elif "Grid frequency" in title_text:
-                                    entry["frequency"] = float(value)
-                                elif any(k in title_text for k in ["Grid connected power", "output power", "PV power generation today (kWh)"]):
-                                    entry["total_power"] = float(value)
-                                elif "output reactive power" in title_text or "total reactive energy" in title_text:
-                                    entry["reactive_power"] = float(value)
-                                elif "CUF" in title_text or "cuf" in title_text:
-                                    entry["cuf"] = float(value)
-                                elif "Inverter operation mode" in title_text or "running state" in title_text or "Inverter status" in title_text:
-                                    entry["state"] = value
-                                elif "inverter efficiency" in title_text:
-                                    entry["pr"] = float(value)
-                                elif "today energy" in title_text:
-                                    entry["energy_today"] = float(value)
-                                elif "fault information 1" in title_text and value:
-                                    faults.append({"code": "FAULT_1", "description": value, "severity": "medium"})
-                                elif "fault information 2" in title_text and value:
-                                    faults.append({"code": "FAULT_2", "description": value, "severity": "medium"})
-                                elif "fault information 3" in title_text and value:
-                                    faults.append({"code": "FAULT_3", "description": value, "severity": "high"})
-                                elif "fault information 4" in title_text and value:
-                                    faults.append({"code": "FAULT_4", "description": value, "severity": "high"})
-
-                            entry.update({
-                                "pv01_voltage": entry.get("pv01_voltage", 0),
-                                "pv01_current": entry.get("pv01_current", 0),
-                                "pv02_voltage": entry.get("pv02_voltage", 0),
-                                "pv02_current": entry.get("pv02_current", 0),
-                                "pv03_voltage": entry.get("pv03_voltage", 0),
-                                "pv03_current": entry.get("pv03_current", 0),
-                                "pv04_voltage": entry.get("pv04_voltage", 0),
-                                "pv04_current": entry.get("pv04_current", 0),
-                                "pv05_voltage": entry.get("pv05_voltage", 0),
-                                "pv05_current": entry.get("pv05_current", 0),
-                                "pv06_voltage": entry.get("pv06_voltage", 0),
-                                "pv06_current": entry.get("pv06_current", 0),
-                                "pv07_voltage": entry.get("pv07_voltage", 0),
-                                "pv07_current": entry.get("pv07_current", 0),
-                                "pv08_voltage": entry.get("pv08_voltage", 0),
-                                "pv08_current": entry.get("pv08_current", 0),
-                                "pv09_voltage": entry.get("pv09_voltage", 0),
-                                "pv09_current": entry.get("pv09_current", 0),
-                                "pv10_voltage": entry.get("pv10_voltage", 0),
-                                "pv10_current": entry.get("pv10_current", 0),
-                                "pv11_voltage": entry.get("pv11_voltage", 0),
-                                "pv11_current": entry.get("pv11_current", 0),
-                                "pv12_voltage": entry.get("pv12_voltage", 0),
-                                "pv12_current": entry.get("pv12_current", 0),
-                                "r_current": entry.get("r_current", 0),
-                                "s_current": entry.get("s_current", 0),
-                                "t_current": entry.get("t_current", 0),
-                                "r_voltage": entry.get("r_voltage", 0),
-                                "s_voltage": entry.get("s_voltage", 0),
-                                "t_voltage": entry.get("t_voltage", 0),
-                                "rs_voltage": entry.get("rs_voltage", 0),
-                                "st_voltage": entry.get("st_voltage", 0),
-                                "tr_voltage": entry.get("tr_voltage", 0),
-                                "frequency": entry.get("frequency", 0),
-                                "total_power": entry.get("total_power", 0),
-                                "reactive_power": entry.get("reactive_power", 0),
-                                "cuf": entry.get("cuf", 0),
-                                "pr": entry.get("pr", 0),
-                                "state": entry.get("state", "unknown"),
-                                "faults": faults
-                            })
-                            all_data.append(entry)
-                current_date += timedelta(days=1)
-
-            return all_data
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Error fetching historical data for device {device['sn']}: {e}")
+        if data.get("err") != 0:
+            self.logger.error(f"Error fetching current data for device {device['sn']}: {data.get('desc')}")
+            raise ProviderFetchError(f"shinemonitor device {device.get('sn')}: err {data.get('err')}: {data.get('desc')}")
+        if not data["dat"]["row"]:
             return []
+        return self._parse_current_rows(data["dat"], device)
 
     def fetch_current_data(self, user_id, username, password, device, since=None):
-        if not self.secret or not self.token:
+        """Today's rows of the device; raises ProviderFetchError when they could not be fetched."""
+        if self._auth_expired():
             self.authenticate(username, password)
         if not self.secret or not self.token:
-            return []
+            raise ProviderFetchError(f"shinemonitor device {device.get('sn')}: not authenticated")
 
         try:
             date_str = datetime.utcnow().strftime("%Y-%m-%d")
-            salt = str(int(time.time() * 1000))
-            action_params = f"&action=queryDeviceDataOneDay&i18n=en_US&pn={device['pn']}&devcode={device['devcode']}&devaddr={device['devaddr']}&sn={device['sn']}&date={date_str}"
-            if since:
-                action_params += f"&since={since}"
-            sign = self.calculate_sign(salt, self.secret, f"{self.token}{action_params}")
-            url = f"{self.base_url}?sign={sign}&salt={salt}&token={self.token}{action_params}"
-
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("err") != 0:
-                self.logger.error(f"Error fetching current data for device {device['sn']}: {data.get('desc')}")
-                return []
-
-            rows = data["dat"]["row"]
-            if not rows:
-                return []
-
-            current_data = []
-            for row in rows:
-                fields = row["field"]
-                entry = {"device_id": device["sn"], "timestamp": fields[1]}
-                faults = []
-                for idx, title in enumerate(data["dat"]["title"]):
-                    value = fields[idx]
-                    if not value or value == "":
-                        continue
-                    title_text = title["title"]
-
-                    if any(k in title_text for k in ["PV1 input voltage", "PV1 voltage", "String 1 voltage", "DC voltage 1 (V)"]):
-                        entry["pv01_voltage"] = float(value)
-                    elif any(k in title_text for k in ["PV2 input voltage", "PV2 voltage", "String 2 voltage", "DC voltage 2 (V)"]):
-                        entry["pv02_voltage"] = float(value)
-                    elif any(k in title_text for k in ["PV3 input voltage", "PV3 voltage", "String 3 voltage", "DC voltage 3 (V)"]):
-                        entry["pv03_voltage"] = float(value)
-                    elif any(k in title_text for k in ["PV1 Input current", "String 1 current", "DC current 1 (A)"]):
-                        entry["pv01_current"] = float(value)
-                    elif any(k in title_text for k in ["PV2 Input current", "String 2 current", "DC current 2 (A)"]):
-                        entry["pv02_current"] = float(value)
-                    elif any(k in title_text for k in ["PV3 Input current", "String 3 current", "DC current 3"]):
-                        entry["pv03_current"] = float(value)
-                    elif "R phase grid voltage" in title_text or "grid voltage A" in title_text:
-                        entry["r_voltage"] = float(value)
-                    elif "S phase grid voltage" in title_text or "grid voltage B" in title_text:
-                        entry["s_voltage"] = float(value)
-                    elif "T phase grid voltage" in title_text or "grid voltage C" in title_text:
-                        entry["t_voltage"] = float(value)
-                    elif "Grid frequency" in title_text:
-                        entry["frequency"] = float(value)
-                    elif any(k in title_text for k in ["Grid connected power", "output power"]):
-                        entry["total_power"] = float(value)
-                    elif "Inverter operation mode" in title_text or "running state" in title_text:
-                        entry["state"] = value
-                    elif "today energy" in title_text or "energy today" in title_text:
-                        entry["energy_today"] = float(value)
-                    elif "output reactive power" in title_text:
-                        entry["reactive_power"] = float(value)
-                    elif "inverter efficiency" in title_text:
-                        entry["pr"] = float(value)
-                    elif "fault information 1" in title_text and value:
-                        faults.append({"code": "FAULT_1", "description": value, "severity": "medium"})
-                    elif "fault information 2" in title_text and value:
-                        faults.append({"code": "FAULT_2", "description": value, "severity": "medium"})
-                    elif "fault information 3" in title_text and value:
-                        faults.append({"code": "FAULT_3", "description": value, "severity": "high"})
-                    elif "fault information 4" in title_text and value:
-                        faults.append({"code": "FAULT_4", "description": value, "severity": "high"})
-
-                entry.update({
-                    "pv01_voltage": entry.get("pv01_voltage", 0),
-                    "pv01_current": entry.get("pv01_current", 0),
-                    "pv02_voltage": entry.get("pv02_voltage", 0),
-                    "pv02_current": entry.get("pv02_current", 0),
-                    "pv03_voltage": entry.get("pv03_voltage", 0),
-                    "pv03_current": entry.get("pv03_current", 0),
-                    "pv04_voltage": entry.get("pv04_voltage", 0),
-                    "pv04_current": entry.get("pv04_current", 0),
-                    "pv05_voltage": entry.get("pv05_voltage", 0),
-                    "pv05_current": entry.get("pv05_current", 0),
-                    "pv06_voltage": entry.get("pv06_voltage", 0),
-                    "pv06_current": entry.get("pv06_current", 0),
-                    "pv07_voltage": entry.get("pv07_voltage", 0),
-                    "pv07_current": entry.get("pv07_current", 0),
-                    "pv08_voltage": entry.get("pv08_voltage", 0),
-                    "pv08_current": entry.get("pv08_current", 0),
-                    "pv09_voltage": entry.get("pv09_voltage", 0),
-                    "pv09_current": entry.get("pv09_current", 0),
-                    "pv10_voltage": entry.get("pv10_voltage", 0),
-                    "pv10_current": entry.get("pv10_current", 0),
-                    "pv11_voltage": entry.get("pv11_voltage", 0),
-                    "pv11_current": entry.get("pv11_current", 0),
-                    "pv12_voltage": entry.get("pv12_voltage", 0),
-                    "pv12_current": entry.get("pv12_current", 0),
-                    "r_voltage": entry.get("r_voltage", 0),
-                    "s_voltage": entry.get("s_voltage", 0),
-                    "t_voltage": entry.get("t_voltage", 0),
-                    "r_current": entry.get("r_current", 0),
-                    "s_current": entry.get("s_current", 0),
-                    "t_current": entry.get("t_current", 0),
-                    "rs_voltage": entry.get("rs_voltage", 0),
-                    "st_voltage": entry.get("st_voltage", 0),
-                    "tr_voltage": entry.get("tr_voltage", 0),
-                    "frequency": entry.get("frequency", 0),
-                    "total_power": entry.get("total_power", 0),
-                    "reactive_power": entry.get("reactive_power", 0),
-                    "energy_today": entry.get("energy_today", float(data["dat"].get("energy_today", 0))),
-                    "cuf": entry.get("cuf", 0),
-                    "pr": entry.get("pr", 0),
-                    "state": entry.get("state", "unknown"),
-                    "faults": faults
-                })
-                current_data.append(entry)
-
-            return current_data
+            data = self._query(self._current_action_params(device, date_str, since), timeout=10)
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Error fetching current data for device {device['sn']}: {e}")
-            return []
\ No newline at end of file
+            raise ProviderFetchError(f"shinemonitor device {device.get('sn')}: {e}") from e
+        return self._current_rows(data, device)
\ No newline at end of file
@@ -0,0 +1,504 @@
+"""
+Local stand-in for the Solarman, Shinemonitor and SolisCloud APIs, for load and regression testing.
+
+One ThreadingHTTPServer serves all three under path prefixes, so the ETL runs unchanged against it:
+
+    python -m backend.services.providers.simulator --port 8900 --plants 20 --devices-per-plant 50 --latency-ms 80
+    SOLARMAN_BASE_URL=http://127.0.0.1:8900/solarman
+    SHINEMONITOR_BASE_URL=http://127.0.0.1:8900/shinemonitor/
+    SOLISCLOUD_BASE_URL=http://127.0.0.1:8900/soliscloud
+
+Every account (Solarman app id + email, Shinemonitor user, SolisCloud API key) gets its own synthetic
+fleet of plants x devices. Device data is a function of (seed, serial number, time) only, so two runs with
+the same seed return byte-identical responses. Latency, HTTP 500 errors and per-account rate limits are
+injected on top; throttling is reported the way each vendor does it (JSON error body) or as HTTP 429
+with Retry-After. Signatures are not verified. GET /_stats returns request, error and throttle counts.
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ('solarman', 'shinemonitor', 'soliscloud')
+
+TZ_OFFSET = 5.5 * 3600  # Fleet local time (IST), as the real accounts
+SUNRISE, SUNSET = 6.0, 18.5  # Local hours
+
+# Vendor-style throttle responses; each carries a marker rate_limiter.is_throttled recognises
+THROTTLE_BODIES = {
+    'solarman': {"success": False, "code": "2101019", "msg": "request too frequently"},
+    'shinemonitor': {"err": 260, "desc": "ERR_REQUEST_TOO_FREQUENTLY"},
+    'soliscloud': {"success": False, "code": "B0107", "msg": "Too many requests, rate limit exceeded"},
+}
+
+SHINEMONITOR_TITLES = (
+    ["Id", "Timestamp"]
+    + [f"PV{i} input voltage" for i in range(1, 4)]
+    + [f"PV{i} Input current" for i in range(1, 4)]
+    + ["R phase grid voltage", "S phase grid voltage", "T phase grid voltage",
+       "R phase grid current", "S phase grid current", "T phase grid current",
+       "Grid frequency", "Grid connected power", "today energy", "Inverter operation mode"]
+)
+
+class SimulatedDevice:
+    __slots__ = ('sn', 'device_id', 'plant_id', 'capacity_kw', 'pv_count', 'phase', 'install_date')
+
+    def __init__(self, sn: str, device_id: str, plant_id: str, capacity_kw: float, pv_count: int, phase: float, install_date: str):
+        self.sn = sn
+        self.device_id = device_id
+        self.plant_id = plant_id
+        self.capacity_kw = capacity_kw
+        self.pv_count = pv_count
+        self.phase = phase
+        self.install_date = install_date
+
+class Fleet:
+    """Plants and devices of one simulated account, derived from (seed, provider, account)."""
+
+    def __init__(self, seed: int, provider: str, account: str, plants: int, devices_per_plant: int):
+        rng = random.Random(f"{seed}:{provider}:{account}")
+        prefix = f"{provider[:2].upper()}{zlib.crc32(account.encode('utf-8')):08X}"
+        self.plants: List[Dict] = []
+        self.devices: Dict[str, List[SimulatedDevice]] = {}
+        self.by_sn: Dict[str, SimulatedDevice] = {}
+        for p in range(plants):
+            plant_id = f"{prefix}P{p:04d}"
+            install = date(2020, 1, 1) + timedelta(days=rng.randrange(1200))
+            devices = []
+            for d in range(devices_per_plant):
+                capacity_kw = round(rng.uniform(5, 60), 1)
+                device = SimulatedDevice(
+                    sn=f"{prefix}{p:04d}{d:04d}",
+                    device_id=str(rng.randrange(10 ** 9, 10 ** 10)),
+                    plant_id=plant_id,
+                    capacity_kw=capacity_kw,
+                    pv_count=min(16, max(2, math.ceil(capacity_kw / 6))),  # ~6 kW per string keeps currents under 20 A
+                    phase=rng.uniform(0, 2 * math.pi),
+                    install_date=install.isoformat(),
+                )
+                devices.append(device)
+                self.by_sn[device.sn] = device
+            self.devices[plant_id] = devices
+            self.plants.append({
+                'plant_id': plant_id,
+                'name': f"Simulated plant {p + 1}",
+                'capacity': round(sum(d.capacity_kw for d in devices), 1),
+                'install_date': install.isoformat(),
+            })
+
+    def all_devices(self) -> List[SimulatedDevice]:
+        return [device for plant in self.plants for device in self.devices[plant['plant_id']]]
+
+class FleetModel:
+    """Fleets per account and their synthetic samples; usable without a server (the benchmarks build inputs from it)."""
+
+    def __init__(self, plants: int = 2, devices_per_plant: int = 10, seed: int = 42, interval_minutes: int = 5):
+        self.plants = plants
+        self.devices_per_plant = devices_per_plant
+        self.seed = seed
+        self.interval = max(1, int(interval_minutes)) * 60
+        self._fleets: Dict[Tuple[str, str], Fleet] = {}
+        self._lock = threading.Lock()
+
+    def fleet(self, provider: str, account: str) -> Fleet:
+        key = (provider, account)
+        with self._lock:
+            fleet = self._fleets.get(key)
+            if fleet is None:
+                fleet = Fleet(self.seed, provider, account, self.plants, self.devices_per_plant)
+                self._fleets[key] = fleet
+            return fleet
+
+    def day_samples(self, device: SimulatedDevice, day: date, until: Optional[float] = None) -> List[Dict]:
+        """Samples of one UTC day every interval, up to `until` (epoch seconds) if given."""
+        start = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+        end = start + 86400
+        if until is not None:
+            end = min(end, int(until) + 1)
+        cloud = random.Random(f"{self.seed}:{device.sn}:{day.isoformat()}").uniform(0.55, 1.0)
+        energy = 0.0
+        samples = []
+        for ts in range(start, end, self.interval):
+            local_hour = ((ts + TZ_OFFSET) % 86400) / 3600
+            sun = math.sin(math.pi * (local_hour - SUNRISE) / (SUNSET - SUNRISE)) if SUNRISE < local_hour < SUNSET else 0.0
+            power = device.capacity_kw * sun * cloud * (1 + 0.04 * math.sin(ts / 613 + device.phase))
+            energy += power * self.interval / 3600
+            samples.append(self._sample(device, ts, power, energy, sun))
+        return samples
+
+    def _sample(self, device: SimulatedDevice, ts: int, power: float, energy: float, sun: float) -> Dict:
+        wobble = math.sin(ts / 97 + device.phase)
+        producing = power > 0
+        dc_voltage = 560 + 80 * sun + 5 * wobble if producing else 0.0
+        dc_current = power * 1000 / 0.97 / device.pv_count / dc_voltage if producing else 0.0
+        ac_voltage = 230 + 4 * wobble
+        ac_current = power * 1000 / (3 * ac_voltage)
+        return {
+            'ts': ts,
+            'power': round(power, 3),
+            'energy': round(energy, 3),
+            'voltage': [round(ac_voltage + k, 1) for k in (0.0, 0.8, -0.6)],
+            'current': [round(ac_current * k, 2) for k in (1.0, 0.99, 1.01)],
+            'frequency': round(50 + 0.04 * wobble, 2),
+            'temperature': round(28 + 24 * sun, 1),
+            'pv': [(round(dc_voltage + 3 * k, 1), round(dc_current, 2)) for k in range(device.pv_count)],
+            # The schema's state vocabulary rather than vendor codes, so rows pass its CHECK constraint
+            'state': 'online' if producing else 'offline',
+        }
+
+    def latest_sample(self, device: SimulatedDevice) -> Dict:
+        now = time.time()
+        today = datetime.fromtimestamp(now, tz=timezone.utc).date()
+        return self.day_samples(device, today, until=now)[-1]
+
+# Per-vendor renderings of one sample
+
+def solarman_data_list(sample: Dict) -> List[Dict]:
+    values = [("TPG", sample['power']), ("Etdy_ge1", sample['energy']), ("A_Fo1", sample['frequency']),
+              ("DPi_t1", round(sample['power'] / 0.97, 3)), ("INV_ST1", sample['state'])]
+    for phase in range(3):
+        values += [(f"AV{phase + 1}", sample['voltage'][phase]), (f"AC{phase + 1}", sample['current'][phase])]
+    for i, (voltage, current) in enumerate(sample['pv'], start=1):
+        values += [(f"DV{i}", voltage), (f"DC{i}", current)]
+    return [{"key": key, "value": str(value)} for key, value in values]
+
+def shinemonitor_fields(n: int, sample: Dict) -> List[str]:
+    pv = (sample['pv'] + [(0.0, 0.0)] * 3)[:3]
+    timestamp = datetime.fromtimestamp(sample['ts'], tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    values = [str(n), timestamp] + [str(v) for v, _ in pv] + [str(c) for _, c in pv]
+    values += [str(v) for v in sample['voltage']] + [str(c) for c in sample['current']]
+    values += [str(sample['frequency']), str(sample['power']), str(sample['energy']), sample['state']]
+    return values
+
+def soliscloud_record(device: SimulatedDevice, sample: Dict) -> Dict:
+    record = {"id": device.device_id, "sn": device.sn, "dataTimestamp": str(sample['ts'] * 1000),
+              "pac": sample['power'], "eToday": sample['energy'], "fac": sample['frequency'],
+              "inverterTemperature": sample['temperature'], "state": sample['state'], "timeZone": 5.5}
+    for phase in range(3):
+        record[f"uAc{phase + 1}"] = sample['voltage'][phase]
+        record[f"iAc{phase + 1}"] = sample['current'][phase]
+    for i, (voltage, current) in enumerate(sample['pv'], start=1):
+        record[f"uPv{i}"] = voltage
+        record[f"iPv{i}"] = current
+    return record
+
+def soliscloud_list_record(device: SimulatedDevice, sample: Dict) -> Dict:
+    # inverterList keeps the vendor's numeric state: 1 (online) is what triggers an inverterDetail call
+    return {"id": device.device_id, "sn": device.sn, "stationId": device.plant_id, "model": "SIM-3P",
+            "pvCount": device.pv_count, "stringCount": device.pv_count, "installDate": device.install_date,
+            "dataTimestamp": str(sample['ts'] * 1000), "pac": sample['power'], "etoday": sample['energy'],
+            "state": 1 if sample['state'] == 'online' else 2}
+
+class ProviderSimulator(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address: Tuple[str, int], plants: int = 2, devices_per_plant: int = 10, seed: int = 42,
+                 interval_minutes: int = 5, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: float = 0.0, throttle_mode: str = 'body'):
+        super().__init__(address, SimulatorHandler)
+        self.model = FleetModel(plants, devices_per_plant, seed, interval_minutes)
+        self.latency = max(0.0, latency_ms) / 1000
+        self.jitter = max(0.0, jitter_ms) / 1000
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # Requests/sec per account; 0 = unlimited
+        self.throttle_mode = throttle_mode
+        self._rng = random.Random(seed)  # Latency and error draws; same request order, same faults
+        self._buckets: Dict[Tuple[str, str], List[float]] = {}  # (provider, account) -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {'requests': 0, 'errors': 0, 'throttled': 0}
+        self._thread: Optional[threading.Thread] = None
+
+    # Fault injection
+
+    def admit(self, provider: str, account: str) -> Tuple[Optional[str], float]:
+        """Returns (fault, delay): fault is None, 'error' or 'throttle'; delay is the latency to add."""
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats[f"{provider}_requests"] = self.stats.get(f"{provider}_requests", 0) + 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.rate_limit > 0:
+                now = time.monotonic()
+                capacity = max(1.0, self.rate_limit)
+                tokens, updated_at = self._buckets.get((provider, account), [capacity, now])
+                tokens = min(capacity, tokens + (now - updated_at) * self.rate_limit)
+                if tokens < 1:
+                    self._buckets[(provider, account)] = [tokens, now]
+                    self.stats['throttled'] += 1
+                    return 'throttle', delay
+                self._buckets[(provider, account)] = [tokens - 1, now]
+            if self.error_rate > 0 and self._rng.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 'error', delay
+        return None, delay
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(1 / self.rate_limit)) if self.rate_limit > 0 else 1
+
+    # Lifecycle
+
+    def base_urls(self) -> Dict[str, str]:
+        host, port = self.server_address[:2]
+        root = f"http://{host}:{port}"
+        return {
+            'solarman': f"{root}/solarman",
+            'shinemonitor': f"{root}/shinemonitor/",
+            'soliscloud': f"{root}/soliscloud",
+        }
+
+    def start(self) -> 'ProviderSimulator':
+        self._thread = threading.Thread(target=self.serve_forever, name='provider-simulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+def start_simulator(host: str = '127.0.0.1', port: int = 0, **options) -> ProviderSimulator:
+    """Starts a simulator on a background thread (port 0 picks a free port); stop() it when done."""
+    return ProviderSimulator((host, port), **options).start()
+
+def _day_range(start: str, end: str) -> List[date]:
+    first = datetime.strptime(start[:10], '%Y-%m-%d').date()
+    last = datetime.strptime(end[:10], '%Y-%m-%d').date()
+    days = []
+    while first <= last:
+        days.append(first)
+        first += timedelta(days=1)
+    return days
+
+def _page(items: List, payload: Dict) -> Dict:
+    page_no = max(1, int(payload.get('pageNo') or 1))
+    page_size = min(100, max(1, int(payload.get('pageSize') or 100)))
+    return {'records': items[(page_no - 1) * page_size:page_no * page_size], 'total': len(items),
+            'current': page_no, 'size': page_size}
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the vendor APIs
+    disable_nagle_algorithm = True
+    server: ProviderSimulator
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _send(self, status: int, body: Dict, headers: Optional[Dict] = None) -> None:
+        payload = json.dumps(body, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        provider, _, path = url.path.lstrip('/').partition('/')
+        if provider == '_stats':
+            with self.server._lock:
+                return self._send(200, dict(self.server.stats))
+        if provider not in PROVIDERS:
+            return self._send(404, {"error": f"Unknown provider prefix: {provider}"})
+        try:
+            payload = json.loads(raw_body) if raw_body else {}
+        except ValueError:
+            return self._send(400, {"error": "Invalid JSON body"})
+        query = dict(parse_qsl(url.query))
+        try:
+            getattr(self, f"_{provider}")('/' + path, query, payload)
+        except (KeyError, TypeError, ValueError) as e:
+            self._send(400, {"error": f"Bad request: {e}"})
+
+    def _admit(self, provider: str, account: str) -> bool:
+        """Applies latency and faults; returns False if a fault response was already sent."""
+        fault, delay = self.server.admit(provider, account)
+        if delay:
+            time.sleep(delay)
+        if fault == 'error':
+            self._send(500, {"error": "Simulated upstream failure"})
+            return False
+        if fault == 'throttle':
+            if self.server.throttle_mode == 'http':
+                self._send(429, {"error": "Too Many Requests"}, {"Retry-After": str(self.server.retry_after())})
+            else:
+                self._send(200, THROTTLE_BODIES[provider])
+            return False
+        return True
+
+    # Solarman: JSON bodies, bearer token that names the account
+
+    def _solarman(self, path: str, query: Dict, payload: Dict) -> None:
+        if path == '/account/v1.0/token':
+            account = f"{query.get('appId', '')}:{payload.get('email', '')}"
+            if self._admit('solarman', account):
+                self._send(200, {"success": True, "access_token": f"sim.{account}", "expires_in": "7200",
+                                 "token_type": "bearer"})
+            return
+        token = self.headers.get("Authorization", "")
+        if not token.startswith("Bearer sim."):
+            return self._send(401, {"success": False, "msg": "auth invalid token"})
+        account = token[len("Bearer sim."):]
+        if not self._admit('solarman', account):
+            return
+        fleet = self.server.model.fleet('solarman', account)
+
+        if path == '/station/v1.0/list':
+            stations = [{"id": p['plant_id'], "name": p['name'], "installedCapacity": p['capacity'],
+                         "createdDate": p['install_date']} for p in fleet.plants]
+            return self._send(200, {"success": True, "total": len(stations), "stationList": stations})
+        if path == '/station/v1.0/device':
+            devices = [{"deviceSn": d.sn, "deviceId": d.device_id, "deviceType": "INVERTER"}
+                       for d in fleet.devices.get(str(payload.get('stationId')), [])]
+            return self._send(200, {"success": True, "total": len(devices), "deviceListItems": devices})
+        device = fleet.by_sn.get(payload.get('deviceSn', ''))
+        if device is None:
+            return self._send(200, {"success": False, "code": "2101017", "msg": "device not found"})
+        if path == '/device/v1.0/historical':
+            now = time.time()
+            param_data_list = [
+                {"collectTime": s['ts'], "dataList": solarman_data_list(s)}
+                for day in _day_range(payload['startTime'], payload['endTime'])
+                for s in self.server.model.day_samples(device, day, until=now)
+            ]
+            return self._send(200, {"success": True, "deviceSn": device.sn, "paramDataList": param_data_list})
+        if path == '/device/v1.0/currentData':
+            sample = self.server.model.latest_sample(device)
+            return self._send(200, {"success": True, "deviceSn": device.sn, "collectionTime": sample['ts'],
+                                    "dataList": solarman_data_list(sample)})
+        self._send(404, {"success": False, "msg": f"Unknown endpoint {path}"})
+
+    # Shinemonitor: GET with action parameters, token in the query string
+
+    def _shinemonitor(self, path: str, query: Dict, payload: Dict) -> None:
+        action = query.get('action', '')
+        if action == 'auth':
+            account = query.get('usr', '')
+            if self._admit('shinemonitor', account):
+                self._send(200, {"err": 0, "desc": "ERR_NONE", "dat": {
+                    "secret": f"simsecret{zlib.crc32(account.encode('utf-8'))}", "token": f"sim.{account}", "expire": 7200}})
+            return
+        token = query.get('token', '')
+        if not token.startswith('sim.'):
+            return self._send(200, {"err": 3, "desc": "ERR_NO_AUTH, token expired"})
+        account = token[len('sim.'):]
+        if not self._admit('shinemonitor', account):
+            return
+        fleet = self.server.model.fleet('shinemonitor', account)
+
+        if action == 'queryPlants':
+            plants = [{"pid": p['plant_id'], "name": p['name'], "nominalPower": p['capacity'],
+                       "energyYearEstimate": round(p['capacity'] * 1400, 1), "install": f"{p['install_date']} 00:00:00"}
+                      for p in fleet.plants]
+            return self._send(200, {"err": 0, "desc": "ERR_NONE", "dat": {"total": len(plants), "plant": plants}})
+        if action == 'queryPlantInfo':
+            plant = next((p for p in fleet.plants if p['plant_id'] == query.get('plantid')), None)
+            if plant is None:
+                return self._send(200, {"err": 12, "desc": "ERR_NOT_FOUND_PLANT"})
+            return self._send(200, {"err": 0, "desc": "ERR_NONE", "dat": {"pid": plant['plant_id'], "install": f"{plant['install_date']} 00:00:00"}})
+        if action == 'queryDevices':
+            devices = [{"sn": d.sn, "pn": f"W{d.sn}", "devcode": 512, "devaddr": 1, "pid": d.plant_id}
+                       for d in fleet.devices.get(query.get('plantid', ''), [])]
+            return self._send(200, {"err": 0, "desc": "ERR_NONE", "dat": {"total": len(devices), "device": devices}})
+        if action == 'queryDeviceDataOneDay':
+            device = fleet.by_sn.get(query.get('sn', ''))
+            if device is None:
+                return self._send(200, {"err": 12, "desc": "ERR_NOT_FOUND_DEVICE"})
+            day = query.get('date') or query['startDate']
+            samples = self.server.model.day_samples(device, _day_range(day, day)[0], until=time.time())
+            rows = [{"field": shinemonitor_fields(n, s)} for n, s in enumerate(samples, start=1)]
+            energy_today = samples[-1]['energy'] if samples else 0
+            return self._send(200, {"err": 0, "desc": "ERR_NONE", "dat": {
+                "total": len(rows), "title": [{"title": t} for t in SHINEMONITOR_TITLES], "row": rows,
+                "energy_today": energy_today}})
+        self._send(200, {"err": 1, "desc": f"ERR_UNKNOWN_ACTION {action}"})
+
+    # SolisCloud: POST /v1/api/<endpoint>, account is the API key in the Authorization header
+
+    def _soliscloud(self, path: str, query: Dict, payload: Dict) -> None:
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("API ") or ':' not in authorization:
+            return self._send(403, {"success": False, "code": "Z0001", "msg": "Unauthorized"})
+        account = authorization[4:].split(':', 1)[0]
+        if not self._admit('soliscloud', account):
+            return
+        fleet = self.server.model.fleet('soliscloud', account)
+        endpoint = path.rsplit('/', 1)[-1]
+
+        if endpoint == 'userStationList':
+            stations = [{"id": p['plant_id'], "stationName": p['name'], "capacity": p['capacity'], "timeZone": 5.5,
+                         "createDate": int(datetime.strptime(p['install_date'], '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)}
+                        for p in fleet.plants]
+            return self._ok({"page": _page(stations, payload)})
+        if endpoint == 'inverterList':
+            station_id = payload.get('stationId')
+            devices = fleet.devices.get(str(station_id), []) if station_id else fleet.all_devices()
+            page = _page(devices, payload)
+            page['records'] = [soliscloud_list_record(d, self.server.model.latest_sample(d)) for d in page['records']]
+            return self._ok({"page": page})
+        device = fleet.by_sn.get(payload.get('sn', ''))
+        if device is None or str(payload.get('id')) != device.device_id:
+            return self._send(200, {"success": False, "code": "B0001", "msg": "inverter not found"})
+        if endpoint == 'inverterDetail':
+            return self._ok(soliscloud_record(device, self.server.model.latest_sample(device)))
+        if endpoint == 'inverterDay':
+            samples = self.server.model.day_samples(device, _day_range(payload['time'], payload['time'])[0], until=time.time())
+            records = [soliscloud_record(device, s) for s in samples]
+            return self._ok({"page": _page(records, payload)})
+        self._send(404, {"success": False, "code": "404", "msg": f"Unknown endpoint {endpoint}"})
+
+    def _ok(self, data: Dict) -> None:
+        self._send(200, {"success": True, "code": "0", "msg": "success", "data": data})
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve simulated Solarman, Shinemonitor and SolisCloud APIs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--plants', type=int, default=2, help="Plants per account")
+    parser.add_argument('--devices-per-plant', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--interval-minutes', type=int, default=5, help="Sampling interval of the synthetic data")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Added to every response")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Uniform extra latency on top of --latency-ms")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Requests/sec per account (0 = unlimited)")
+    parser.add_argument('--throttle-mode', choices=['body', 'http'], default='body',
+                        help="'body': vendor JSON error (default), 'http': 429 with Retry-After")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = ProviderSimulator(
+        (args.host, args.port), plants=args.plants, devices_per_plant=args.devices_per_plant, seed=args.seed,
+        interval_minutes=args.interval_minutes, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, throttle_mode=args.throttle_mode,
+    )
+    print(f"Simulating {args.plants} x {args.devices_per_plant} devices per account; point the ETL at:")
+    for provider, url in server.base_urls().items():
+        print(f"    {provider.upper()}_BASE_URL={url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
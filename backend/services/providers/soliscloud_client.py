@@ -10,10 +10,19 @@ import base64
 from datetime import datetime, timedelta
 from logging.handlers import RotatingFileHandler
 from io import TextIOWrapper
-from typing import Any, List, Dict, Optional
+from typing import Any, Iterator, List, Dict, Optional
 from pytz import timezone
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
+from backend.config.settings import settings
+from backend.services.providers.errors import ProviderDayError, ProviderFetchError
+from backend.services.providers.rate_limiter import get_rate_limiter, ProviderThrottled
+from backend.services.providers.catalog_cache import get_catalog_cache
+from backend.services.providers.http_session import create_session, request_timeout
+from backend.services.providers.raw_archive import archive_response
+from backend.services.providers.token_cache import is_auth_error
+from backend.services.etl.telemetry import record_retry
+
 log_dir = "logs"
 os.makedirs(log_dir, exist_ok=True)
 log_date = datetime.now(timezone('Asia/Kolkata')).strftime('%Y%m%d')
@@ -36,16 +45,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Only inverterDetail carries these; inverterList pages have power, energy and state
+DETAIL_FIELDS = {"battery_voltage", "battery_current", "storage_battery_voltage", "storage_battery_current",
+                 "battery_capacity_soc", "battery_power"}
+
 class SolisCloudAPI:
-    def __init__(self, api_key: str, api_secret: str, base_url: str = "https://www.soliscloud.com:13333", rate_limit_delay: float = 0.6):
+    def __init__(self, api_key: str, api_secret: str, base_url: str = "https://www.soliscloud.com:13333", rate_limit_delay: Optional[float] = None, session: Optional[requests.Session] = None):
         self.api_key = api_key.strip()
         self.api_secret = api_secret.strip()
         self.base_url = base_url
-        self.rate_limit_delay = rate_limit_delay
+        self.rate_limiter = get_rate_limiter("soliscloud", self.api_key)  # Shared by every client for this API key
+        self.catalog = get_catalog_cache("soliscloud", self.api_key)  # Station/inverter listings reused across devices
+        self.session = session or create_session()  # Keep-alive connections reused across calls
+        if rate_limit_delay is not None:
+            self.set_rate_limit_delay(rate_limit_delay)
+
+    def close(self) -> None:
+        self.session.close()
 
     def set_rate_limit_delay(self, delay: float):
-        self.rate_limit_delay = max(0.1, delay)
-        logger.info(f"Rate limit delay set to {self.rate_limit_delay}s")
+        # Minimum spacing between requests, expressed as the token-bucket rate for this API key
+        delay = max(0.1, delay)
+        self.rate_limiter.set_rate(1.0 / delay)
+        logger.info(f"Rate limit set to {self.rate_limiter.rate:.2f} requests/s")
 
     def generate_signature(self, method: str, path: str, content_md5: str, content_type: str, date: str) -> str:
         canonical_content_type = content_type.split(';')[0]
@@ -58,13 +80,7 @@ class SolisCloudAPI:
         ).digest()
         return base64.b64encode(signature).decode('utf-8')
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type(requests.exceptions.RequestException)
-    )
-    def make_request(self, method: str, endpoint: str, payload: Optional[Dict] = None) -> Optional[Dict]:
-        endpoint = endpoint.lstrip("/")
+    def _signed_request(self, method: str, endpoint: str, payload: Optional[Dict] = None):
         path = f"/v1/api/{endpoint}"
         content_type = "application/json;charset=UTF-8"
 
@@ -83,26 +99,219 @@ class SolisCloudAPI:
         }
         safe_headers = {k: ("***" if k == "Authorization" else v) for k, v in headers.items()}
         logger.debug(f"Making {method} request to {self.base_url}{path} with headers: {safe_headers} and payload: {payload}")
+        return f"{self.base_url}{path}", headers
+
+    def _check_response(self, endpoint: str, data: Dict) -> Optional[Dict]:
+        logger.debug(f"Response from {endpoint}: {data}")
+        if not data.get("success") or data.get("code") != "0":
+            error_msg = data.get("msg", "Unknown error")
+            error_code = data.get("code", "Unknown")
+            logger.error(f"API error for {endpoint}: {error_msg} (code: {error_code})")
+            return None
+        return data
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((requests.exceptions.RequestException, ProviderThrottled)),
+        before_sleep=record_retry,
+        reraise=True
+    )
+    def make_request(self, method: str, endpoint: str, payload: Optional[Dict] = None) -> Optional[Dict]:
+        endpoint = endpoint.lstrip("/")
+        self.rate_limiter.acquire()
+        url, headers = self._signed_request(method, endpoint, payload)
 
         try:
-            response = requests.request(method, f"{self.base_url}{path}", headers=headers, json=payload, timeout=30)
+            response = self.session.request(method, url, headers=headers, json=payload, timeout=request_timeout())
+            self.rate_limiter.check(response.status_code, response.headers)
+            if is_auth_error("soliscloud", status_code=response.status_code):
+                logger.error(f"SolisCloud rejected the API key for {endpoint}; check the credential")
             response.raise_for_status()
-            data = response.json()
-            logger.debug(f"Response from {endpoint}: {data}")
-
-            if not data.get("success") or data.get("code") != "0":
-                error_msg = data.get("msg", "Unknown error")
-                error_code = data.get("code", "Unknown")
-                logger.error(f"API error for {endpoint}: {error_msg} (code: {error_code})")
-                return None
-
-            time.sleep(self.rate_limit_delay)
-            return data
+            body = response.json()
+            if not body.get("success") or body.get("code") != "0":
+                self.rate_limiter.check(message=body.get("msg"))
+            self.rate_limiter.success()
+            archive_response("soliscloud", endpoint, payload, body)
+            return self._check_response(endpoint, body)
         except requests.exceptions.RequestException as e:
             logger.error(f"API request failed for {endpoint}: {str(e)}")
             return None
 
+    def _parse_inverter_record(self, record: Dict[str, Any], timestamp_str: str) -> Dict[str, Any]:
+        entry = {
+            "timestamp": timestamp_str,
+            "total_power": float(record.get("pac", 0.0)),
+            "energy_today": float(record.get("eToday", 0.0)),
+            "pr": float(record.get("pr", 0.0)),
+            "state": str(record.get("state", "unknown")),
+            "r_voltage": float(record.get("uAc1", 0.0)),
+            "s_voltage": float(record.get("uAc2", 0.0)),
+            "t_voltage": float(record.get("uAc3", 0.0)),
+            "r_current": float(record.get("iAc1", 0.0)),
+            "s_current": float(record.get("iAc2", 0.0)),
+            "t_current": float(record.get("iAc3", 0.0)),
+            "inverter_temperature": float(record.get("inverterTemperature", 0.0)),
+            "power_factor": float(record.get("powerFactor", 0.0)),
+            "frequency": float(record.get("fac", 0.0)),
+            "storage_battery_voltage": float(record.get("storageBatteryVoltage", 0.0)),
+            "storage_battery_current": float(record.get("storageBatteryCurrent", 0.0)),
+            "current_direction_battery": float(record.get("currentDirectionBattery", 0.0)),
+            "llc_bus_voltage": float(record.get("llcBusVoltage", 0.0)),
+            "dc_bus": float(record.get("dcBus", 0.0)),
+            "dc_bus_half": float(record.get("dcBusHalf", 0.0)),
+            "bypass_ac_voltage": float(record.get("bypassAcVoltage", 0.0)),
+            "bypass_ac_current": float(record.get("bypassAcCurrent", 0.0)),
+            "battery_capacity_soc": float(record.get("batteryCapacitySoc", 0.0)),
+            "battery_health_soh": float(record.get("batteryHealthSoh", 0.0)),
+            "battery_power": float(record.get("batteryPower", 0.0)),
+            "battery_voltage": float(record.get("batteryVoltage", 0.0)),
+            "battery_current": float(record.get("batteryCurrent", 0.0)),
+            "battery_charging_current": float(record.get("batteryChargingCurrent", 0.0)),
+            "battery_discharge_limiting": float(record.get("batteryDischargeLimiting", 0.0)),
+            "family_load_power": float(record.get("familyLoadPower", 0.0)),
+            "bypass_load_power": float(record.get("bypassLoadPower", 0.0)),
+            "battery_total_charge_energy": float(record.get("batteryTotalChargeEnergy", 0.0)),
+            "battery_today_charge_energy": float(record.get("batteryTodayChargeEnergy", 0.0)),
+            "battery_yesterday_charge_energy": float(record.get("batteryYesterdayChargeEnergy", 0.0)),
+            "battery_total_discharge_energy": float(record.get("batteryTotalDischargeEnergy", 0.0)),
+            "battery_today_discharge_energy": float(record.get("batteryTodayDischargeEnergy", 0.0)),
+            "battery_yesterday_discharge_energy": float(record.get("batteryYesterdayDischargeEnergy", 0.0)),
+            "grid_purchased_total_energy": float(record.get("gridPurchasedTotalEnergy", 0.0)),
+            "grid_purchased_today_energy": float(record.get("gridPurchasedTodayEnergy", 0.0)),
+            "grid_purchased_yesterday_energy": float(record.get("gridPurchasedYesterdayEnergy", 0.0)),
+            "grid_sell_total_energy": float(record.get("gridSellTotalEnergy", 0.0)),
+            "grid_sell_today_energy": float(record.get("gridSellTodayEnergy", 0.0)),
+            "grid_sell_yesterday_energy": float(record.get("gridSellYesterdayEnergy", 0.0)),
+            "home_load_total_energy": float(record.get("homeLoadTotalEnergy", 0.0)),
+            "home_load_today_energy": float(record.get("homeLoadTodayEnergy", 0.0)),
+            "home_load_yesterday_energy": float(record.get("homeLoadYesterdayEnergy", 0.0)),
+            "time_zone": float(record.get("timeZone", 5.5)),
+            "battery_type": str(record.get("batteryType", "Unknown"))
+        }
+        for i in range(1, 33):
+            entry[f"pv{i:02d}_voltage"] = float(record.get(f"uPv{i}", 0.0))
+            entry[f"pv{i:02d}_current"] = float(record.get(f"iPv{i}", 0.0))
+        return entry
+
+    def _parse_station(self, station: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        create_date = station.get("createDate", 0)
+        if isinstance(create_date, (int, float)):
+            create_date = datetime.fromtimestamp(create_date / 1000, tz=timezone('UTC')).strftime('%Y-%m-%d')
+        station_data = {
+            "station_id": station.get("id", ""),
+            "plant_name": station.get("stationName", "Unknown"),
+            "capacity": float(station.get("capacity", 0.0)),
+            "install_date": create_date,
+            "time_zone": float(station.get("timeZone", 5.5))
+        }
+        if not station_data["station_id"]:
+            logger.warning(f"Skipping station with missing ID: {station}")
+            return None
+        return station_data
+
+    def _parse_inverter(self, inverter: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        inverter_id = inverter.get("id", "")
+        inverter_sn = inverter.get("sn", "")
+        if not inverter_id or not inverter_sn:
+            logger.warning(f"Skipping invalid inverter: ID={inverter_id}, SN={inverter_sn}")
+            return None
+        return {
+            "id": inverter_id,
+            "sn": inverter_sn,
+            "inverter_model": inverter.get("model", "Unknown"),
+            "panel_model": "Unknown",
+            "pv_count": inverter.get("pvCount", 0),
+            "string_count": inverter.get("stringCount", 0),
+            "first_install_date": inverter.get("installDate", "1970-01-01")
+        }
+
+    def _inverter_day_params(self, device: Dict[str, Any], date_str: str, time_zone: float, page_no: int, page_size: int, realtime: bool = False) -> Dict[str, Any]:
+        if realtime:
+            return {
+                "id": device["id"],
+                "sn": device["sn"],
+                "time": date_str,
+                "timeZone": time_zone,
+                "pageNo": page_no,
+                "money": "INR",
+                "pageSize": page_size
+            }
+        return {
+            "id": device["id"],
+            "sn": device["sn"],
+            "time": date_str,
+            "timeZone": str(time_zone),
+            "pageNo": page_no,
+            "pageSize": page_size
+        }
+
+    def _parse_day_page(self, response: Dict[str, Any], device: Dict[str, Any], date_str: str):
+        """Returns (entries, total_records) for one inverterDay page, or (None, 0) if the page is malformed."""
+        data = response.get("data", {})
+        if isinstance(data, list):
+            records = data
+            total_records = len(records)
+        else:
+            page = data.get("page") if isinstance(data, dict) else None
+            records = page.get("records", []) if page else []
+            total_records = page.get("total", 0) if page else 0
+
+        if not isinstance(records, list):
+            logger.error(f"Invalid records format for device {device['sn']} on {date_str}: {records}")
+            return None, 0
+
+        entries = []
+        for record in records:
+            if not isinstance(record, dict):
+                logger.error(f"Invalid record for device {device['sn']} on {date_str}: {record}")
+                continue
+            timestamp_ms = int(record.get("dataTimestamp", 0))
+            if not timestamp_ms:
+                logger.warning(f"Missing dataTimestamp for record on {date_str}: {record}")
+                continue
+            timestamp = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone('UTC'))
+            entries.append(self._parse_inverter_record(record, timestamp.strftime('%Y-%m-%d %H:%M:%S')))
+
+        logger.info(f"Fetched {len(records)} records for device {device['sn']} on {date_str}. Total: {total_records}")
+        return entries, total_records
+
+    def _day_window(self, start_date: str, end_date: str):
+        try:
+            start = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=timezone('UTC'))
+            end = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, tzinfo=timezone('UTC'))
+        except ValueError as e:
+            logger.error(f"Invalid date format: {e}")
+            return None
+        dates = []
+        current_date = start
+        while current_date <= end:
+            dates.append(current_date.strftime('%Y-%m-%d'))
+            current_date += timedelta(days=1)
+        return dates
+
+    def _resolve_device(self, user_id: str, device: Optional[Dict[str, Any]], station_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if device and device.get("id") and device.get("sn"):
+            return device
+        if not station_id:
+            logger.error("Invalid device data and no station_id provided")
+            return None
+        inverters = self.get_all_inverters(user_id, station_id=station_id)
+        if not inverters:
+            logger.error(f"No inverters found for station {station_id}")
+            return None
+        logger.info(f"Auto-fetched inverter: ID={inverters[0]['id']}, SN={inverters[0]['sn']}")
+        return inverters[0]
+
+    def _station_time_zone(self, user_id: str, station_id: Optional[str]) -> float:
+        stations = self.get_all_stations(user_id)
+        station = next((s for s in stations if s["station_id"] == station_id), None) if station_id else None
+        return station["time_zone"] if station else 5.5
+
     def get_all_stations(self, user_id: str, username: str = None, password: str = None) -> List[Dict[str, Any]]:
+        return self.catalog.get_or_load("stations", self._list_stations)
+
+    def _list_stations(self) -> List[Dict[str, Any]]:
         page_no = 1
         page_size = 100
         all_stations = []
@@ -117,20 +326,9 @@ class SolisCloudAPI:
             data = response.get("data", {})
             stations = data.get("page", {}).get("records", [])
             for station in stations:
-                create_date = station.get("createDate", 0)
-                if isinstance(create_date, (int, float)):
-                    create_date = datetime.fromtimestamp(create_date / 1000, tz=timezone('UTC')).strftime('%Y-%m-%d')
-                station_data = {
-                    "station_id": station.get("id", ""),
-                    "plant_name": station.get("stationName", "Unknown"),
-                    "capacity": float(station.get("capacity", 0.0)),
-                    "install_date": create_date,
-                    "time_zone": float(station.get("timeZone", 5.5))
-                }
-                if station_data["station_id"]:
+                station_data = self._parse_station(station)
+                if station_data:
                     all_stations.append(station_data)
-                else:
-                    logger.warning(f"Skipping station with missing ID: {station}")
 
             total_records = data.get("page", {}).get("total", 0)
             logger.info(f"Fetched {len(stations)} stations on page {page_no}. Total: {total_records}")
@@ -142,6 +340,9 @@ class SolisCloudAPI:
         return all_stations
 
     def get_all_inverters(self, user_id: str, username: str = None, password: str = None, station_id: str = None) -> List[Dict[str, Any]]:
+        return self.catalog.get_or_load(("inverters", station_id), lambda: self._list_inverters(station_id))
+
+    def _list_inverters(self, station_id: str) -> List[Dict[str, Any]]:
         page_no = 1
         page_size = 100
         all_inverters = []
@@ -156,21 +357,9 @@ class SolisCloudAPI:
             data = response.get("data", {})
             inverters = data.get("page", {}).get("records", [])
             for inverter in inverters:
-                inverter_id = inverter.get("id", "")
-                inverter_sn = inverter.get("sn", "")
-                if not inverter_id or not inverter_sn:
-                    logger.warning(f"Skipping invalid inverter: ID={inverter_id}, SN={inverter_sn}")
-                    continue
-                inverter_data = {
-                    "id": inverter_id,
-                    "sn": inverter_sn,
-                    "inverter_model": inverter.get("model", "Unknown"),
-                    "panel_model": "Unknown",
-                    "pv_count": inverter.get("pvCount", 0),
-                    "string_count": inverter.get("stringCount", 0),
-                    "first_install_date": inverter.get("installDate", "1970-01-01")
-                }
-                all_inverters.append(inverter_data)
+                inverter_data = self._parse_inverter(inverter)
+                if inverter_data:
+                    all_inverters.append(inverter_data)
 
             total_records = data.get("page", {}).get("total", 0)
             logger.info(f"Fetched {len(inverters)} inverters for station {station_id} on page {page_no}. Total: {total_records}")
@@ -181,141 +370,44 @@ class SolisCloudAPI:
         logger.info(f"Fetched a total of {len(all_inverters)} inverters for station {station_id}")
         return all_inverters
 
-    def get_inverter_current_data(self, user_id: str, username: str = None, password: str = None, device: Dict[str, Any] = None, station_id: str = None) -> List[Dict[str, Any]]:
-        if not device or not device.get("id") or not device.get("sn"):
-            if station_id:
-                inverters = self.get_all_inverters(user_id, station_id=station_id)
-                if inverters:
-                    device = inverters[0]
-                    logger.info(f"Auto-fetched inverter: ID={device['id']}, SN={device['sn']}")
-                else:
-                    logger.error(f"No inverters found for station {station_id}")
-                    return []
-            else:
-                logger.error("Invalid device data and no station_id provided")
-                return []
-
-        try:
-            start_date = datetime.now(timezone('Asia/Kolkata')).strftime('%Y-%m-%d')
-            end_date = start_date
-            start = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=timezone('UTC'))
-            end = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, tzinfo=timezone('UTC'))
-        except ValueError as e:
-            logger.error(f"Invalid date format: {e}")
-            return []
-
-        stations = self.get_all_stations(user_id)
-        station = next((s for s in stations if s["station_id"] == station_id), None) if station_id else None
-        time_zone = station["time_zone"] if station else 5.5
+    def _fetch_inverter_days(self, device: Dict[str, Any], dates: List[str], time_zone: float, realtime: bool = False) -> List[Dict[str, Any]]:
+        historical_data = [entry for page in self._iter_inverter_days(device, dates, time_zone, realtime) for entry in page]
+        logger.info(f"Total historical data entries for device {device['sn']}: {len(historical_data)}")
+        return historical_data
 
-        historical_data = []
-        current_date = start
-        while current_date <= end:
-            date_str = current_date.strftime('%Y-%m-%d')
+    def _iter_inverter_days(self, device: Dict[str, Any], dates: List[str], time_zone: float, realtime: bool = False) -> Iterator[List[Dict[str, Any]]]:
+        """Yields the parsed entries of each inverterDay page as it arrives; raises ProviderDayError at a failed page."""
+        for date_str in dates:
             page_no = 1
             page_size = 100
 
             while True:
-                params = {
-                    "id": device["id"],
-                    "sn": device["sn"],
-                    "time": date_str,
-                    "timeZone": time_zone,
-                    "pageNo": page_no,
-                    "money": "INR",
-                    "pageSize": page_size
-                }
-                response = self.make_request("POST", "inverterDay", params)
-                if not response:
+                params = self._inverter_day_params(device, date_str, time_zone, page_no, page_size, realtime=realtime)
+                try:
+                    response = self.make_request("POST", "inverterDay", params)
+                except ProviderThrottled as e:
+                    raise ProviderDayError("soliscloud", device.get("sn"), date_str, str(e)) from e
+                entries, total_records = self._parse_day_page(response, device, date_str) if response else (None, 0)
+                if entries is None:
                     logger.warning(f"No data for device {device['sn']} on {date_str}, page {page_no}")
-                    break
-
-                if isinstance(response.get("data"), list):
-                    records = response.get("data", [])
-                else:
-                    data = response.get("data", {})
-                    records = data if isinstance(data, list) else []
-
-                if not isinstance(records, list):
-                    logger.error(f"Invalid records format for device {device['sn']} on {date_str}: {records}")
-                    break
-
-                for record in records:
-                    if not isinstance(record, dict):
-                        logger.error(f"Invalid record for device {device['sn']} on {date_str}: {record}")
-                        continue
-                    timestamp_ms = int(record.get("dataTimestamp", 0))
-                    if not timestamp_ms:
-                        logger.warning(f"Missing dataTimestamp for record on {date_str}: {record}")
-                        continue
-                    timestamp = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone('UTC'))
-                    timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-
-                    entry = {
-                        "timestamp": timestamp_str,
-                        "total_power": float(record.get("pac", 0.0)),
-                        "energy_today": float(record.get("eToday", 0.0)),
-                        "pr": float(record.get("pr", 0.0)),
-                        "state": str(record.get("state", "unknown")),
-                        "r_voltage": float(record.get("uAc1", 0.0)),
-                        "s_voltage": float(record.get("uAc2", 0.0)),
-                        "t_voltage": float(record.get("uAc3", 0.0)),
-                        "r_current": float(record.get("iAc1", 0.0)),
-                        "s_current": float(record.get("iAc2", 0.0)),
-                        "t_current": float(record.get("iAc3", 0.0)),
-                        "inverter_temperature": float(record.get("inverterTemperature", 0.0)),
-                        "power_factor": float(record.get("powerFactor", 0.0)),
-                        "frequency": float(record.get("fac", 0.0)),
-                        "storage_battery_voltage": float(record.get("storageBatteryVoltage", 0.0)),
-                        "storage_battery_current": float(record.get("storageBatteryCurrent", 0.0)),
-                        "current_direction_battery": float(record.get("currentDirectionBattery", 0.0)),
-                        "llc_bus_voltage": float(record.get("llcBusVoltage", 0.0)),
-                        "dc_bus": float(record.get("dcBus", 0.0)),
-                        "dc_bus_half": float(record.get("dcBusHalf", 0.0)),
-                        "bypass_ac_voltage": float(record.get("bypassAcVoltage", 0.0)),
-                        "bypass_ac_current": float(record.get("bypassAcCurrent", 0.0)),
-                        "battery_capacity_soc": float(record.get("batteryCapacitySoc", 0.0)),
-                        "battery_health_soh": float(record.get("batteryHealthSoh", 0.0)),
-                        "battery_power": float(record.get("batteryPower", 0.0)),
-                        "battery_voltage": float(record.get("batteryVoltage", 0.0)),
-                        "battery_current": float(record.get("batteryCurrent", 0.0)),
-                        "battery_charging_current": float(record.get("batteryChargingCurrent", 0.0)),
-                        "battery_discharge_limiting": float(record.get("batteryDischargeLimiting", 0.0)),
-                        "family_load_power": float(record.get("familyLoadPower", 0.0)),
-                        "bypass_load_power": float(record.get("bypassLoadPower", 0.0)),
-                        "battery_total_charge_energy": float(record.get("batteryTotalChargeEnergy", 0.0)),
-                        "battery_today_charge_energy": float(record.get("batteryTodayChargeEnergy", 0.0)),
-                        "battery_yesterday_charge_energy": float(record.get("batteryYesterdayChargeEnergy", 0.0)),
-                        "battery_total_discharge_energy": float(record.get("batteryTotalDischargeEnergy", 0.0)),
-                        "battery_today_discharge_energy": float(record.get("batteryTodayDischargeEnergy", 0.0)),
-                        "battery_yesterday_discharge_energy": float(record.get("batteryYesterdayDischargeEnergy", 0.0)),
-                        "grid_purchased_total_energy": float(record.get("gridPurchasedTotalEnergy", 0.0)),
-                        "grid_purchased_today_energy": float(record.get("gridPurchasedTodayEnergy", 0.0)),
-                        "grid_purchased_yesterday_energy": float(record.get("gridPurchasedYesterdayEnergy", 0.0)),
-                        "grid_sell_total_energy": float(record.get("gridSellTotalEnergy", 0.0)),
-                        "grid_sell_today_energy": float(record.get("gridSellTodayEnergy", 0.0)),
-                        "grid_sell_yesterday_energy": float(record.get("gridSellYesterdayEnergy", 0.0)),
-                        "home_load_total_energy": float(record.get("homeLoadTotalEnergy", 0.0)),
-                        "home_load_today_energy": float(record.get("homeLoadTodayEnergy", 0.0)),
-                        "home_load_yesterday_energy": float(record.get("homeLoadYesterdayEnergy", 0.0)),
-                        "time_zone": float(record.get("timeZone", 5.5)),
-                        "battery_type": str(record.get("batteryType", "Unknown"))
-                    }
-                    for i in range(1, 33):
-                        entry[f"pv{i:02d}_voltage"] = float(record.get(f"uPv{i}", 0.0))
-                        entry[f"pv{i:02d}_current"] = float(record.get(f"iPv{i}", 0.0))
-                    historical_data.append(entry)
-
-                total_records = len(records) if isinstance(response.get("data"), list) else data.get("page", {}).get("total", 0)
-                logger.info(f"Fetched {len(records)} records for device {device['sn']} on {date_str}, page {page_no}. Total: {total_records}")
+                    raise ProviderDayError("soliscloud", device.get("sn"), date_str, f"inverterDay page {page_no} failed")
+                yield entries
                 if page_no * page_size >= total_records:
                     break
                 page_no += 1
 
-            current_date += timedelta(days=1)
+    def get_inverter_current_data(self, user_id: str, username: str = None, password: str = None, device: Dict[str, Any] = None, station_id: str = None) -> List[Dict[str, Any]]:
+        device = self._resolve_device(user_id, device, station_id)
+        if not device:
+            raise ProviderFetchError(f"soliscloud: no inverter found for station {station_id}")
 
-        logger.info(f"Total historical data entries for device {device['sn']}: {len(historical_data)}")
-        return historical_data
+        today = datetime.now(timezone('Asia/Kolkata')).strftime('%Y-%m-%d')
+        dates = self._day_window(today, today)
+        if dates is None:
+            return []
+
+        time_zone = self._station_time_zone(user_id, station_id)
+        return self._fetch_inverter_days(device, dates, time_zone, realtime=True)
     
     def get_inverter_real_time_data(self, user_id: str, username: str = None, password: str = None, device: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         if not device or not device.get("id") or not device.get("sn"):
@@ -327,203 +419,112 @@ class SolisCloudAPI:
         if not response:
             logger.warning(f"No CURRENT data for device {device['sn']}")
             return []
+        return self._parse_detail_response(response, device)
+
+    def _parse_list_realtime(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        inverter = self._parse_inverter(record)
+        if not inverter:
+            return None
+        timestamp_ms = int(record.get("dataTimestamp", 0) or 0)
+        if not timestamp_ms:
+            logger.warning(f"Missing dataTimestamp for inverter {inverter['sn']} in inverterList")
+            return None
+        return {
+            "id": inverter["id"],
+            "sn": inverter["sn"],
+            "timestamp": datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone('UTC')).strftime('%Y-%m-%d %H:%M:%S'),
+            "total_power": float(record.get("pac", 0.0)),
+            "energy_today": float(record.get("etoday", 0.0)),
+            "state": str(record.get("state", "unknown")),
+        }
+
+    def _needs_detail(self, record: Dict[str, Any]) -> bool:
+        # Strings only read non-zero while producing; battery fields only exist on storage inverters
+        if str(record.get("state")) != "1":
+            return False
+        return float(record.get("pac", 0.0) or 0.0) > 0 or record.get("batteryCapacitySoc") is not None
+
+    def _detail_subset(self, response: Optional[Dict[str, Any]], entry: Dict[str, Any]) -> Dict[str, Any]:
+        """The inverterDetail fields the list record lacks (strings, battery); {} when the call failed."""
+        if not response:
+            logger.warning(f"No detail for inverter {entry['sn']}; keeping list fields only")
+            return {}
+        detail = self._parse_detail_response(response, entry)
+        if not detail:
+            return {}
+        return {k: v for k, v in detail[0].items() if k in DETAIL_FIELDS or k.startswith("pv")}
+
+    def _detail_fields(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.make_request("POST", "inverterDetail", {"id": entry["id"], "sn": entry["sn"]})
+        return self._detail_subset(response, entry)
+
+    def iter_realtime_pages(self, user_id: str, station_id: str = None, with_detail: Optional[bool] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields realtime entries for every inverter of the account (or one station), one inverterList page
+        (up to 100 inverters) per request. inverterDetail is called only for inverters that need it.
+        """
+        with_detail = settings.SOLISCLOUD_REALTIME_DETAIL if with_detail is None else with_detail
+        page_no = 1
+        page_size = 100
+        detail_calls = 0
+
+        while True:
+            params = {"pageNo": page_no, "pageSize": page_size}
+            if station_id:
+                params["stationId"] = station_id
+            response = self.make_request("POST", "inverterList", params)
+            if not response:
+                logger.error(f"Inverter list request failed for page {page_no} ({station_id or 'all stations'})")
+                break
 
+            page = response.get("data", {}).get("page", {})
+            entries = []
+            for record in page.get("records", []):
+                entry = self._parse_list_realtime(record)
+                if not entry:
+                    continue
+                if with_detail and self._needs_detail(record):
+                    entry.update(self._detail_fields(entry))
+                    detail_calls += 1
+                entries.append(entry)
+            yield entries
+
+            total_records = page.get("total", 0)
+            if page_no * page_size >= total_records:
+                break
+            page_no += 1
+
+        logger.info(f"Bulk realtime finished after {page_no} inverterList pages and {detail_calls} detail calls")
+
+    def _parse_detail_response(self, response: Dict[str, Any], device: Dict[str, Any]) -> List[Dict[str, Any]]:
         data = response.get("data", {})
         if not isinstance(data, dict):
             logger.error(f"Unexpected data format for device {device['sn']}: {data}")
             return []
 
         timestamp_ms = int(data.get("dataTimestamp", 0))
-        entry = {
-            "timestamp": datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone('UTC')).strftime('%Y-%m-%d %H:%M:%S') if timestamp_ms else datetime.now(timezone('UTC')).strftime('%Y-%m-%d %H:%M:%S'),
-            "total_power": float(data.get("pac", 0.0)),
-            "energy_today": float(data.get("eToday", 0.0)),
-            "pr": float(data.get("pr", 0.0)),
-            "state": str(data.get("state", "unknown")),
-            "r_voltage": float(data.get("uAc1", 0.0)),
-            "s_voltage": float(data.get("uAc2", 0.0)),
-            "t_voltage": float(data.get("uAc3", 0.0)),
-            "r_current": float(data.get("iAc1", 0.0)),
-            "s_current": float(data.get("iAc2", 0.0)),
-            "t_current": float(data.get("iAc3", 0.0)),
-            "inverter_temperature": float(data.get("inverterTemperature", 0.0)),
-            "power_factor": float(data.get("powerFactor", 0.0)),
-            "frequency": float(data.get("fac", 0.0)),
-            "storage_battery_voltage": float(data.get("storageBatteryVoltage", 0.0)),
-            "storage_battery_current": float(data.get("storageBatteryCurrent", 0.0)),
-            "current_direction_battery": float(data.get("currentDirectionBattery", 0.0)),
-            "llc_bus_voltage": float(data.get("llcBusVoltage", 0.0)),
-            "dc_bus": float(data.get("dcBus", 0.0)),
-            "dc_bus_half": float(data.get("dcBusHalf", 0.0)),
-            "bypass_ac_voltage": float(data.get("bypassAcVoltage", 0.0)),
-            "bypass_ac_current": float(data.get("bypassAcCurrent", 0.0)),
-            "battery_capacity_soc": float(data.get("batteryCapacitySoc", 0.0)),
-            "battery_health_soh": float(data.get("batteryHealthSoh", 0.0)),
-            "battery_power": float(data.get("batteryPower", 0.0)),
-            "battery_voltage": float(data.get("batteryVoltage", 0.0)),
-            "battery_current": float(data.get("batteryCurrent", 0.0)),
-            "battery_charging_current": float(data.get("batteryChargingCurrent", 0.0)),
-            "battery_discharge_limiting": float(data.get("batteryDischargeLimiting", 0.0)),
-            "family_load_power": float(data.get("familyLoadPower", 0.0)),
-            "bypass_load_power": float(data.get("bypassLoadPower", 0.0)),
-            "battery_total_charge_energy": float(data.get("batteryTotalChargeEnergy", 0.0)),
-            "battery_today_charge_energy": float(data.get("batteryTodayChargeEnergy", 0.0)),
-            "battery_yesterday_charge_energy": float(data.get("batteryYesterdayChargeEnergy", 0.0)),
-            "battery_total_discharge_energy": float(data.get("batteryTotalDischargeEnergy", 0.0)),
-            "battery_today_discharge_energy": float(data.get("batteryTodayDischargeEnergy", 0.0)),
-            "battery_yesterday_discharge_energy": float(data.get("batteryYesterdayDischargeEnergy", 0.0)),
-            "grid_purchased_total_energy": float(data.get("gridPurchasedTotalEnergy", 0.0)),
-            "grid_purchased_today_energy": float(data.get("gridPurchasedTodayEnergy", 0.0)),
-            "grid_purchased_yesterday_energy": float(data.get("gridPurchasedYesterdayEnergy", 0.0)),
-            "grid_sell_total_energy": float(data.get("gridSellTotalEnergy", 0.0)),
-            "grid_sell_today_energy": float(data.get("gridSellTodayEnergy", 0.0)),
-            "grid_sell_yesterday_energy": float(data.get("gridSellYesterdayEnergy", 0.0)),
-            "home_load_total_energy": float(data.get("homeLoadTotalEnergy", 0.0)),
-            "home_load_today_energy": float(data.get("homeLoadTodayEnergy", 0.0)),
-            "home_load_yesterday_energy": float(data.get("homeLoadYesterdayEnergy", 0.0)),
-            "time_zone": float(data.get("timeZone", 5.5)),
-            "battery_type": str(data.get("batteryType", "Unknown"))
-        }
-        for i in range(1, 33):
-            entry[f"pv{i:02d}_voltage"] = float(data.get(f"uPv{i}", 0.0))
-            entry[f"pv{i:02d}_current"] = float(data.get(f"iPv{i}", 0.0))
+        timestamp_str = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone('UTC')).strftime('%Y-%m-%d %H:%M:%S') if timestamp_ms else datetime.now(timezone('UTC')).strftime('%Y-%m-%d %H:%M:%S')
+        entry = self._parse_inverter_record(data, timestamp_str)
 
         logger.info(f"Fetched real-time data for device {device['sn']}")
         return [entry]
 
     def get_inverter_historical_data(self, user_id: str, username: str = None, password: str = None, device: Dict[str, Any] = None, start_date: str = None, end_date: str = None, station_id: str = None) -> List[Dict[str, Any]]:
-        if not device or not device.get("id") or not device.get("sn"):
-            if station_id:
-                inverters = self.get_all_inverters(user_id, station_id=station_id)
-                if inverters:
-                    device = inverters[0]
-                    logger.info(f"Auto-fetched inverter: ID={device['id']}, SN={device['sn']}")
-                else:
-                    logger.error(f"No inverters found for station {station_id}")
-                    return []
-            else:
-                logger.error("Invalid device data and no station_id provided")
-                return []
-
-        if not start_date or not end_date:
-            logger.error("Start date and end date must be provided")
-            return []
-
-        try:
-            start = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=timezone('UTC'))
-            end = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, tzinfo=timezone('UTC'))
-        except ValueError as e:
-            logger.error(f"Invalid date format: {e}")
-            return []
-
-        stations = self.get_all_stations(user_id)
-        station = next((s for s in stations if s["station_id"] == station_id), None) if station_id else None
-        time_zone = station["time_zone"] if station else 5.5
+        pages = self.iter_inverter_historical_data(user_id, username, password, device, start_date, end_date, station_id)
+        return [entry for page in pages for entry in page]
 
-        historical_data = []
-        current_date = start
-        while current_date <= end:
-            date_str = current_date.strftime('%Y-%m-%d')
-            page_no = 1
-            page_size = 100
-
-            while True:
-                params = {
-                    "id": device["id"],
-                    "sn": device["sn"],
-                    "time": date_str,
-                    "timeZone": str(time_zone),
-                    "pageNo": page_no,
-                    "pageSize": page_size
-                }
-                response = self.make_request("POST", "inverterDay", params)
-                if not response:
-                    logger.warning(f"No data for device {device['sn']} on {date_str}, page {page_no}")
-                    break
-
-                if isinstance(response.get("data"), list):
-                    records = response.get("data", [])
-                else:
-                    data = response.get("data", {})
-                    records = data.get("page", {}).get("records", []) if data.get("page") else []
+    def iter_inverter_historical_data(self, user_id: str, username: str = None, password: str = None, device: Dict[str, Any] = None, start_date: str = None, end_date: str = None, station_id: str = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yields historical entries one inverterDay page at a time; raises ProviderDayError at the first failed day."""
+        device = self._resolve_device(user_id, device, station_id)
+        if not device:
+            raise ProviderDayError("soliscloud", None, start_date, f"no inverter found for station {station_id}")
 
-                if not isinstance(records, list):
-                    logger.error(f"Invalid records format for device {device['sn']} on {date_str}: {records}")
-                    break
-
-                for record in records:
-                    if not isinstance(record, dict):
-                        logger.error(f"Invalid record for device {device['sn']} on {date_str}: {record}")
-                        continue
-                    timestamp_ms = int(record.get("dataTimestamp", 0))
-                    if not timestamp_ms:
-                        logger.warning(f"Missing dataTimestamp for record on {date_str}: {record}")
-                        continue
-                    timestamp = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone('UTC'))
-                    timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-
-                    entry = {
-                        "timestamp": timestamp_str,
-                        "total_power": float(record.get("pac", 0.0)),
-                        "energy_today": float(record.get("eToday", 0.0)),
-                        "pr": float(record.get("pr", 0.0)),
-                        "state": str(record.get("state", "unknown")),
-                        "r_voltage": float(record.get("uAc1", 0.0)),
-                        "s_voltage": float(record.get("uAc2", 0.0)),
-                        "t_voltage": float(record.get("uAc3", 0.0)),
-                        "r_current": float(record.get("iAc1", 0.0)),
-                        "s_current": float(record.get("iAc2", 0.0)),
-                        "t_current": float(record.get("iAc3", 0.0)),
-                        "inverter_temperature": float(record.get("inverterTemperature", 0.0)),
-                        "power_factor": float(record.get("powerFactor", 0.0)),
-                        "frequency": float(record.get("fac", 0.0)),
-                        "storage_battery_voltage": float(record.get("storageBatteryVoltage", 0.0)),
-                        "storage_battery_current": float(record.get("storageBatteryCurrent", 0.0)),
-                        "current_direction_battery": float(record.get("currentDirectionBattery", 0.0)),
-                        "llc_bus_voltage": float(record.get("llcBusVoltage", 0.0)),
-                        "dc_bus": float(record.get("dcBus", 0.0)),
-                        "dc_bus_half": float(record.get("dcBusHalf", 0.0)),
-                        "bypass_ac_voltage": float(record.get("bypassAcVoltage", 0.0)),
-                        "bypass_ac_current": float(record.get("bypassAcCurrent", 0.0)),
-                        "battery_capacity_soc": float(record.get("batteryCapacitySoc", 0.0)),
-                        "battery_health_soh": float(record.get("batteryHealthSoh", 0.0)),
-                        "battery_power": float(record.get("batteryPower", 0.0)),
-                        "battery_voltage": float(record.get("batteryVoltage", 0.0)),
-                        "battery_current": float(record.get("batteryCurrent", 0.0)),
-                        "battery_charging_current": float(record.get("batteryChargingCurrent", 0.0)),
-                        "battery_discharge_limiting": float(record.get("batteryDischargeLimiting", 0.0)),
-                        "family_load_power": float(record.get("familyLoadPower", 0.0)),
-                        "bypass_load_power": float(record.get("bypassLoadPower", 0.0)),
-                        "battery_total_charge_energy": float(record.get("batteryTotalChargeEnergy", 0.0)),
-                        "battery_today_charge_energy": float(record.get("batteryTodayChargeEnergy", 0.0)),
-                        "battery_yesterday_charge_energy": float(record.get("batteryYesterdayChargeEnergy", 0.0)),
-                        "battery_total_discharge_energy": float(record.get("batteryTotalDischargeEnergy", 0.0)),
-                        "battery_today_discharge_energy": float(record.get("batteryTodayDischargeEnergy", 0.0)),
-                        "battery_yesterday_discharge_energy": float(record.get("batteryYesterdayDischargeEnergy", 0.0)),
-                        "grid_purchased_total_energy": float(record.get("gridPurchasedTotalEnergy", 0.0)),
-                        "grid_purchased_today_energy": float(record.get("gridPurchasedTodayEnergy", 0.0)),
-                        "grid_purchased_yesterday_energy": float(record.get("gridPurchasedYesterdayEnergy", 0.0)),
-                        "grid_sell_total_energy": float(record.get("gridSellTotalEnergy", 0.0)),
-                        "grid_sell_today_energy": float(record.get("gridSellTodayEnergy", 0.0)),
-                        "grid_sell_yesterday_energy": float(record.get("gridSellYesterdayEnergy", 0.0)),
-                        "home_load_total_energy": float(record.get("homeLoadTotalEnergy", 0.0)),
-                        "home_load_today_energy": float(record.get("homeLoadTodayEnergy", 0.0)),
-                        "home_load_yesterday_energy": float(record.get("homeLoadYesterdayEnergy", 0.0)),
-                        "time_zone": float(record.get("timeZone", 5.5)),
-                        "battery_type": str(record.get("batteryType", "Unknown"))
-                    }
-                    for i in range(1, 33):
-                        entry[f"pv{i:02d}_voltage"] = float(record.get(f"uPv{i}", 0.0))
-                        entry[f"pv{i:02d}_current"] = float(record.get(f"iPv{i}", 0.0))
-                    historical_data.append(entry)
-
-                total_records = len(records) if isinstance(response.get("data"), list) else data.get("page", {}).get("total", 0)
-                logger.info(f"Fetched {len(records)} records for device {device['sn']} on {date_str}, page {page_no}. Total: {total_records}")
-                if page_no * page_size >= total_records:
-                    break
-                page_no += 1
+        if not start_date or not end_date:
+            raise ValueError("Start date and end date must be provided")
 
-            current_date += timedelta(days=1)
+        dates = self._day_window(start_date, end_date)
+        if dates is None:
+            raise ValueError(f"Invalid date range {start_date} - {end_date}")
 
-        logger.info(f"Total historical data entries for device {device['sn']}: {len(historical_data)}")
-        return historical_data
\ No newline at end of file
+        time_zone = self._station_time_zone(user_id, station_id)
+        yield from self._iter_inverter_days(device, dates, time_zone)
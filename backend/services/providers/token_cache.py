@@ -0,0 +1,124 @@
+"""
+Persistent cache for provider login tokens.
+
+Tokens are keyed by (provider, account), encrypted with a Fernet key derived from ENCRYPTION_KEY and
+stored in Redis with a TTL that ends TOKEN_REFRESH_MARGIN seconds before the provider expiry, so a
+cached token is always safe to use and is refreshed proactively. When Redis is unreachable the cache
+degrades to a per-process dictionary.
+"""
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Replies that mean the provider rejected the login or token, per provider: (HTTP statuses, error codes,
+# message prefixes). Anything else (quota, unknown device, a desc that merely mentions a token) is not
+# an auth failure and does not trigger a new login.
+AUTH_ERRORS = {
+    'solarman': ((401,), (), ('auth invalid token',)),
+    'shinemonitor': ((), ('3',), ('err_no_auth',)),  # err 3 / ERR_NO_AUTH: token expired or invalid
+    'soliscloud': ((403,), ('Z0001',), ()),  # API key or signature rejected
+}
+
+def is_auth_error(api_provider: str, status_code: Optional[int] = None, code=None, message: Optional[str] = None) -> bool:
+    statuses, codes, prefixes = AUTH_ERRORS[api_provider]
+    if status_code in statuses or (code is not None and str(code) in codes):
+        return True
+    text = (message or '').strip().lower()
+    return any(text.startswith(prefix) for prefix in prefixes)
+
+class TokenCache:
+    def __init__(self, redis_url: Optional[str] = None, encryption_key: Optional[str] = None):
+        # Fernet needs a 32-byte urlsafe key; derive it so any configured secret works
+        secret = (encryption_key or settings.ENCRYPTION_KEY).encode('utf-8')
+        self._fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret).digest()))
+        self._local: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_retry_at = 0.0
+        try:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url or settings.REDIS_URL, socket_timeout=2)
+        except Exception as e:
+            logger.warning(f"Token cache running without Redis: {e}")
+
+    def _redis_ok(self) -> bool:
+        return self._redis is not None and time.time() >= self._redis_retry_at
+
+    def _redis_failed(self, action: str, provider: str, error: Exception) -> None:
+        # Skip Redis for a while instead of paying a timeout on every lookup
+        self._redis_retry_at = time.time() + 30
+        logger.warning(f"Token cache {action} failed for {provider}, using in-process cache: {error}")
+
+    def _key(self, provider: str, account: str) -> str:
+        account_hash = hashlib.sha1(account.encode('utf-8')).hexdigest()[:16]
+        return f"authtoken:{provider}:{account_hash}"
+
+    def get(self, provider: str, account: str) -> Optional[Dict]:
+        """Returns the cached token payload (incl. 'expires_at') if it is still outside the refresh margin."""
+        key = self._key(provider, account)
+        blob = None
+        if self._redis_ok():
+            try:
+                blob = self._redis.get(key)
+            except Exception as e:
+                self._redis_failed("read", provider, e)
+        if blob is None:
+            with self._lock:
+                blob, valid_until = self._local.get(key, (None, 0))
+            if blob is not None and time.time() >= valid_until:
+                blob = None
+        if blob is None:
+            return None
+        try:
+            data = json.loads(self._fernet.decrypt(blob))
+        except (InvalidToken, ValueError):
+            logger.warning(f"Discarding unreadable cached token for {provider}")
+            self.invalidate(provider, account)
+            return None
+        if time.time() >= data.get('expires_at', 0) - int(settings.TOKEN_REFRESH_MARGIN):
+            return None
+        return data
+
+    def set(self, provider: str, account: str, data: Dict, expires_at: float) -> None:
+        ttl = int(expires_at - time.time() - int(settings.TOKEN_REFRESH_MARGIN))
+        if ttl <= 0:
+            return
+        key = self._key(provider, account)
+        blob = self._fernet.encrypt(json.dumps({**data, 'expires_at': expires_at}).encode('utf-8'))
+        with self._lock:
+            self._local[key] = (blob, time.time() + ttl)
+        if self._redis_ok():
+            try:
+                self._redis.set(key, blob, ex=ttl)
+            except Exception as e:
+                self._redis_failed("write", provider, e)
+
+    def invalidate(self, provider: str, account: str) -> None:
+        key = self._key(provider, account)
+        with self._lock:
+            self._local.pop(key, None)
+        if self._redis_ok():
+            try:
+                self._redis.delete(key)
+            except Exception as e:
+                self._redis_failed("delete", provider, e)
+
+_token_cache: Optional[TokenCache] = None
+_token_cache_lock = threading.Lock()
+
+def get_token_cache() -> TokenCache:
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is None:
+            _token_cache = TokenCache()
+        return _token_cache
@@ -0,0 +1,132 @@
+# backend/services/timeseries_encoding.py
+"""
+Encodings of timeseries responses.
+
+Points can be sent as rows (a list of {'timestamp', column: value} objects, the default JSON layout) or as
+columns ({'timestamps': [epoch ms, ...], column: [values, ...]}), which names every column once instead
+of once per point. The media type is negotiated from the Accept header:
+
+- application/json (default): rows, or columns with layout=columns; encoded with orjson
+- application/msgpack (or application/x-msgpack): always columns
+- application/vnd.apache.arrow.stream: one Arrow IPC record batch (timestamps + float64 columns); only
+  offered where the optional pyarrow is installed
+
+orjson and msgpack are pinned in requirements.txt; without them (a bare development install) JSON falls
+back to the standard json module and msgpack is not offered.
+"""
+import json
+import operator
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # application/msgpack is not offered without it
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:  # Optional: Arrow IPC is not offered without it
+    pyarrow = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+_ALIASES = {'application/x-msgpack': MSGPACK}
+
+def available_media_types(arrow: bool = True) -> List[str]:
+    types = [JSON]
+    if msgpack is not None:
+        types.append(MSGPACK)
+    if arrow and pyarrow is not None:
+        types.append(ARROW)
+    return types
+
+def negotiate(accept: Optional[str], arrow: bool = True) -> str:
+    """
+    The first media type of the Accept header (by q-value, then order) that can be produced; JSON for a
+    missing header or wildcards. Raises ValueError when nothing acceptable can be produced (-> 406).
+    """
+    offered = available_media_types(arrow)
+    if not accept:
+        return JSON
+    candidates = []
+    for position, part in enumerate(accept.split(',')):
+        fields = [f.strip() for f in part.split(';')]
+        media_type = _ALIASES.get(fields[0].lower(), fields[0].lower())
+        quality = 1.0
+        for field in fields[1:]:
+            if field.startswith('q='):
+                try:
+                    quality = float(field[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type))
+    for _, _, media_type in sorted(candidates):
+        if media_type in ('*/*', 'application/*'):
+            return JSON
+        if media_type in offered:
+            return media_type
+    raise ValueError(f"Not acceptable: {accept} (available: {', '.join(offered)})")
+
+def _epoch_ms(value: Any) -> Any:
+    return int(value.timestamp() * 1000) if isinstance(value, datetime) else value
+
+def to_columns(points: Sequence[Dict[str, Any]], keys: Optional[Sequence[str]] = None) -> Dict[str, List[Any]]:
+    """Row points -> {'timestamps': [epoch ms], column: [values]}; keys fixes the columns of empty series."""
+    if not points:
+        return {'timestamps': [], **{k: [] for k in keys or [] if k != 'timestamp'}}
+    names = list(keys or points[0])
+    # One C-level transpose of the rows instead of a Python lookup per value
+    getter = operator.itemgetter(*names) if len(names) > 1 else (lambda point: (point[names[0]],))
+    transposed = zip(*map(getter, points))
+    columns = {}
+    for name, values in zip(names, transposed):
+        if name == 'timestamp':
+            columns = {'timestamps': [_epoch_ms(value) for value in values], **columns}
+        else:
+            columns[name] = list(values)
+    return columns
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_json_default, separators=(',', ':')).encode()
+
+def _arrow(columns: Dict[str, List[Any]]) -> bytes:
+    arrays = [pyarrow.array(columns['timestamps'], type=pyarrow.timestamp('ms', tz='UTC'))]
+    arrays += [pyarrow.array(values, type=pyarrow.float64()) for key, values in columns.items() if key != 'timestamps']
+    batch = pyarrow.RecordBatch.from_arrays(arrays, names=list(columns))
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+def encode_points(points: Sequence[Dict[str, Any]], media_type: str, columnar: bool = False) -> bytes:
+    """Body of a single-series response in the negotiated media type."""
+    if media_type == ARROW:
+        return _arrow(to_columns(points))
+    if media_type == MSGPACK:
+        return msgpack.packb(to_columns(points))
+    return _dumps(to_columns(points) if columnar else list(points))
+
+def encode_series(series: Sequence[Dict[str, Any]], media_type: str, columnar: bool = False) -> bytes:
+    """Body of a batch response: each series' data as rows or columns (msgpack is always columnar)."""
+    if media_type == MSGPACK or columnar:
+        series = [{**item, 'data': to_columns(item['data'], item.get('columns'))} for item in series]
+    series = [{key: value for key, value in item.items() if key != 'columns'} for item in series]
+    if media_type == MSGPACK:
+        return msgpack.packb(series)
+    return _dumps(series)
@@ -0,0 +1,201 @@
+# backend/services/timeseries_service.py
+"""
+Downsampled device time series.
+
+Rows of device_data_historical are aggregated inside TimescaleDB with time_bucket(): every bucket carries
+the avg, min, max and last value of each requested metric, so the response size depends on the number of
+buckets, not on how many raw rows the range holds. `auto` picks the finest resolution that keeps the range
+under TIMESERIES_TARGET_POINTS buckets; explicit resolutions are refused above TIMESERIES_MAX_POINTS.
+
+Buckets of an hour or more are read from the coarsest continuous aggregate (device_data_hourly,
+device_data_daily) whose bucket divides the requested one; a month at 1h or a year at 1d then reads
+hundreds of rows per device instead of tens of thousands. Day buckets are local days in
+POLL_DEFAULT_TIMEZONE, like those of device_data_daily; shorter buckets are UTC based.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pytz
+from sqlalchemy import Float, text
+from sqlalchemy.orm import Session
+
+from ..config.settings import settings
+from ..models.device_data import DeviceDataHistorical
+
+TIME_RANGES = {
+    '1h': timedelta(hours=1),
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    '90d': timedelta(days=90),
+    '1y': timedelta(days=365),
+}
+
+# Finest first: auto walks this list until the bucket count fits
+RESOLUTIONS = {
+    '5m': timedelta(minutes=5),
+    '15m': timedelta(minutes=15),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+
+# Whitelist of metric names: the numeric columns, the only names ever formatted into the SQL
+NUMERIC_METRICS = tuple(c.name for c in DeviceDataHistorical.__table__.columns if isinstance(c.type, Float))
+
+# Columns of the continuous aggregates (see schema.sql), each with _min, _max and _last companions
+AGGREGATED_METRICS = frozenset(
+    [f"pv{i:02d}_{kind}" for i in range(1, 17) for kind in ('voltage', 'current')]
+    + ['r_voltage', 's_voltage', 't_voltage', 'r_current', 's_current', 't_current',
+       'rs_voltage', 'st_voltage', 'tr_voltage', 'total_power', 'reactive_power', 'energy_today',
+       'frequency', 'cuf', 'pr']
+)
+
+# Chart groups of the frontend spec (api-endpoints-detailed.md), expanded to their columns
+METRIC_GROUPS = {
+    'panel_voltages': [f"pv{i:02d}_voltage" for i in range(1, 17)],
+    'input_currents': [f"pv{i:02d}_current" for i in range(1, 17)],
+    'output_currents': ['r_current', 's_current', 't_current'],
+    'power_generation': ['total_power', 'energy_today'],
+}
+
+# Coarsest first
+CONTINUOUS_AGGREGATES = (
+    ('device_data_daily', timedelta(days=1)),
+    ('device_data_hourly', timedelta(hours=1)),
+)
+
+def parse_time_range(time_range: str) -> timedelta:
+    if time_range not in TIME_RANGES:
+        raise ValueError(f"Invalid timeRange (use {', '.join(TIME_RANGES)})")
+    return TIME_RANGES[time_range]
+
+def choose_resolution(resolution: str, span: timedelta) -> Tuple[str, timedelta]:
+    """(name, bucket) for the requested resolution over span."""
+    if resolution == 'auto':
+        target = int(settings.TIMESERIES_TARGET_POINTS)
+        for name, bucket in RESOLUTIONS.items():
+            if span / bucket <= target:
+                return name, bucket
+        return '1d', RESOLUTIONS['1d']
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Invalid resolution (use auto, {', '.join(RESOLUTIONS)})")
+    bucket = RESOLUTIONS[resolution]
+    if span / bucket > int(settings.TIMESERIES_MAX_POINTS):
+        raise ValueError(f"Resolution {resolution} is too fine for this timeRange (over {settings.TIMESERIES_MAX_POINTS} points)")
+    return resolution, bucket
+
+def resolve_metrics(metrics: Optional[Sequence[str]]) -> List[str]:
+    """Validated, de-duplicated metric columns in request order; every numeric column when none are given."""
+    if not metrics:
+        return list(NUMERIC_METRICS)
+    unknown = [m for m in metrics if m not in NUMERIC_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metric(s): {', '.join(unknown)}")
+    return list(dict.fromkeys(metrics))
+
+def pick_source(bucket: timedelta, metrics: Sequence[str]) -> str:
+    """The coarsest continuous aggregate that can serve `bucket` for these metrics, else the raw table."""
+    if all(metric in AGGREGATED_METRICS for metric in metrics):
+        for view, size in CONTINUOUS_AGGREGATES:
+            if bucket >= size and bucket % size == timedelta(0):
+                return view
+    return 'device_data_historical'
+
+def bucket_timezone(bucket: timedelta) -> Optional[str]:
+    """Zone whose midnights bound the buckets: days are local days (as in device_data_daily), shorter buckets UTC."""
+    return settings.POLL_DEFAULT_TIMEZONE if bucket >= RESOLUTIONS['1d'] else None
+
+def align(value: datetime, bucket: timedelta) -> datetime:
+    """Floors value to a bucket boundary (as time_bucket does for these sizes), so the first bucket is whole."""
+    zone = bucket_timezone(bucket)
+    if zone:
+        tz = pytz.timezone(zone)
+        local = value.astimezone(tz)
+        return tz.localize(datetime(local.year, local.month, local.day)).astimezone(timezone.utc)
+    seconds = bucket.total_seconds()
+    return datetime.fromtimestamp(value.timestamp() // seconds * seconds, timezone.utc)
+
+def downsample(db: Session, device_sns: Sequence[str], metrics: Sequence[str], start: datetime, end: datetime,
+               bucket: timedelta, source: str = 'device_data_historical') -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Points of every device in one query, {device_sn: points}. One point per non-empty bucket, oldest first:
+    {'timestamp', metric (avg), metric_min, metric_max, metric_last}. metrics must come from NUMERIC_METRICS.
+    On a continuous aggregate the stored buckets are re-bucketed: avg of averages (exact when the sizes
+    match), min of minimums, max of maximums, last of lasts.
+    """
+    aggregates = []
+    for metric in metrics:
+        if source == 'device_data_historical':
+            aggregates += [
+                f"avg({metric}) AS {metric}",
+                f"min({metric}) AS {metric}_min",
+                f"max({metric}) AS {metric}_max",
+                f"last({metric}, timestamp) AS {metric}_last",
+            ]
+        else:
+            aggregates += [
+                f"avg({metric}) AS {metric}",
+                f"min({metric}_min) AS {metric}_min",
+                f"max({metric}_max) AS {metric}_max",
+                f"last({metric}_last, timestamp) AS {metric}_last",
+            ]
+    zone = bucket_timezone(bucket)
+    bucketed = "time_bucket(:bucket, timestamp, :timezone)" if zone else "time_bucket(:bucket, timestamp)"
+    result = db.execute(
+        text(f"""
+            SELECT device_sn, {bucketed} AS bucket, {', '.join(aggregates)}
+            FROM {source}
+            WHERE device_sn = ANY(:device_sns) AND timestamp >= :start AND timestamp < :end
+            GROUP BY device_sn, bucket
+            ORDER BY device_sn, bucket
+        """),
+        {'bucket': bucket, 'timezone': zone, 'device_sns': list(device_sns), 'start': start, 'end': end}
+    )
+    # Plain tuples zipped with the column names: no ORM objects, no per-row mapping proxies
+    keys = ['timestamp' if key == 'bucket' else key for key in list(result.keys())[1:]]
+    points: Dict[str, List[Dict[str, Any]]] = {}
+    for row in result.fetchall():
+        points.setdefault(row[0], []).append(dict(zip(keys, row[1:])))
+    return points
+
+def get_device_timeseries(db: Session, device_sn: str, metrics: Optional[Sequence[str]], time_range: str,
+                          resolution: str = 'auto') -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    (resolution used, points) for the device over the last time_range, selecting only the given metric
+    columns (all numeric ones when empty). Raises ValueError on bad input.
+    """
+    span = parse_time_range(time_range)
+    name, bucket = choose_resolution(resolution, span)
+    metrics = resolve_metrics(metrics)
+    end = datetime.now(timezone.utc)
+    points = downsample(db, [device_sn], metrics, align(end - span, bucket), end, bucket, pick_source(bucket, metrics))
+    return name, points.get(device_sn, [])
+
+def get_batch_timeseries(db: Session, device_sns: Sequence[str], metrics: Sequence[str], time_range: str,
+                         resolution: str = 'auto') -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    (resolution used, series) for every device and metric in a single query. metrics are column names or
+    METRIC_GROUPS names; each series is {'device_sn', 'metric', 'columns', 'data'} with the columns of its metric only,
+    ordered by device then metric as requested. Raises ValueError on bad input.
+    """
+    if not device_sns or not metrics:
+        raise ValueError("At least one device and one metric are required")
+    if len(device_sns) > int(settings.TIMESERIES_BATCH_MAX_DEVICES):
+        raise ValueError(f"At most {settings.TIMESERIES_BATCH_MAX_DEVICES} devices per batch")
+    metrics = list(dict.fromkeys(metrics))
+    columns = {metric: resolve_metrics(METRIC_GROUPS.get(metric, [metric])) for metric in metrics}
+    selected = list(dict.fromkeys(column for group in columns.values() for column in group))
+
+    span = parse_time_range(time_range)
+    name, bucket = choose_resolution(resolution, span)
+    end = datetime.now(timezone.utc)
+    device_sns = list(dict.fromkeys(device_sns))
+    points = downsample(db, device_sns, selected, align(end - span, bucket), end, bucket, pick_source(bucket, selected))
+
+    series = []
+    for device_sn in device_sns:
+        for metric in metrics:
+            keys = ['timestamp'] + [f"{column}{suffix}" for column in columns[metric] for suffix in ('', '_min', '_max', '_last')]
+            data = [{key: point[key] for key in keys} for point in points.get(device_sn, [])]
+            series.append({'device_sn': device_sn, 'metric': metric, 'columns': keys, 'data': data})
+    return name, series
@@ -8,9 +8,14 @@ setup(
         'sqlalchemy==1.4.52',  # FIXED: Downgraded to match Airflow <2.0
         'psycopg2-binary==2.9.9',
         'requests==2.32.3',
+        'httpx==0.27.0',
+        'numpy==1.26.4',
         'tenacity==8.2.3',
+        'redis==5.0.1',
+        'cryptography',  # Fernet for the provider token cache
         'pydantic==2.5.0',
         'pydantic-settings',  # For BaseSettings
+        'prometheus-client==0.20.0',  # ETL metrics pushed to PROMETHEUS_PUSHGATEWAY_URL
         # Add others from requirements.txt if needed
     ],
 )
\ No newline at end of file
@@ -2,9 +2,19 @@ import axios, { AxiosResponse } from 'axios';
 
 const API_BASE_URL = '/api';  // Proxy to backend (live calls)
 
-interface TimeSeriesData {
+// One bucket of a downsampled series: avg under each column name, plus <column>_min, _max and _last
+interface TimeSeriesPoint {
     timestamp: string;
-    value: number;
+    [column: string]: number | string | null;
+}
+
+// One series of POST /dashboard/timeseries/batch (rows layout)
+interface TimeSeriesSeries {
+    deviceId: string;
+    metric: string;
+    timeRange: string;
+    resolution: string;
+    data: TimeSeriesPoint[];
 }
 
 interface User {
@@ -120,11 +130,11 @@ class ApiClient {
         }
     }
 
-    async getMultipleTimeSeriesData(deviceId: string, metrics: string[], timeRange: string): Promise<TimeSeriesData[]> {
+    async getMultipleTimeSeriesData(deviceId: string, metrics: string[], timeRange: string): Promise<TimeSeriesSeries[]> {
         try {
-            const response = await this.api.get(`/dashboard/timeseries/${deviceId}`, {
-                params: { metrics: metrics.join(','), timeRange }
-            });
+            const response = await this.api.post('/dashboard/timeseries/batch', {
+                deviceIds: [deviceId], metrics, timeRange
+            });  // One request for every chart of the device
             return response.data;
         } catch (error: any) {
             console.error('Error fetching time series data:', error.message, error.response?.data || error);
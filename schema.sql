@@ -4,11 +4,17 @@
 
 -- Drop existing (for dev reset; comment in prod)
 DROP MATERIALIZED VIEW IF EXISTS customer_metrics;
+DROP MATERIALIZED VIEW IF EXISTS device_data_hourly;
+DROP MATERIALIZED VIEW IF EXISTS device_data_daily;
 DROP TABLE IF EXISTS error_logs CASCADE;
 DROP TABLE IF EXISTS device_data_historical CASCADE;
 DROP TABLE IF EXISTS predictions CASCADE;
 DROP TABLE IF EXISTS fault_logs CASCADE;
 DROP TABLE IF EXISTS weather_data CASCADE;
+DROP TABLE IF EXISTS device_watermarks CASCADE;
+DROP TABLE IF EXISTS device_poll_schedule CASCADE;
+DROP TABLE IF EXISTS backfill_jobs CASCADE;
+DROP TABLE IF EXISTS etl_telemetry CASCADE;
 DROP TABLE IF EXISTS devices CASCADE;
 DROP TABLE IF EXISTS plants CASCADE;
 DROP TABLE IF EXISTS api_credentials CASCADE;
@@ -160,6 +166,58 @@ ALTER TABLE devices ENABLE ROW LEVEL SECURITY;
 CREATE POLICY device_policy ON devices
     USING (plant_id IN (SELECT plant_id FROM plants WHERE customer_id = current_setting('app.current_customer_id')::TEXT));
 
+-- Create device_watermarks table (newest stored timestamp per device; drives incremental historical fetches)
+CREATE TABLE device_watermarks (
+    device_sn TEXT PRIMARY KEY,
+    api_provider api_provider_type NOT NULL,
+    last_timestamp TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    FOREIGN KEY (device_sn) REFERENCES devices(device_sn) ON DELETE CASCADE
+);
+CREATE INDEX idx_device_watermarks_last_timestamp ON device_watermarks(last_timestamp);
+
+-- Create device_poll_schedule table (next poll per device and fetch kind; see services/etl/poll_scheduler.py)
+CREATE TABLE device_poll_schedule (
+    device_sn TEXT NOT NULL,
+    historical BOOLEAN NOT NULL,
+    api_provider api_provider_type NOT NULL,
+    next_poll_at TIMESTAMPTZ NOT NULL,
+    poll_mode TEXT NOT NULL CHECK (poll_mode IN ('active', 'night', 'offline')),
+    last_data_timestamp TIMESTAMP,
+    last_reported_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (device_sn, historical),
+    FOREIGN KEY (device_sn) REFERENCES devices(device_sn) ON DELETE CASCADE
+);
+CREATE INDEX idx_device_poll_schedule_next_poll ON device_poll_schedule(next_poll_at);
+
+-- Create backfill_jobs table (one shard per device and day; see services/etl/backfill.py)
+CREATE TABLE backfill_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    credential_id INTEGER NOT NULL,
+    api_provider api_provider_type NOT NULL,
+    customer_id TEXT NOT NULL,
+    plant_id TEXT NOT NULL,
+    device_sn TEXT NOT NULL,
+    device JSONB NOT NULL,  -- Provider device record the fetch needs (ids, devcode, ...)
+    day DATE NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),  -- Retry delay after a failed attempt
+    locked_by TEXT,
+    locked_at TIMESTAMPTZ,
+    rows_inserted INTEGER,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (device_sn, day),
+    FOREIGN KEY (credential_id) REFERENCES api_credentials(credential_id) ON DELETE CASCADE,
+    FOREIGN KEY (customer_id) REFERENCES customers(customer_id) ON DELETE CASCADE
+);
+CREATE INDEX idx_backfill_jobs_claim ON backfill_jobs(day, job_id) WHERE status IN ('pending', 'running');
+CREATE INDEX idx_backfill_jobs_batch_id ON backfill_jobs(batch_id);
+
 -- Create weather_data table
 CREATE TABLE weather_data (
     plant_id TEXT NOT NULL,
@@ -218,6 +276,14 @@ CREATE TABLE device_data_historical (
     pv11_current DOUBLE PRECISION CHECK (pv11_current >= 0 AND pv11_current <= 20),
     pv12_voltage DOUBLE PRECISION CHECK (pv12_voltage >= 0 AND pv12_voltage <= 1000),
     pv12_current DOUBLE PRECISION CHECK (pv12_current >= 0 AND pv12_current <= 20),
+    pv13_voltage DOUBLE PRECISION CHECK (pv13_voltage >= 0 AND pv13_voltage <= 1000),
+    pv13_current DOUBLE PRECISION CHECK (pv13_current >= 0 AND pv13_current <= 20),
+    pv14_voltage DOUBLE PRECISION CHECK (pv14_voltage >= 0 AND pv14_voltage <= 1000),
+    pv14_current DOUBLE PRECISION CHECK (pv14_current >= 0 AND pv14_current <= 20),
+    pv15_voltage DOUBLE PRECISION CHECK (pv15_voltage >= 0 AND pv15_voltage <= 1000),
+    pv15_current DOUBLE PRECISION CHECK (pv15_current >= 0 AND pv15_current <= 20),
+    pv16_voltage DOUBLE PRECISION CHECK (pv16_voltage >= 0 AND pv16_voltage <= 1000),
+    pv16_current DOUBLE PRECISION CHECK (pv16_current >= 0 AND pv16_current <= 20),
     r_voltage DOUBLE PRECISION CHECK (r_voltage >= 0 AND r_voltage <= 325),
     s_voltage DOUBLE PRECISION CHECK (s_voltage >= 0 AND s_voltage <= 325),
     t_voltage DOUBLE PRECISION CHECK (t_voltage >= 0 AND t_voltage <= 325),
@@ -349,6 +415,43 @@ ALTER TABLE error_logs ENABLE ROW LEVEL SECURITY;
 CREATE POLICY error_policy ON error_logs
     USING (customer_id = current_setting('app.current_customer_id')::TEXT);
 
+-- Create etl_telemetry table (per run, credential, endpoint and device numbers; see services/etl/telemetry.py)
+CREATE TABLE etl_telemetry (
+    time TIMESTAMPTZ NOT NULL,
+    run_id TEXT NOT NULL,
+    scope TEXT NOT NULL CHECK (scope IN ('run', 'credential', 'endpoint', 'device')),
+    historical BOOLEAN NOT NULL,
+    api_provider TEXT,
+    credential_id INT,
+    device_sn TEXT,
+    endpoint TEXT,
+    api_calls INT NOT NULL DEFAULT 0,
+    api_errors INT NOT NULL DEFAULT 0,
+    retries INT NOT NULL DEFAULT 0,
+    rows_fetched INT NOT NULL DEFAULT 0,
+    rows_normalized INT NOT NULL DEFAULT 0,
+    rows_inserted INT NOT NULL DEFAULT 0,
+    rows_duplicate INT NOT NULL DEFAULT 0,
+    rows_rejected INT NOT NULL DEFAULT 0,
+    api_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    fetch_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    normalize_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    write_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    api_max_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    duration_seconds DOUBLE PRECISION,
+    failed BOOLEAN NOT NULL DEFAULT FALSE
+);
+SELECT create_hypertable('etl_telemetry', 'time', if_not_exists => TRUE);
+ALTER TABLE etl_telemetry SET (
+    timescaledb.compress,
+    timescaledb.compress_orderby = 'time DESC',
+    timescaledb.compress_segmentby = 'scope'
+);
+SELECT add_compression_policy('etl_telemetry', INTERVAL '7 days');
+SELECT add_retention_policy('etl_telemetry', INTERVAL '90 days');
+CREATE INDEX idx_etl_telemetry_run_id_time ON etl_telemetry (run_id, time DESC);
+CREATE INDEX idx_etl_telemetry_credential_id_time ON etl_telemetry (credential_id, time DESC);
+
 -- Continuous aggregate for customer_metrics (after tables)
 CREATE MATERIALIZED VIEW customer_metrics WITH (timescaledb.continuous) AS
 SELECT 
@@ -367,6 +470,131 @@ SELECT add_continuous_aggregate_policy('customer_metrics',
     end_offset => INTERVAL '1 day',
     schedule_interval => INTERVAL '1 hour');
 
+-- Hourly and daily continuous aggregates of every numeric column (avg under the column name, plus _min,
+-- _max and _last). Daily buckets are local days; their zone must match POLL_DEFAULT_TIMEZONE, which
+-- timeseries_service uses to re-bucket them. Dashboard timeseries read from the coarsest one that fits
+-- the requested resolution (services/timeseries_service.py); backfills refresh them for their days.
+-- The current bucket is aggregated on the fly (materialized_only = false).
+CREATE MATERIALIZED VIEW device_data_hourly WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    device_sn,
+    time_bucket('1 hour', timestamp) AS timestamp,
+    COUNT(*) AS samples,
+    AVG(pv01_voltage) AS pv01_voltage, MIN(pv01_voltage) AS pv01_voltage_min, MAX(pv01_voltage) AS pv01_voltage_max, LAST(pv01_voltage, timestamp) AS pv01_voltage_last,
+    AVG(pv01_current) AS pv01_current, MIN(pv01_current) AS pv01_current_min, MAX(pv01_current) AS pv01_current_max, LAST(pv01_current, timestamp) AS pv01_current_last,
+    AVG(pv02_voltage) AS pv02_voltage, MIN(pv02_voltage) AS pv02_voltage_min, MAX(pv02_voltage) AS pv02_voltage_max, LAST(pv02_voltage, timestamp) AS pv02_voltage_last,
+    AVG(pv02_current) AS pv02_current, MIN(pv02_current) AS pv02_current_min, MAX(pv02_current) AS pv02_current_max, LAST(pv02_current, timestamp) AS pv02_current_last,
+    AVG(pv03_voltage) AS pv03_voltage, MIN(pv03_voltage) AS pv03_voltage_min, MAX(pv03_voltage) AS pv03_voltage_max, LAST(pv03_voltage, timestamp) AS pv03_voltage_last,
+    AVG(pv03_current) AS pv03_current, MIN(pv03_current) AS pv03_current_min, MAX(pv03_current) AS pv03_current_max, LAST(pv03_current, timestamp) AS pv03_current_last,
+    AVG(pv04_voltage) AS pv04_voltage, MIN(pv04_voltage) AS pv04_voltage_min, MAX(pv04_voltage) AS pv04_voltage_max, LAST(pv04_voltage, timestamp) AS pv04_voltage_last,
+    AVG(pv04_current) AS pv04_current, MIN(pv04_current) AS pv04_current_min, MAX(pv04_current) AS pv04_current_max, LAST(pv04_current, timestamp) AS pv04_current_last,
+    AVG(pv05_voltage) AS pv05_voltage, MIN(pv05_voltage) AS pv05_voltage_min, MAX(pv05_voltage) AS pv05_voltage_max, LAST(pv05_voltage, timestamp) AS pv05_voltage_last,
+    AVG(pv05_current) AS pv05_current, MIN(pv05_current) AS pv05_current_min, MAX(pv05_current) AS pv05_current_max, LAST(pv05_current, timestamp) AS pv05_current_last,
+    AVG(pv06_voltage) AS pv06_voltage, MIN(pv06_voltage) AS pv06_voltage_min, MAX(pv06_voltage) AS pv06_voltage_max, LAST(pv06_voltage, timestamp) AS pv06_voltage_last,
+    AVG(pv06_current) AS pv06_current, MIN(pv06_current) AS pv06_current_min, MAX(pv06_current) AS pv06_current_max, LAST(pv06_current, timestamp) AS pv06_current_last,
+    AVG(pv07_voltage) AS pv07_voltage, MIN(pv07_voltage) AS pv07_voltage_min, MAX(pv07_voltage) AS pv07_voltage_max, LAST(pv07_voltage, timestamp) AS pv07_voltage_last,
+    AVG(pv07_current) AS pv07_current, MIN(pv07_current) AS pv07_current_min, MAX(pv07_current) AS pv07_current_max, LAST(pv07_current, timestamp) AS pv07_current_last,
+    AVG(pv08_voltage) AS pv08_voltage, MIN(pv08_voltage) AS pv08_voltage_min, MAX(pv08_voltage) AS pv08_voltage_max, LAST(pv08_voltage, timestamp) AS pv08_voltage_last,
+    AVG(pv08_current) AS pv08_current, MIN(pv08_current) AS pv08_current_min, MAX(pv08_current) AS pv08_current_max, LAST(pv08_current, timestamp) AS pv08_current_last,
+    AVG(pv09_voltage) AS pv09_voltage, MIN(pv09_voltage) AS pv09_voltage_min, MAX(pv09_voltage) AS pv09_voltage_max, LAST(pv09_voltage, timestamp) AS pv09_voltage_last,
+    AVG(pv09_current) AS pv09_current, MIN(pv09_current) AS pv09_current_min, MAX(pv09_current) AS pv09_current_max, LAST(pv09_current, timestamp) AS pv09_current_last,
+    AVG(pv10_voltage) AS pv10_voltage, MIN(pv10_voltage) AS pv10_voltage_min, MAX(pv10_voltage) AS pv10_voltage_max, LAST(pv10_voltage, timestamp) AS pv10_voltage_last,
+    AVG(pv10_current) AS pv10_current, MIN(pv10_current) AS pv10_current_min, MAX(pv10_current) AS pv10_current_max, LAST(pv10_current, timestamp) AS pv10_current_last,
+    AVG(pv11_voltage) AS pv11_voltage, MIN(pv11_voltage) AS pv11_voltage_min, MAX(pv11_voltage) AS pv11_voltage_max, LAST(pv11_voltage, timestamp) AS pv11_voltage_last,
+    AVG(pv11_current) AS pv11_current, MIN(pv11_current) AS pv11_current_min, MAX(pv11_current) AS pv11_current_max, LAST(pv11_current, timestamp) AS pv11_current_last,
+    AVG(pv12_voltage) AS pv12_voltage, MIN(pv12_voltage) AS pv12_voltage_min, MAX(pv12_voltage) AS pv12_voltage_max, LAST(pv12_voltage, timestamp) AS pv12_voltage_last,
+    AVG(pv12_current) AS pv12_current, MIN(pv12_current) AS pv12_current_min, MAX(pv12_current) AS pv12_current_max, LAST(pv12_current, timestamp) AS pv12_current_last,
+    AVG(pv13_voltage) AS pv13_voltage, MIN(pv13_voltage) AS pv13_voltage_min, MAX(pv13_voltage) AS pv13_voltage_max, LAST(pv13_voltage, timestamp) AS pv13_voltage_last,
+    AVG(pv13_current) AS pv13_current, MIN(pv13_current) AS pv13_current_min, MAX(pv13_current) AS pv13_current_max, LAST(pv13_current, timestamp) AS pv13_current_last,
+    AVG(pv14_voltage) AS pv14_voltage, MIN(pv14_voltage) AS pv14_voltage_min, MAX(pv14_voltage) AS pv14_voltage_max, LAST(pv14_voltage, timestamp) AS pv14_voltage_last,
+    AVG(pv14_current) AS pv14_current, MIN(pv14_current) AS pv14_current_min, MAX(pv14_current) AS pv14_current_max, LAST(pv14_current, timestamp) AS pv14_current_last,
+    AVG(pv15_voltage) AS pv15_voltage, MIN(pv15_voltage) AS pv15_voltage_min, MAX(pv15_voltage) AS pv15_voltage_max, LAST(pv15_voltage, timestamp) AS pv15_voltage_last,
+    AVG(pv15_current) AS pv15_current, MIN(pv15_current) AS pv15_current_min, MAX(pv15_current) AS pv15_current_max, LAST(pv15_current, timestamp) AS pv15_current_last,
+    AVG(pv16_voltage) AS pv16_voltage, MIN(pv16_voltage) AS pv16_voltage_min, MAX(pv16_voltage) AS pv16_voltage_max, LAST(pv16_voltage, timestamp) AS pv16_voltage_last,
+    AVG(pv16_current) AS pv16_current, MIN(pv16_current) AS pv16_current_min, MAX(pv16_current) AS pv16_current_max, LAST(pv16_current, timestamp) AS pv16_current_last,
+    AVG(r_voltage) AS r_voltage, MIN(r_voltage) AS r_voltage_min, MAX(r_voltage) AS r_voltage_max, LAST(r_voltage, timestamp) AS r_voltage_last,
+    AVG(s_voltage) AS s_voltage, MIN(s_voltage) AS s_voltage_min, MAX(s_voltage) AS s_voltage_max, LAST(s_voltage, timestamp) AS s_voltage_last,
+    AVG(t_voltage) AS t_voltage, MIN(t_voltage) AS t_voltage_min, MAX(t_voltage) AS t_voltage_max, LAST(t_voltage, timestamp) AS t_voltage_last,
+    AVG(r_current) AS r_current, MIN(r_current) AS r_current_min, MAX(r_current) AS r_current_max, LAST(r_current, timestamp) AS r_current_last,
+    AVG(s_current) AS s_current, MIN(s_current) AS s_current_min, MAX(s_current) AS s_current_max, LAST(s_current, timestamp) AS s_current_last,
+    AVG(t_current) AS t_current, MIN(t_current) AS t_current_min, MAX(t_current) AS t_current_max, LAST(t_current, timestamp) AS t_current_last,
+    AVG(rs_voltage) AS rs_voltage, MIN(rs_voltage) AS rs_voltage_min, MAX(rs_voltage) AS rs_voltage_max, LAST(rs_voltage, timestamp) AS rs_voltage_last,
+    AVG(st_voltage) AS st_voltage, MIN(st_voltage) AS st_voltage_min, MAX(st_voltage) AS st_voltage_max, LAST(st_voltage, timestamp) AS st_voltage_last,
+    AVG(tr_voltage) AS tr_voltage, MIN(tr_voltage) AS tr_voltage_min, MAX(tr_voltage) AS tr_voltage_max, LAST(tr_voltage, timestamp) AS tr_voltage_last,
+    AVG(total_power) AS total_power, MIN(total_power) AS total_power_min, MAX(total_power) AS total_power_max, LAST(total_power, timestamp) AS total_power_last,
+    AVG(reactive_power) AS reactive_power, MIN(reactive_power) AS reactive_power_min, MAX(reactive_power) AS reactive_power_max, LAST(reactive_power, timestamp) AS reactive_power_last,
+    AVG(energy_today) AS energy_today, MIN(energy_today) AS energy_today_min, MAX(energy_today) AS energy_today_max, LAST(energy_today, timestamp) AS energy_today_last,
+    AVG(frequency) AS frequency, MIN(frequency) AS frequency_min, MAX(frequency) AS frequency_max, LAST(frequency, timestamp) AS frequency_last,
+    AVG(cuf) AS cuf, MIN(cuf) AS cuf_min, MAX(cuf) AS cuf_max, LAST(cuf, timestamp) AS cuf_last,
+    AVG(pr) AS pr, MIN(pr) AS pr_min, MAX(pr) AS pr_max, LAST(pr, timestamp) AS pr_last
+FROM device_data_historical
+GROUP BY device_sn, time_bucket('1 hour', timestamp);
+SELECT add_continuous_aggregate_policy('device_data_hourly',
+    start_offset => INTERVAL '3 days',
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '30 minutes');
+CREATE INDEX idx_device_data_hourly_device_sn_timestamp ON device_data_hourly (device_sn, timestamp DESC);
+
+CREATE MATERIALIZED VIEW device_data_daily WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    device_sn,
+    time_bucket('1 day', timestamp, 'Asia/Kolkata') AS timestamp,
+    COUNT(*) AS samples,
+    AVG(pv01_voltage) AS pv01_voltage, MIN(pv01_voltage) AS pv01_voltage_min, MAX(pv01_voltage) AS pv01_voltage_max, LAST(pv01_voltage, timestamp) AS pv01_voltage_last,
+    AVG(pv01_current) AS pv01_current, MIN(pv01_current) AS pv01_current_min, MAX(pv01_current) AS pv01_current_max, LAST(pv01_current, timestamp) AS pv01_current_last,
+    AVG(pv02_voltage) AS pv02_voltage, MIN(pv02_voltage) AS pv02_voltage_min, MAX(pv02_voltage) AS pv02_voltage_max, LAST(pv02_voltage, timestamp) AS pv02_voltage_last,
+    AVG(pv02_current) AS pv02_current, MIN(pv02_current) AS pv02_current_min, MAX(pv02_current) AS pv02_current_max, LAST(pv02_current, timestamp) AS pv02_current_last,
+    AVG(pv03_voltage) AS pv03_voltage, MIN(pv03_voltage) AS pv03_voltage_min, MAX(pv03_voltage) AS pv03_voltage_max, LAST(pv03_voltage, timestamp) AS pv03_voltage_last,
+    AVG(pv03_current) AS pv03_current, MIN(pv03_current) AS pv03_current_min, MAX(pv03_current) AS pv03_current_max, LAST(pv03_current, timestamp) AS pv03_current_last,
+    AVG(pv04_voltage) AS pv04_voltage, MIN(pv04_voltage) AS pv04_voltage_min, MAX(pv04_voltage) AS pv04_voltage_max, LAST(pv04_voltage, timestamp) AS pv04_voltage_last,
+    AVG(pv04_current) AS pv04_current, MIN(pv04_current) AS pv04_current_min, MAX(pv04_current) AS pv04_current_max, LAST(pv04_current, timestamp) AS pv04_current_last,
+    AVG(pv05_voltage) AS pv05_voltage, MIN(pv05_voltage) AS pv05_voltage_min, MAX(pv05_voltage) AS pv05_voltage_max, LAST(pv05_voltage, timestamp) AS pv05_voltage_last,
+    AVG(pv05_current) AS pv05_current, MIN(pv05_current) AS pv05_current_min, MAX(pv05_current) AS pv05_current_max, LAST(pv05_current, timestamp) AS pv05_current_last,
+    AVG(pv06_voltage) AS pv06_voltage, MIN(pv06_voltage) AS pv06_voltage_min, MAX(pv06_voltage) AS pv06_voltage_max, LAST(pv06_voltage, timestamp) AS pv06_voltage_last,
+    AVG(pv06_current) AS pv06_current, MIN(pv06_current) AS pv06_current_min, MAX(pv06_current) AS pv06_current_max, LAST(pv06_current, timestamp) AS pv06_current_last,
+    AVG(pv07_voltage) AS pv07_voltage, MIN(pv07_voltage) AS pv07_voltage_min, MAX(pv07_voltage) AS pv07_voltage_max, LAST(pv07_voltage, timestamp) AS pv07_voltage_last,
+    AVG(pv07_current) AS pv07_current, MIN(pv07_current) AS pv07_current_min, MAX(pv07_current) AS pv07_current_max, LAST(pv07_current, timestamp) AS pv07_current_last,
+    AVG(pv08_voltage) AS pv08_voltage, MIN(pv08_voltage) AS pv08_voltage_min, MAX(pv08_voltage) AS pv08_voltage_max, LAST(pv08_voltage, timestamp) AS pv08_voltage_last,
+    AVG(pv08_current) AS pv08_current, MIN(pv08_current) AS pv08_current_min, MAX(pv08_current) AS pv08_current_max, LAST(pv08_current, timestamp) AS pv08_current_last,
+    AVG(pv09_voltage) AS pv09_voltage, MIN(pv09_voltage) AS pv09_voltage_min, MAX(pv09_voltage) AS pv09_voltage_max, LAST(pv09_voltage, timestamp) AS pv09_voltage_last,
+    AVG(pv09_current) AS pv09_current, MIN(pv09_current) AS pv09_current_min, MAX(pv09_current) AS pv09_current_max, LAST(pv09_current, timestamp) AS pv09_current_last,
+    AVG(pv10_voltage) AS pv10_voltage, MIN(pv10_voltage) AS pv10_voltage_min, MAX(pv10_voltage) AS pv10_voltage_max, LAST(pv10_voltage, timestamp) AS pv10_voltage_last,
+    AVG(pv10_current) AS pv10_current, MIN(pv10_current) AS pv10_current_min, MAX(pv10_current) AS pv10_current_max, LAST(pv10_current, timestamp) AS pv10_current_last,
+    AVG(pv11_voltage) AS pv11_voltage, MIN(pv11_voltage) AS pv11_voltage_min, MAX(pv11_voltage) AS pv11_voltage_max, LAST(pv11_voltage, timestamp) AS pv11_voltage_last,
+    AVG(pv11_current) AS pv11_current, MIN(pv11_current) AS pv11_current_min, MAX(pv11_current) AS pv11_current_max, LAST(pv11_current, timestamp) AS pv11_current_last,
+    AVG(pv12_voltage) AS pv12_voltage, MIN(pv12_voltage) AS pv12_voltage_min, MAX(pv12_voltage) AS pv12_voltage_max, LAST(pv12_voltage, timestamp) AS pv12_voltage_last,
+    AVG(pv12_current) AS pv12_current, MIN(pv12_current) AS pv12_current_min, MAX(pv12_current) AS pv12_current_max, LAST(pv12_current, timestamp) AS pv12_current_last,
+    AVG(pv13_voltage) AS pv13_voltage, MIN(pv13_voltage) AS pv13_voltage_min, MAX(pv13_voltage) AS pv13_voltage_max, LAST(pv13_voltage, timestamp) AS pv13_voltage_last,
+    AVG(pv13_current) AS pv13_current, MIN(pv13_current) AS pv13_current_min, MAX(pv13_current) AS pv13_current_max, LAST(pv13_current, timestamp) AS pv13_current_last,
+    AVG(pv14_voltage) AS pv14_voltage, MIN(pv14_voltage) AS pv14_voltage_min, MAX(pv14_voltage) AS pv14_voltage_max, LAST(pv14_voltage, timestamp) AS pv14_voltage_last,
+    AVG(pv14_current) AS pv14_current, MIN(pv14_current) AS pv14_current_min, MAX(pv14_current) AS pv14_current_max, LAST(pv14_current, timestamp) AS pv14_current_last,
+    AVG(pv15_voltage) AS pv15_voltage, MIN(pv15_voltage) AS pv15_voltage_min, MAX(pv15_voltage) AS pv15_voltage_max, LAST(pv15_voltage, timestamp) AS pv15_voltage_last,
+    AVG(pv15_current) AS pv15_current, MIN(pv15_current) AS pv15_current_min, MAX(pv15_current) AS pv15_current_max, LAST(pv15_current, timestamp) AS pv15_current_last,
+    AVG(pv16_voltage) AS pv16_voltage, MIN(pv16_voltage) AS pv16_voltage_min, MAX(pv16_voltage) AS pv16_voltage_max, LAST(pv16_voltage, timestamp) AS pv16_voltage_last,
+    AVG(pv16_current) AS pv16_current, MIN(pv16_current) AS pv16_current_min, MAX(pv16_current) AS pv16_current_max, LAST(pv16_current, timestamp) AS pv16_current_last,
+    AVG(r_voltage) AS r_voltage, MIN(r_voltage) AS r_voltage_min, MAX(r_voltage) AS r_voltage_max, LAST(r_voltage, timestamp) AS r_voltage_last,
+    AVG(s_voltage) AS s_voltage, MIN(s_voltage) AS s_voltage_min, MAX(s_voltage) AS s_voltage_max, LAST(s_voltage, timestamp) AS s_voltage_last,
+    AVG(t_voltage) AS t_voltage, MIN(t_voltage) AS t_voltage_min, MAX(t_voltage) AS t_voltage_max, LAST(t_voltage, timestamp) AS t_voltage_last,
+    AVG(r_current) AS r_current, MIN(r_current) AS r_current_min, MAX(r_current) AS r_current_max, LAST(r_current, timestamp) AS r_current_last,
+    AVG(s_current) AS s_current, MIN(s_current) AS s_current_min, MAX(s_current) AS s_current_max, LAST(s_current, timestamp) AS s_current_last,
+    AVG(t_current) AS t_current, MIN(t_current) AS t_current_min, MAX(t_current) AS t_current_max, LAST(t_current, timestamp) AS t_current_last,
+    AVG(rs_voltage) AS rs_voltage, MIN(rs_voltage) AS rs_voltage_min, MAX(rs_voltage) AS rs_voltage_max, LAST(rs_voltage, timestamp) AS rs_voltage_last,
+    AVG(st_voltage) AS st_voltage, MIN(st_voltage) AS st_voltage_min, MAX(st_voltage) AS st_voltage_max, LAST(st_voltage, timestamp) AS st_voltage_last,
+    AVG(tr_voltage) AS tr_voltage, MIN(tr_voltage) AS tr_voltage_min, MAX(tr_voltage) AS tr_voltage_max, LAST(tr_voltage, timestamp) AS tr_voltage_last,
+    AVG(total_power) AS total_power, MIN(total_power) AS total_power_min, MAX(total_power) AS total_power_max, LAST(total_power, timestamp) AS total_power_last,
+    AVG(reactive_power) AS reactive_power, MIN(reactive_power) AS reactive_power_min, MAX(reactive_power) AS reactive_power_max, LAST(reactive_power, timestamp) AS reactive_power_last,
+    AVG(energy_today) AS energy_today, MIN(energy_today) AS energy_today_min, MAX(energy_today) AS energy_today_max, LAST(energy_today, timestamp) AS energy_today_last,
+    AVG(frequency) AS frequency, MIN(frequency) AS frequency_min, MAX(frequency) AS frequency_max, LAST(frequency, timestamp) AS frequency_last,
+    AVG(cuf) AS cuf, MIN(cuf) AS cuf_min, MAX(cuf) AS cuf_max, LAST(cuf, timestamp) AS cuf_last,
+    AVG(pr) AS pr, MIN(pr) AS pr_min, MAX(pr) AS pr_max, LAST(pr, timestamp) AS pr_last
+FROM device_data_historical
+GROUP BY device_sn, time_bucket('1 day', timestamp, 'Asia/Kolkata');
+SELECT add_continuous_aggregate_policy('device_data_daily',
+    start_offset => INTERVAL '4 days',
+    end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour');
+CREATE INDEX idx_device_data_daily_device_sn_timestamp ON device_data_daily (device_sn, timestamp DESC);
+
 -- Trigger function (unchanged)
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
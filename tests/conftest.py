@@ -0,0 +1,40 @@
+import pytest
+
+from backend.services.etl import pipeline
+
+class FakeResult:
+    def keys(self):
+        return ['device_sn', 'bucket']
+
+    def fetchall(self):
+        return []
+
+class FakeSession:
+    """Records the statements instead of running them."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return FakeResult()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    @property
+    def watermarks(self):
+        return [params['last_timestamp'] for sql, params in self.statements if 'device_watermarks' in sql]
+
+@pytest.fixture
+def session():
+    return FakeSession()
+
+@pytest.fixture
+def written(monkeypatch):
+    """Replaces the database write with one that inserts every normalized row."""
+    counts = lambda session, normalized, *args, **kwargs: {'inserted': len(normalized), 'duplicates': 0, 'rejected': 0}
+    monkeypatch.setattr(pipeline, "insert_data_to_db", counts)
@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+
+from backend.services.etl.backfill import BackfillWorker
+from backend.services.providers.errors import ProviderDayError
+from backend.services.providers.rate_limiter import ProviderThrottled
+from backend.services.providers.soliscloud_client import SolisCloudAPI
+
+DEVICE = {"id": "1001", "sn": "SC0001"}
+
+def inverter_day_page(page_no, total):
+    records = [{"dataTimestamp": str(1714521600000 + (page_no * 100 + n) * 300000), "pac": 1.0} for n in range(100)]
+    return {"data": {"page": {"records": records, "total": total}}}
+
+def soliscloud(monkeypatch, responses):
+    client = SolisCloudAPI(api_key="key", api_secret="secret", base_url="http://soliscloud.invalid")
+    monkeypatch.setattr(client, "make_request", lambda method, endpoint, payload=None: responses[payload["pageNo"]])
+    monkeypatch.setattr(client, "_station_time_zone", lambda user_id, station_id: 5.5)
+    return client
+
+def worker_for(client):
+    worker = BackfillWorker()
+    worker._credentials[1] = {"credential_id": 1, "user_id": "user", "api_provider": "soliscloud", "customer_id": "CUST"}
+    worker._local.clients = {1: client}
+    return worker
+
+JOB = {"job_id": 1, "credential_id": 1, "api_provider": "soliscloud", "customer_id": "CUST", "plant_id": "P1",
+       "device_sn": DEVICE["sn"], "device": DEVICE, "day": date(2024, 5, 1), "attempts": 1}
+
+pytestmark = pytest.mark.usefixtures("written")
+
+def test_shard_raises_when_a_page_of_its_day_fails(monkeypatch, session):
+    # Page 2 of 2 fails: the shard must go back to pending, not be checkpointed as done
+    worker = worker_for(soliscloud(monkeypatch, {1: inverter_day_page(1, 200), 2: None}))
+    with pytest.raises(ProviderDayError) as failure:
+        worker._run_shard(session, JOB)
+    assert failure.value.day == "2024-05-01"
+
+def test_shard_counts_every_page_of_its_day(monkeypatch, session):
+    worker = worker_for(soliscloud(monkeypatch, {1: inverter_day_page(1, 200), 2: inverter_day_page(2, 200)}))
+    assert worker._run_shard(session, JOB) == 200
+
+def test_shard_raises_when_its_day_stays_throttled(monkeypatch, session):
+    # Page 2 is still throttled after the client's retries
+    def inverter_day(method, endpoint, payload=None):
+        if payload["pageNo"] == 2:
+            raise ProviderThrottled("soliscloud throttled the request (status=429, message=None)")
+        return inverter_day_page(1, 200)
+    client = soliscloud(monkeypatch, {})
+    monkeypatch.setattr(client, "make_request", inverter_day)
+    with pytest.raises(ProviderDayError) as failure:
+        worker_for(client)._run_shard(session, JOB)
+    assert failure.value.day == "2024-05-01"
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import psycopg2
+import pytest
+
+from backend.services.etl import etl_service
+from backend.services.etl.etl_service import insert_data_to_db
+from backend.services.etl.normalizer import normalize_batch
+
+DEVICE_DATA_COLUMN = {column: index for index, column in enumerate(etl_service.DEVICE_DATA_COLUMNS)}
+
+class FakeCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+    def close(self):
+        pass
+
+class TableSession:
+    """A session over one in-memory table keyed like the hypertable, by (device_sn, timestamp)."""
+
+    def __init__(self, existing=()):
+        self.keys = set(existing)
+        self.statements = []
+        self.commits = 0
+
+    def connection(self):
+        # session.connection().connection is the raw DBAPI connection
+        return SimpleNamespace(connection=SimpleNamespace(cursor=lambda: FakeCursor(self.statements)))
+
+    def commit(self):
+        self.commits += 1
+
+@pytest.fixture
+def table(monkeypatch):
+    session = TableSession(existing={("D1", "2024-05-01 12:05:00")})
+
+    def write_batch(cursor, table_name, rows, method):
+        # Like the database: a CHECK violation refuses the whole statement, ON CONFLICT skips existing keys
+        if any(row[DEVICE_DATA_COLUMN['total_power']] < 0 for row in rows):
+            raise psycopg2.Error("new row violates check constraint")
+        new = {(row[0], row[3]) for row in rows} - session.keys
+        session.keys |= new
+        return len(new)
+
+    monkeypatch.setattr(etl_service, "_write_batch", write_batch)
+    return session
+
+def entry(timestamp, total_power=1.0):
+    return {"timestamp": timestamp, "total_power": total_power}
+
+def test_duplicates_in_batch_and_table_are_counted(table):
+    counts = insert_data_to_db(table, [
+        entry("2024-05-01 12:00:00"),
+        entry("2024-05-01 12:00:00"),  # Again in the same batch
+        entry("2024-05-01 12:05:00"),  # Already in the table
+        {"total_power": 1.0},  # No timestamp
+        None,
+    ], "D1", "CUST", "solarman")
+    assert counts == {'inserted': 1, 'duplicates': 2, 'rejected': 2}
+    assert table.commits == 1
+
+def test_columnar_batch_is_deduplicated_too(table):
+    batch = normalize_batch([entry("2024-05-01 12:00:00"), entry("2024-05-01 12:00:00"), entry("2024-05-01 12:10:00")], "solarman")
+    assert insert_data_to_db(table, batch, "D1", "CUST", "solarman") == {'inserted': 2, 'duplicates': 1, 'rejected': 0}
+
+def test_refused_batch_falls_back_to_row_by_row(table):
+    counts = insert_data_to_db(table, [
+        entry("2024-05-01 12:00:00"),
+        entry("2024-05-01 12:05:00"),  # Already in the table
+        entry("2024-05-01 12:10:00", total_power=-5.0),  # Violates the CHECK
+        entry("2024-05-01 12:15:00"),
+    ], "D1", "CUST", "solarman")
+    assert counts == {'inserted': 2, 'duplicates': 1, 'rejected': 1}
+    assert ("D1", "2024-05-01 12:15:00") in table.keys and ("D1", "2024-05-01 12:10:00") not in table.keys
+    assert table.statements[:2] == ["SAVEPOINT bulk_insert", "ROLLBACK TO SAVEPOINT bulk_insert"]
+    assert table.statements.count("ROLLBACK TO SAVEPOINT row_insert") == 1
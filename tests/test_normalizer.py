@@ -0,0 +1,39 @@
+import pytest
+
+from backend.services.etl.etl_service import normalize_data_entry
+from backend.services.etl.normalizer import normalize_batch
+
+# Key names of all three providers in one batch, as the clients emit them
+RECORDS = [
+    # SolisCloud, by day and at night
+    {'timestamp': '2024-05-01 12:00:00', 'sn': 'SC0001', 'pac': 4200.0, 'eToday': 12.5, 'fac': 50.0, 'uAc1': 230.0,
+     'uPv1': 350.0, 'iPv1': 8.0, 'storageBatteryVoltage': 51.2, 'state': 'online'},
+    {'timestamp': '2024-05-01 21:30:00', 'sn': 'SC0001', 'pac': 15.0, 'eToday': 20.0, 'uPv1': 12.0, 'fac': 49.9},
+    # Solarman: numbers as strings, only some strings reported
+    {'timestamp': '2024-05-01 07:00:00', 'deviceSn': 'SM0001', 'total_power': '1200', 'dpi_t1': '1300', 'dv2': '310.5'},
+    {'timestamp': '2024-05-01 06:59:59', 'deviceSn': 'SM0001', 'tpg': '80', 'dc1': '0.4', 'a_fo1': '50.1'},
+    # Shinemonitor: faults, zero values falling through to the next key, no PV fields at all
+    {'timestamp': '2024-05-01 18:59:59', 'device_id': 'SH0001', 'total_power': 0, 'pac': 900.0, 'r_voltage': 231.0,
+     'faults': [{'code': 'F1'}], 'status': 'fault'},
+    {'timestamp': '2024-05-01 19:00:00', 'device_id': 'SH0001', 'total_power': 100.0, 'PV3 voltage': 280.0},
+    # Days past 28 and bad timestamps take the per-row parse
+    {'timestamp': '2024-01-31 23:10:00', 'pac': 50.0, 'uPv1': 100.0},
+    {'timestamp': '2024-02-30 12:00:00', 'pac': 500.0, 'uPv1': 300.0},
+    {'timestamp': '2024-05-01T20:00:00', 'pac': 500.0},
+    {'timestamp': 'not a date', 'total_power': 10.0},
+    # Dropped by both
+    {'pac': 10.0},
+    None,
+    {},
+]
+
+@pytest.mark.parametrize("api_provider", ["soliscloud", "solarman", "shinemonitor"])
+def test_batch_matches_per_row_normalization(api_provider):
+    expected = [row for row in (normalize_data_entry(record, api_provider) for record in RECORDS) if row is not None]
+    assert normalize_batch(RECORDS, api_provider).records() == expected
+
+def test_night_rows_are_zeroed():
+    rows = normalize_batch(RECORDS[:2], "soliscloud").records()
+    assert rows[0]['total_power'] == 4200.0 and rows[0]['pv01_voltage'] == 350.0
+    assert rows[1]['total_power'] == rows[1]['energy_today'] == rows[1]['pv01_voltage'] == 0.0
+    assert rows[1]['frequency'] == 49.9
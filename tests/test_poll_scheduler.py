@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.services.etl.poll_scheduler import HISTORICAL_MIN_INTERVAL, PollScheduler
+
+NOW = datetime(2024, 5, 1, 7, 0, tzinfo=timezone.utc)  # 12:30 in India: daylight
+
+def scheduler(historical=False, last_reported_at=NOW - timedelta(hours=2)):
+    schedule = PollScheduler('shinemonitor', historical, now=NOW)
+    schedule._windows['P1'] = [(NOW - timedelta(hours=6), NOW + timedelta(hours=6))]
+    schedule._schedule['D1'] = {
+        'next_poll_at': NOW, 'last_data_timestamp': None, 'last_reported_at': last_reported_at,
+    }
+    return schedule
+
+def test_silent_device_goes_offline():
+    next_poll_at, mode = scheduler().plan('D1', 'P1')
+    assert mode == 'offline' and next_poll_at > NOW + timedelta(hours=1)
+
+def test_failed_fetch_does_not_count_toward_offline():
+    schedule = scheduler()
+    next_poll_at, mode = schedule.plan('D1', 'P1', failed=True)
+    assert mode == 'active' and next_poll_at == NOW + timedelta(minutes=5)
+    # Nor does it count as a report
+    assert schedule._planned[-1]['last_reported_at'] == NOW - timedelta(hours=2)
+
+def test_historical_polls_stay_hourly():
+    next_poll_at, mode = scheduler(historical=True, last_reported_at=NOW).plan('D1', 'P1', failed=True)
+    assert mode == 'active' and next_poll_at == NOW + HISTORICAL_MIN_INTERVAL
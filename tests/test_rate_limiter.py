@@ -0,0 +1,140 @@
+import itertools
+import logging
+import time
+
+import pytest
+from tenacity import wait_none
+
+from backend.config.settings import settings
+from backend.services.providers import rate_limiter
+from backend.services.providers.errors import ProviderDayError, ProviderFetchError
+from backend.services.providers.rate_limiter import LocalTokenBucket, ProviderThrottled, RateLimiter
+from backend.services.providers.shinemonitor_client import ShinemonitorAPI
+from backend.services.providers.soliscloud_client import SolisCloudAPI
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock instead of waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+class ThrottledResponse:
+    status_code = 429
+    headers = {"Retry-After": "0"}
+
+    def json(self):
+        return {}
+
+class ThrottledSession:
+    """Answers every request with a 429, recording the URLs."""
+
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        return ThrottledResponse()
+
+    def request(self, method, url, **kwargs):
+        self.urls.append(url)
+        return ThrottledResponse()
+
+@pytest.fixture(autouse=True)
+def no_retry_wait(monkeypatch):
+    for retried in (ShinemonitorAPI._get, SolisCloudAPI.make_request):
+        monkeypatch.setattr(retried.retry, "wait", wait_none())
+
+def shinemonitor(monkeypatch):
+    # A handler of its own keeps the client from configuring a log file
+    logging.getLogger(ShinemonitorAPI.__module__).addHandler(logging.NullHandler())
+    client = ShinemonitorAPI(company_key="throttled", base_url="http://shinemonitor.invalid/public/", session=ThrottledSession())
+    client.secret, client.token, client.token_expiry = "secret", "token", time.time() + 3600
+    signed = itertools.count()
+    monkeypatch.setattr(client, "_signed_url", lambda action_params: f"http://shinemonitor.invalid/?salt={next(signed)}")
+    return client
+
+def test_throttling_is_a_fetch_error():
+    assert issubclass(ProviderThrottled, ProviderFetchError)
+
+def test_throttled_day_fails_that_day(monkeypatch, clock):
+    client = shinemonitor(monkeypatch)
+    device = {"sn": "T0001", "pn": "PN", "devcode": 512, "devaddr": 1}
+    with pytest.raises(ProviderDayError) as failure:
+        next(client.iter_historical_data("user", "user", "secret", device, "2024-05-01", "2024-05-02"))
+    assert failure.value.day == "2024-05-01"
+    # Every attempt is signed again
+    assert client.session.urls == [f"http://shinemonitor.invalid/?salt={n}" for n in range(3)]
+
+def test_throttled_realtime_fetch_fails_the_device_only(monkeypatch, clock):
+    client = shinemonitor(monkeypatch)
+    with pytest.raises(ProviderFetchError):
+        client.fetch_current_data("user", "user", "secret", {"sn": "T0001", "pn": "PN", "devcode": 512, "devaddr": 1})
+
+def test_throttled_inverter_day_page_fails_that_day(monkeypatch, clock):
+    client = SolisCloudAPI(api_key="throttled", api_secret="secret", base_url="http://soliscloud.invalid", session=ThrottledSession())
+    monkeypatch.setattr(client, "_station_time_zone", lambda user_id, station_id: 5.5)
+    pages = client.iter_inverter_historical_data("user", device={"id": "1001", "sn": "T0001"}, start_date="2024-05-01", end_date="2024-05-01")
+    with pytest.raises(ProviderDayError) as failure:
+        next(pages)
+    assert failure.value.day == "2024-05-01" and len(client.session.urls) == 3
+
+def test_bucket_spends_its_burst_then_refills_at_the_rate(clock):
+    bucket = LocalTokenBucket(rate=2.0, capacity=2.0)
+    assert bucket.try_acquire() == bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    clock.now += 0.25
+    assert bucket.try_acquire() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket.try_acquire() == 0.0
+
+def test_blocked_bucket_waits_out_the_block(clock):
+    bucket = LocalTokenBucket(rate=2.0, capacity=2.0)
+    bucket.block(5.0)
+    assert bucket.try_acquire() == pytest.approx(5.0)
+    clock.now += 5.0
+    assert bucket.try_acquire() == 0.0
+
+def test_acquire_sleeps_until_a_token_is_free(clock):
+    limiter = RateLimiter("solarman", "clock", rate=2.0)
+    for _ in range(4):
+        limiter.acquire()
+    assert clock.slept == pytest.approx(1.0)  # Burst of 2, then one token every 0.5s
+
+def test_backoff_doubles_per_strike_up_to_the_cap(clock, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_MAX_BACKOFF", 6.0)
+    limiter = RateLimiter("solarman", "clock", rate=1.0)
+    assert [limiter.backoff() for _ in range(4)] == [2.0, 4.0, 6.0, 6.0]
+    assert limiter.backoff(retry_after=3.0) == 3.0  # Retry-After wins
+    limiter.success()
+    assert limiter.backoff() == 2.0
+
+def test_check_raises_and_backs_off_on_429(clock):
+    limiter = RateLimiter("soliscloud", "clock", rate=2.0)
+    with pytest.raises(ProviderThrottled):
+        limiter.check(429, {"Retry-After": "7"})
+    assert limiter._bucket.try_acquire() == pytest.approx(7.0)
+
+@pytest.mark.parametrize("message", ["ERR_REQUEST_TOO_FREQUENTLY", "Too many requests", "rate limit exceeded"])
+def test_check_raises_on_vendor_throttle_messages(clock, message):
+    with pytest.raises(ProviderThrottled):
+        RateLimiter("shinemonitor", "clock", rate=5.0).check(message=message)
+
+def test_check_passes_other_responses(clock):
+    limiter = RateLimiter("shinemonitor", "clock", rate=5.0)
+    limiter.check(200, {})
+    limiter.check(500, {"Retry-After": "7"}, message="ERR_FAIL")
+    assert limiter._bucket.try_acquire() == 0.0
@@ -0,0 +1,40 @@
+import os
+from datetime import date
+
+import pytest
+
+from backend.config.settings import settings
+from backend.services.providers.raw_archive import RawArchive, data_days, iter_records
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = RawArchive(str(tmp_path))
+    yield archive
+    archive.close()
+
+def shinemonitor_day(day):
+    return {'action': 'queryDeviceDataOneDay', 'sn': 'S1', 'startDate': day, 'endDate': day}
+
+def test_data_days_come_from_the_request():
+    assert data_days(shinemonitor_day('2024-05-01')) == (date(2024, 5, 1), date(2024, 5, 1))
+    assert data_days({'id': '1001', 'time': '2024-05-02'}) == (date(2024, 5, 2), date(2024, 5, 2))
+    assert data_days({'deviceSn': 'M1', 'startTime': '2024-05-01', 'endTime': '2024-05-05'}) == (date(2024, 5, 1), date(2024, 5, 5))
+    assert data_days({'deviceSn': 'M1'}) is None
+
+def test_responses_are_filed_under_their_data_day(archive, tmp_path):
+    # A backfill of May 1 and an hourly run fetching May 2, both today
+    archive.record('shinemonitor', 'queryDeviceDataOneDay', shinemonitor_day('2024-05-01'), {'err': 0})
+    archive.record('shinemonitor', 'queryDeviceDataOneDay', shinemonitor_day('2024-05-02'), {'err': 0})
+    archive.record('shinemonitor', 'queryDeviceDataOneDay', shinemonitor_day('2024-05-02'), {'err': 0})
+    archive.close()
+    assert sorted(os.listdir(tmp_path / 'shinemonitor')) == ['2024-05-01', '2024-05-02']
+    replayed = list(iter_records(str(tmp_path), 'shinemonitor', date(2024, 5, 2), date(2024, 5, 2)))
+    assert [record['request']['startDate'] for record in replayed] == ['2024-05-02', '2024-05-02']
+
+def test_ranged_requests_are_found_from_any_day_they_cover(archive, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SOLARMAN_HISTORICAL_MAX_DAYS', 5)
+    for start, end in (('2024-04-26', '2024-04-30'), ('2024-05-01', '2024-05-05'), ('2024-05-06', '2024-05-10')):
+        archive.record('solarman', '/device/v1.0/historical', {'deviceSn': 'M1', 'startTime': start, 'endTime': end}, {})
+    archive.close()
+    replayed = list(iter_records(str(tmp_path), 'solarman', date(2024, 5, 3), date(2024, 5, 6)))
+    assert [record['request']['startTime'] for record in replayed] == ['2024-05-01', '2024-05-06']
@@ -0,0 +1,19 @@
+from datetime import datetime, timezone
+
+from backend.services.timeseries_service import RESOLUTIONS, align, downsample, pick_source, resolve_metrics
+
+def test_day_buckets_start_at_local_midnight():
+    # 20:00 UTC is already 1:30 on May 2 in India
+    assert align(datetime(2024, 5, 1, 20, tzinfo=timezone.utc), RESOLUTIONS['1d']) == datetime(2024, 5, 1, 18, 30, tzinfo=timezone.utc)
+    assert align(datetime(2024, 5, 1, 17, 7, tzinfo=timezone.utc), RESOLUTIONS['1h']) == datetime(2024, 5, 1, 17, tzinfo=timezone.utc)
+
+def test_day_buckets_are_grouped_in_local_time(session):
+    start = datetime(2024, 4, 30, 18, 30, tzinfo=timezone.utc)
+    downsample(session, ['D1'], ['total_power'], start, datetime(2024, 5, 2, tzinfo=timezone.utc), RESOLUTIONS['1d'], 'device_data_daily')
+    sql, params = session.statements[-1]
+    assert 'time_bucket(:bucket, timestamp, :timezone)' in sql and params['timezone'] == 'Asia/Kolkata'
+
+def test_all_metrics_read_from_the_aggregates():
+    assert pick_source(RESOLUTIONS['1d'], resolve_metrics(None)) == 'device_data_daily'
+    assert pick_source(RESOLUTIONS['1h'], resolve_metrics(None)) == 'device_data_hourly'
+    assert pick_source(RESOLUTIONS['5m'], resolve_metrics(None)) == 'device_data_historical'
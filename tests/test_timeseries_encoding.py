@@ -0,0 +1,62 @@
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from backend.controllers.dashboard import _negotiate
+from backend.services import timeseries_encoding
+from backend.services.timeseries_encoding import ARROW, JSON, MSGPACK, encode_series, negotiate, to_columns
+
+@pytest.fixture
+def codecs(monkeypatch):
+    # Negotiation only checks whether the codec modules imported
+    monkeypatch.setattr(timeseries_encoding, "msgpack", object())
+    monkeypatch.setattr(timeseries_encoding, "pyarrow", object())
+
+@pytest.mark.parametrize("accept, media_type", [
+    (None, JSON),
+    ("application/msgpack, application/json", MSGPACK),
+    ("application/json, application/msgpack", JSON),
+    ("application/json;q=0.5, application/msgpack", MSGPACK),
+    ("application/msgpack;q=0.2, application/vnd.apache.arrow.stream;q=0.9", ARROW),
+    ("application/x-msgpack", MSGPACK),
+    ("application/msgpack;q=0, */*", JSON),
+    ("text/html, application/*;q=0.1", JSON),
+    ("text/html;q=0.9, */*;q=0.1", JSON),
+])
+def test_negotiate_orders_by_quality_then_position(codecs, accept, media_type):
+    assert negotiate(accept) == media_type
+
+def test_negotiate_refuses_what_cannot_be_produced(codecs, monkeypatch):
+    with pytest.raises(ValueError):
+        negotiate("text/csv")
+    with pytest.raises(ValueError):
+        negotiate(ARROW, arrow=False)  # Batch responses
+    monkeypatch.setattr(timeseries_encoding, "msgpack", None)
+    with pytest.raises(ValueError):
+        negotiate("application/msgpack")
+
+def test_unacceptable_request_is_406():
+    request = SimpleNamespace(headers={"accept": "text/csv"})
+    with pytest.raises(HTTPException) as refused:
+        _negotiate(request, "rows")
+    assert refused.value.status_code == 406
+
+def test_to_columns_transposes_rows():
+    points = [
+        {"timestamp": datetime(2024, 5, 1, tzinfo=timezone.utc), "total_power": 1.0, "total_power_max": 2.0},
+        {"timestamp": datetime(2024, 5, 1, 0, 5, tzinfo=timezone.utc), "total_power": 3.0, "total_power_max": 4.0},
+    ]
+    assert to_columns(points) == {
+        "timestamps": [1714521600000, 1714521900000], "total_power": [1.0, 3.0], "total_power_max": [2.0, 4.0],
+    }
+    assert to_columns(points, ["timestamp", "total_power"]) == {"timestamps": [1714521600000, 1714521900000], "total_power": [1.0, 3.0]}
+
+def test_empty_series_keeps_its_columns():
+    assert to_columns([]) == {"timestamps": []}
+    assert to_columns([], ["timestamp", "total_power", "total_power_min"]) == {"timestamps": [], "total_power": [], "total_power_min": []}
+    body = json.loads(encode_series([{"deviceId": "D1", "metric": "total_power", "columns": ["timestamp", "total_power"], "data": []}],
+                                    JSON, columnar=True))
+    assert body == [{"deviceId": "D1", "metric": "total_power", "data": {"timestamps": [], "total_power": []}}]
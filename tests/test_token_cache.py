@@ -0,0 +1,13 @@
+from backend.services.providers.token_cache import is_auth_error
+
+def test_vendor_auth_replies_are_auth_errors():
+    assert is_auth_error("solarman", status_code=401)
+    assert is_auth_error("solarman", message="auth invalid token")
+    assert is_auth_error("shinemonitor", code=3, message="ERR_NO_AUTH, token expired")
+    assert is_auth_error("soliscloud", status_code=403, code="Z0001")
+
+def test_unrelated_errors_are_not_auth_errors():
+    assert not is_auth_error("shinemonitor", code=12, message="ERR_NOT_FOUND_DEVICE")
+    assert not is_auth_error("shinemonitor", code=1, message="ERR_FAIL: login history unavailable")
+    assert not is_auth_error("solarman", status_code=403, message="device token count exceeded")
+    assert not is_auth_error("soliscloud", status_code=429)
@@ -0,0 +1,112 @@
+import logging
+from datetime import datetime
+
+import pytest
+
+from backend.config.settings import settings
+from backend.services.etl.pipeline import ChunkWriter, stream_device
+from backend.services.etl.watermarks import historical_window
+from backend.services.providers.errors import ProviderDayError
+from backend.services.providers.shinemonitor_client import ShinemonitorAPI
+from backend.services.providers.solarman_client import SolarmanAPI
+
+DEVICE = {"sn": "W0001", "pn": "PN0001", "devcode": 512, "devaddr": 1}
+TITLES = ["Id", "Timestamp", "Grid connected power"]
+
+def day_response(day, err=0):
+    if err:
+        return {"err": err, "desc": "ERR_FAILED"}
+    rows = [{"field": [str(n), f"{day} {hour:02d}:00:00", "1.5"]} for n, hour in enumerate((6, 12, 18), start=1)]
+    return {"err": 0, "desc": "ERR_NONE", "dat": {"title": [{"title": t} for t in TITLES], "row": rows}}
+
+def shinemonitor(monkeypatch, responses):
+    # A handler of its own keeps the client from configuring a log file
+    logging.getLogger(ShinemonitorAPI.__module__).addHandler(logging.NullHandler())
+    client = ShinemonitorAPI(company_key="test", base_url="http://shinemonitor.invalid/public/")
+    client.secret, client.token = "secret", "token"
+    day_of = lambda action_params: action_params.split("startDate=")[1].split("&")[0]
+    monkeypatch.setattr(client, "_query", lambda action_params, timeout=10: responses[day_of(action_params)])
+    return client
+
+def test_failed_day_stops_the_iterator(monkeypatch):
+    client = shinemonitor(monkeypatch, {
+        "2024-05-01": day_response("2024-05-01"),
+        "2024-05-02": day_response("2024-05-02", err=1),
+        "2024-05-03": day_response("2024-05-03"),
+    })
+    pages = client.iter_historical_data("user", "user", "secret", DEVICE, "2024-05-01", "2024-05-03")
+    assert [row["timestamp"] for row in next(pages)][-1] == "2024-05-01 18:00:00"
+    with pytest.raises(ProviderDayError) as failure:
+        next(pages)
+    assert failure.value.day == "2024-05-02"
+
+def test_day_without_records_is_empty_not_failed(monkeypatch):
+    client = shinemonitor(monkeypatch, {
+        "2024-05-01": day_response("2024-05-01", err=12),
+        "2024-05-02": day_response("2024-05-02"),
+    })
+    pages = list(client.iter_historical_data("user", "user", "secret", DEVICE, "2024-05-01", "2024-05-02"))
+    assert len(pages) == 1 and pages[0][0]["timestamp"] == "2024-05-02 06:00:00"
+
+@pytest.mark.parametrize("chunk_size", [3, None])  # One day of rows per chunk, and ETL_CHUNK_SIZE
+def test_failed_middle_day_pins_watermark(monkeypatch, written, session, chunk_size):
+    client = shinemonitor(monkeypatch, {
+        "2024-05-01": day_response("2024-05-01"),
+        "2024-05-02": day_response("2024-05-02", err=1),
+        "2024-05-03": day_response("2024-05-03"),
+    })
+    pages = client.iter_historical_data("user", "user", "secret", DEVICE, "2024-05-01", "2024-05-03")
+    writer = ChunkWriter(session, "CUST", "shinemonitor")
+    with pytest.raises(ProviderDayError):
+        with writer:
+            stream_device(pages, writer, DEVICE["sn"], chunk_size=chunk_size)
+    writer.drain()
+
+    # Day 1 is written even though its chunk was not full; day 3 was never fetched, so the watermark stays on day 1 ...
+    assert writer.counts['inserted'] == 3
+    assert session.watermarks and max(session.watermarks) == datetime(2024, 5, 1, 18)
+    # ... and the next run starts there again, refetching the failed day
+    start_date, end_date, since = historical_window(max(session.watermarks), now=datetime(2024, 5, 3, 20))
+    assert (start_date, end_date) == ("2024-05-01", "2024-05-03")
+    assert since < datetime(2024, 5, 2)
+
+def test_watermark_covers_every_day_without_failures(monkeypatch, written, session):
+    client = shinemonitor(monkeypatch, {day: day_response(day) for day in ("2024-05-01", "2024-05-02", "2024-05-03")})
+    pages = client.iter_historical_data("user", "user", "secret", DEVICE, "2024-05-01", "2024-05-03")
+    with ChunkWriter(session, "CUST", "shinemonitor") as writer:
+        stream_device(pages, writer, DEVICE["sn"], chunk_size=3)
+    assert max(session.watermarks) == datetime(2024, 5, 3, 18)
+
+def solarman(monkeypatch, requests_made, failing_start):
+    def historical(method, endpoint, params=None, data=None):
+        requests_made.append((data["startTime"], data["endTime"]))
+        if data["startTime"] == failing_start:
+            raise RuntimeError("timeout")
+        return {"paramDataList": [{"collectTime": f"{data['startTime']} 06:00:00", "dataList": [{"key": "TPG", "value": "1.5"}]}]}
+    monkeypatch.setattr(settings, "SOLARMAN_HISTORICAL_MAX_DAYS", 5)
+    client = SolarmanAPI("user@example.com", "hash", "app", "secret", base_url="http://solarman.invalid")
+    monkeypatch.setattr(client, "_make_request", historical)
+    return client
+
+def test_solarman_fetches_ranges_and_fails_at_the_range_start(monkeypatch):
+    requests_made = []
+    client = solarman(monkeypatch, requests_made, "2024-05-06")
+    pages = client.iter_historical_data("user", "user", "secret", {"deviceSn": "S0001"}, "2024-05-01", "2024-05-08")
+    assert len(next(pages)) == 1
+    with pytest.raises(ProviderDayError) as failure:
+        next(pages)
+    assert failure.value.day == "2024-05-06"
+    assert requests_made == [("2024-05-01", "2024-05-05"), ("2024-05-06", "2024-05-08")]
+
+def test_failed_solarman_range_keeps_the_ranges_before_it(monkeypatch, written, session):
+    client = solarman(monkeypatch, [], "2024-05-11")
+    pages = client.iter_historical_data("user", "user", "secret", {"deviceSn": "S0001"}, "2024-05-01", "2024-05-12")
+    writer = ChunkWriter(session, "CUST", "solarman")
+    with pytest.raises(ProviderDayError):
+        with writer:
+            stream_device(pages, writer, "S0001")
+    writer.drain()
+
+    # Both good ranges are written with the default chunk size; the watermark stops before the failed one
+    assert writer.counts['inserted'] == 2
+    assert max(session.watermarks) == datetime(2024, 5, 6, 6)